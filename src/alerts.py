@@ -0,0 +1,248 @@
+#External Libraries
+import pandas as pd
+import atexit
+import collections
+import json
+import logging
+import sys
+import threading
+import time
+import urllib.request
+
+class AlertSink:
+    """
+    AlertSink is the base class of the alert outputs. Records are appended to an in-memory buffer, which costs a deque
+    append on the scoring path, and a background thread writes them out in batches every `interval` seconds, so a slow
+    disk or endpoint never blocks detection. The buffer is bounded: when it is full the oldest records are dropped and
+    counted. A sink only implements write(records).
+
+    Class Attributes:
+        - buffer: Records waiting to be written, oldest first.
+        - capacity: Largest number of records buffered.
+        - interval: Seconds between two flushes.
+        - written, dropped, failed: Number of records written, dropped from a full buffer and lost in a failed write.
+    """
+
+    def __init__(self, capacity=10000, interval=1.0):
+        self.buffer = collections.deque(maxlen=capacity)
+        self.capacity = capacity
+        self.interval = interval
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.lock = threading.Lock() #serializes the writes of the flush thread and of explicit flushes
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def emit(self, record):
+        """
+        Buffer a record (a JSON-serializable dict), starting the flush thread on the first one.
+        """
+        if self.thread is None:
+            self.start()
+        if len(self.buffer) == self.capacity:
+            self.dropped += 1
+        self.buffer.append(record)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.flushLoop, daemon=True)
+        self.thread.start()
+        atexit.register(self.close) #the thread is a daemon, buffered records are written at exit
+
+    def flushLoop(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Write every buffered record now.
+        """
+        with self.lock:
+            records = []
+            while self.buffer:
+                records.append(self.buffer.popleft())
+            if not records:
+                return
+            try:
+                self.write(records)
+                self.written += len(records)
+            except Exception as e:
+                self.failed += len(records)
+                logging.error("Alert sink failed to write %d records: %s", len(records), e)
+
+    def write(self, records):
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Stop the flush thread and write the remaining records.
+        """
+        self.stopped.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.flush()
+
+class JsonLinesSink(AlertSink):
+    #Writes the records as JSON lines to a text stream or to a file opened in append mode
+
+    def __init__(self, target=None, **options):
+        super().__init__(**options)
+        self.ownsStream = isinstance(target, str) #only a file opened here is closed by close(), never stdout or a caller's stream
+        self.stream = open(target, "a") if self.ownsStream else (target or sys.stdout)
+
+    def write(self, records):
+        self.stream.write("".join(json.dumps(record) + "\n" for record in records))
+        self.stream.flush()
+
+    def close(self):
+        super().close()
+        if self.ownsStream and not self.stream.closed:
+            self.stream.close()
+
+class HttpSink(AlertSink):
+    #POSTs every batch of records to an HTTP endpoint as a JSON array
+
+    def __init__(self, url, timeout=5.0, **options):
+        super().__init__(**options)
+        self.url = url
+        self.timeout = timeout
+
+    def write(self, records):
+        request = urllib.request.Request(self.url, data=json.dumps(records).encode(), method="POST",
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+def makeSink(target=None, **options):
+    """
+    Returns the sink of a target: None or "-" for stdout, an http:// or https:// URL for an HttpSink, a file path otherwise.
+    """
+    if target is None or target == "-":
+        return JsonLinesSink(sys.stdout, **options)
+    if target.startswith(("http://", "https://")):
+        return HttpSink(target, **options)
+    return JsonLinesSink(target, **options)
+
+sharedSink = None
+
+def defaultSink():
+    """
+    Returns the stdout sink shared by every verbose model of the process, created on first use.
+    """
+    global sharedSink
+    if sharedSink is None:
+        sharedSink = JsonLinesSink(sys.stdout)
+    return sharedSink
+
+class IncidentTracker:
+    """
+    IncidentTracker turns the scored points of one stream into incident alerts.
+
+    Consecutive anomalous points are coalesced into one incident, which is emitted twice: when it opens (so the alert
+    latency does not depend on the length of the incident) and when it closes, with its start, end, number of anomalous
+    points and peak (the point with the largest absolute residual). Anomalies separated by at most `gap` normal points
+    belong to the same incident, which deduplicates the alerts of a flapping series.
+
+    Incidents are rate limited per stream with a token bucket of `burst` incidents refilled at `rate` incidents per
+    second: the incidents over the limit are not emitted, and the next record emitted for the stream carries how many
+    were suppressed. Alert volume is therefore bounded by 2 * rate records per second and per stream, however many
+    anomalies are detected.
+
+    Class Attributes:
+        - sink: AlertSink the records are emitted to.
+        - stream: Identifier of the stream, included in every record.
+        - gap: Normal points allowed inside an incident.
+        - rate, burst: Token bucket of the rate limit.
+        - incident: The open incident, None when there is none.
+        - quiet: Normal points seen since the last anomaly of the open incident.
+        - suppressed: Incidents suppressed since the last record emitted.
+    """
+    __slots__ = ("sink", "stream", "gap", "rate", "burst", "tokens", "refilled", "incident", "quiet", "suppressed", "clock")
+
+    def __init__(self, sink=None, stream=None, gap=2, rate=1.0, burst=5, clock=time.monotonic):
+        self.sink = sink or defaultSink()
+        self.stream = stream
+        self.gap = gap
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.clock = clock
+        self.refilled = clock()
+        self.incident = None
+        self.quiet = 0
+        self.suppressed = 0
+
+    def observe(self, timestamp, value, residual, is_anomaly):
+        """
+        Fold a scored point (timestamp in ns) into the incidents. Cheap for the common normal point outside any incident.
+        """
+        incident = self.incident
+        if not is_anomaly:
+            if incident is not None:
+                self.quiet += 1
+                if self.quiet > self.gap:
+                    self.closeIncident()
+            return
+
+        self.quiet = 0
+        if incident is None:
+            self.incident = {"start": timestamp, "end": timestamp, "points": 1, "peak": (timestamp, value, residual),
+                             "admitted": self.admit()}
+            if self.incident["admitted"]:
+                self.send("open", self.incident)
+            return
+
+        incident["end"] = timestamp
+        incident["points"] += 1
+        if abs(residual) > abs(incident["peak"][2]):
+            incident["peak"] = (timestamp, value, residual)
+
+    def observeBlock(self, timestamps, values, residuals, mask):
+        """
+        observe for a block of points, skipping the normal points before the first anomaly when no incident is open.
+        """
+        if self.incident is None:
+            if not mask.any():
+                return
+            first = mask.argmax()
+        else:
+            first = 0
+        for timestamp, value, residual, is_anomaly in zip(timestamps[first:].tolist(), values[first:].tolist(),
+                                                          residuals[first:].tolist(), mask[first:].tolist()):
+            self.observe(timestamp, value, residual, is_anomaly)
+
+    def admit(self):
+        #Take a token from the bucket, refilled at rate tokens per second
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def closeIncident(self):
+        incident, self.incident = self.incident, None
+        if incident["admitted"]:
+            self.send("closed", incident)
+
+    def send(self, status, incident):
+        #Emit a record of the incident to the sink
+        timestamp, value, residual = incident["peak"]
+        self.sink.emit({"stream": self.stream, "status": status, "start": pd.Timestamp(incident["start"]).isoformat(),
+                        "end": pd.Timestamp(incident["end"]).isoformat(), "points": incident["points"],
+                        "peak": {"timestamp": pd.Timestamp(timestamp).isoformat(), "value": float(value), "residual": float(residual)},
+                        "suppressed": self.suppressed})
+        self.suppressed = 0
+
+    def close(self):
+        """
+        Close the open incident, if any, report the incidents suppressed since the last record, and flush the sink.
+        """
+        if self.incident is not None:
+            self.closeIncident()
+        if self.suppressed:
+            self.sink.emit({"stream": self.stream, "status": "suppressed", "suppressed": self.suppressed})
+            self.suppressed = 0
+        self.sink.flush()
@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+import os
+import shutil
+import tempfile
+import weakref
+
+#One record per detected anomaly, timestamps in nanoseconds since epoch
+RECORD = np.dtype([("timestamp", "<i8"), ("value", "<f8"), ("residual", "<f8"), ("lower", "<f8"), ("upper", "<f8")])
+
+def removeSpill(path):
+    #Remove a temporary spill file, which may already be gone
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class AnomalyLog:
+    """
+    AnomalyLog is an append-only log of detected anomalies with a bounded memory footprint.
+
+    The most recent records live in a NumPy array of at most `capacity` records (timestamp, value, residual and the
+    thresholds in force), which starts small and doubles as anomalies arrive, so a quiet stream holds almost nothing.
+    When it is full, the older half is appended to a binary spill file on local disk, so memory
+    stays bounded however long the process runs. Records are expected in time order, which lets range queries binary search
+    both the in-memory records and the spill file; the spill file is memory-mapped, so a query only pages in the part of
+    the history it returns.
+
+    Class Attributes:
+        - capacity: Maximum number of records held in memory.
+        - records: In-memory records, the first `size` are valid.
+        - spillPath: File the older records are spilled to (created on the first spill when not given).
+        - spilled: Number of records in the spill file.
+        - cleanup: Finalizer removing the spill file when the log created it, run by close() or when the log is
+          garbage collected (None when the file was given by the caller).
+    """
+    __slots__ = ("capacity", "records", "size", "spillPath", "spilled", "cleanup", "__weakref__")
+
+    #Records allocated up front, the array then doubles up to capacity
+    INITIAL = 64
+
+    def __init__(self, capacity=10000, spillPath=None):
+        if capacity < 2:
+            raise ValueError("capacity must be at least 2.")
+
+        self.capacity = capacity
+        self.records = np.zeros(min(capacity, self.INITIAL), dtype=RECORD)
+        self.size = 0
+        self.spillPath = spillPath
+        self.spilled = 0
+        self.cleanup = None
+
+        #Resume an existing spill file, for instance after a restart
+        if spillPath and os.path.exists(spillPath):
+            self.spilled = os.path.getsize(spillPath) // RECORD.itemsize
+
+    def __len__(self):
+        return self.spilled + self.size
+
+    def nbytes(self, peak=False):
+        #Memory held by the in-memory records, or the most it can grow to with peak=True
+        return (self.capacity if peak else len(self.records)) * RECORD.itemsize
+
+    def reserve(self, count):
+        #Grow the in-memory array (doubling, up to capacity) so that it holds at least count records
+        if count > len(self.records) and len(self.records) < self.capacity:
+            records = np.zeros(min(self.capacity, max(count, 2 * len(self.records))), dtype=RECORD)
+            records[:self.size] = self.records[:self.size]
+            self.records = records
+
+    def append(self, timestamp, value, residual, lower, upper):
+        """
+        Append a single anomaly record.
+        """
+        if self.size == len(self.records):
+            self.reserve(self.size + 1)
+        if self.size == self.capacity:
+            self.spill()
+        self.records[self.size] = (timestamp, value, residual, lower, upper)
+        self.size += 1
+
+    def extend(self, timestamps, values, residuals, lower, upper):
+        """
+        Append a block of anomaly records in bulk. lower and upper may be scalars or one value per record.
+        """
+        count = len(timestamps)
+        block = np.zeros(count, dtype=RECORD)
+        block["timestamp"], block["value"], block["residual"] = timestamps, values, residuals
+        block["lower"], block["upper"] = lower, upper
+
+        self.reserve(self.size + count)
+        while len(block):
+            if self.size == self.capacity:
+                self.spill()
+            taken = min(len(block), self.capacity - self.size)
+            self.records[self.size:self.size + taken] = block[:taken]
+            self.size += taken
+            block = block[taken:]
+
+    def spill(self):
+        """
+        Move the older half of the in-memory records to the end of the spill file.
+        """
+        if self.spillPath is None:
+            self.createSpill()
+
+        half = self.size // 2
+        with open(self.spillPath, "ab") as f:
+            f.write(self.records[:half].tobytes())
+        self.spilled += half
+
+        self.records[:self.size - half] = self.records[half:self.size]
+        self.size -= half
+
+    def createSpill(self):
+        #Create a temporary spill file, removed with the log
+        descriptor, self.spillPath = tempfile.mkstemp(suffix=".anomalies")
+        os.close(descriptor)
+        self.cleanup = weakref.finalize(self, removeSpill, self.spillPath)
+
+    def export(self, path):
+        #Copy the spilled records to path, for a checkpoint: the log goes on appending to its own spill file
+        self.onDisk().tofile(path)
+
+    def close(self):
+        """
+        Remove the spill file when the log created it, its records are then gone from the log.
+        A spill file given by the caller is left in place.
+        """
+        if self.cleanup is not None:
+            self.cleanup()
+            self.cleanup = None
+            self.spillPath = None
+            self.spilled = 0
+
+    def restore(self, records, spilled, spillFile=None):
+        """
+        Restore the log to a checkpointed state: `spilled` records in the spill file followed by the in-memory records.
+        With spillFile, the copy of the spilled records made by export(), the records are copied into the log's spill
+        file (a new temporary one unless a spill path was given), so the checkpoint is never modified. Otherwise the log's
+        own spill file is truncated: records appended after the checkpoint are dropped, as the stream is replayed from there.
+        """
+        if spillFile is not None:
+            if self.spillPath is None:
+                self.createSpill()
+            shutil.copyfile(spillFile, self.spillPath)
+        elif self.spillPath and os.path.exists(self.spillPath):
+            with open(self.spillPath, "r+b") as f:
+                f.truncate(spilled * RECORD.itemsize)
+        self.spilled = spilled
+
+        self.size = 0
+        self.extend(records["timestamp"], records["value"], records["residual"], records["lower"], records["upper"])
+
+    def onDisk(self):
+        #Memory-mapped view of the spill file (nothing is read until the records are accessed)
+        if not self.spilled:
+            return np.zeros(0, dtype=RECORD)
+        return np.memmap(self.spillPath, dtype=RECORD, mode="r", shape=(self.spilled,))
+
+    def query(self, start=None, end=None):
+        """
+        Returns the records with start <= timestamp < end as a structured array (a copy).
+
+        Parameters:
+        - start, end: Bounds of the range, as anything pd.Timestamp accepts or nanoseconds, None for an open bound.
+        """
+        start = np.iinfo(np.int64).min if start is None else pd.Timestamp(start).value
+        end = np.iinfo(np.int64).max if end is None else pd.Timestamp(end).value
+
+        parts = []
+        for records in (self.onDisk(), self.records[:self.size]):
+            timestamps = records["timestamp"]
+            first, last = np.searchsorted(timestamps, [start, end])
+            if last > first:
+                parts.append(np.array(records[first:last]))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD)
+
+    def toSeries(self, start=None, end=None):
+        """
+        Returns the anomalous values in [start, end) as a pandas Series indexed by date.
+        """
+        records = self.query(start, end)
+        return pd.Series(records["value"], index=pd.DatetimeIndex(records["timestamp"]), dtype=np.float64)
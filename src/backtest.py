@@ -0,0 +1,181 @@
+#custom build modules
+import data
+import detectors
+
+#External Libraries
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import logging
+import sys
+import time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+#Layout of a recorded series, timestamps in nanoseconds since epoch
+RECORDING = np.dtype([("timestamp", "<i8"), ("value", "<f8"), ("label", "?")])
+
+def generateRecording(path, instances, contamination=10, trainIterations=3000, seed=None):
+    """
+    Generate a labeled series with generateCPUDataBulk and write it to path, as a .npy recording or a .csv file
+    (timestamp,value,label). The series starts right after the trainIterations hours of training data that
+    STLModel.TrainSTLModel generates, so that the simulated schedule stays aligned with the trained model.
+    """
+    values, labels = data.generateCPUDataBulk(instances, contamination=contamination, seed=seed, start=trainIterations)
+    index = pd.date_range(data.ORIGIN + pd.Timedelta(trainIterations, "h"), periods=instances, freq="1h")
+
+    if path.endswith(".csv"):
+        pd.DataFrame({"timestamp": index, "value": values, "label": labels.astype(int)}).to_csv(path, index=False)
+    else:
+        recording = np.zeros(instances, dtype=RECORDING)
+        recording["timestamp"], recording["value"], recording["label"] = index.asi8, values, labels
+        np.save(path, recording)
+
+def readChunks(path, chunkSize=1000):
+    """
+    Generator over a recorded series in chunks of (timestamps, values, labels) arrays.
+    .npy recordings are memory-mapped, so only the current chunk is paged in; CSV files are parsed chunk by chunk.
+    CSV files need timestamp and value columns, the label column is optional (all False when missing).
+    """
+    if path.endswith(".csv"):
+        for frame in pd.read_csv(path, chunksize=chunkSize):
+            labels = frame["label"].to_numpy(dtype=bool) if "label" in frame else np.zeros(len(frame), dtype=bool)
+            yield pd.DatetimeIndex(frame["timestamp"]).asi8, frame["value"].to_numpy(dtype=np.float64), labels
+    else:
+        recording = np.load(path, mmap_mode="r")
+        for start in range(0, len(recording), chunkSize):
+            chunk = recording[start:start + chunkSize]
+            yield chunk["timestamp"], chunk["value"], chunk["label"]
+
+def detectionDelays(labels, predictions):
+    """
+    For every incident (run of consecutive labeled points) the number of points between its start and its first
+    detection. Incidents that are never detected are not included.
+    Returns the delays and the number of incidents.
+    """
+    edges = np.diff(np.concatenate([[0], labels.astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    delays = []
+    for start, end in zip(starts, ends):
+        detected = np.flatnonzero(predictions[start:end])
+        if len(detected):
+            delays.append(int(detected[0]))
+    return np.array(delays), len(starts)
+
+def score(labels, predictions):
+    """
+    Precision, recall, F1 and detection delay of the predictions against the ground-truth labels.
+    """
+    truePositives = int(np.sum(labels & predictions))
+    falsePositives = int(np.sum(~labels & predictions))
+    falseNegatives = int(np.sum(labels & ~predictions))
+
+    precision = truePositives / (truePositives + falsePositives) if truePositives + falsePositives else 0.0
+    recall = truePositives / (truePositives + falseNegatives) if truePositives + falseNegatives else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    delays, incidents = detectionDelays(labels, predictions)
+
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "true_positives": truePositives,
+        "false_positives": falsePositives,
+        "false_negatives": falseNegatives,
+        "incidents": incidents,
+        "incidents_detected": len(delays),
+        "mean_detection_delay": float(delays.mean()) if len(delays) else None,
+        "max_detection_delay": int(delays.max()) if len(delays) else None,
+    }
+
+def backtest(path, trainIterations=3000, window_size=10000, chunkSize=1000, batched=False, seed=None, detector="stl", **modelOptions):
+    """
+    Replay a recorded series with ground-truth labels through a detector at maximum speed.
+
+    Parameters:
+    - path: .npy recording or .csv file (see readChunks).
+    - trainIterations: Number of points used to train the model.
+    - window_size: Number of data points the model holds.
+    - chunkSize: Number of points read from the file at a time.
+    - batched: Score every chunk with predict_batch (one fit per chunk) instead of predict.
+    - seed: Seed of the training data.
+    - detector: Name of the detector in the detectors.DETECTORS registry.
+    - modelOptions: Other keyword arguments of the detector (mode, thresholdMode, ...).
+
+    Returns:
+    - dict: Accuracy (precision/recall/F1, detection delay) and speed (points/sec) of the run.
+    """
+    model = detectors.makeDetector(detector, window_size=window_size, verbose=False, **modelOptions)
+    model.train(trainIterations, seed=seed)
+
+    allLabels, allPredictions = [], []
+    elapsed = 0.0
+    for timestamps, values, labels in readChunks(path, chunkSize):
+        start = time.perf_counter()
+        if batched:
+            for offset in range(0, len(values), window_size):
+                mask, _ = model.predict_batch(values[offset:offset + window_size], timestamps[offset:offset + window_size], window_size)
+                allPredictions.append(mask)
+        else:
+            predictions = np.empty(len(values), dtype=bool)
+            for i, (timestamp, value) in enumerate(zip(timestamps, values)):
+                model.date = pd.Timestamp(timestamp)
+                predictions[i] = model.predict(value, window_size)[0]
+            allPredictions.append(predictions)
+        elapsed += time.perf_counter() - start
+        allLabels.append(np.asarray(labels, dtype=bool))
+    model.close()
+
+    labels, predictions = np.concatenate(allLabels), np.concatenate(allPredictions)
+    report = score(labels, predictions)
+    report.update({"points": len(labels), "points_per_sec": len(labels) / elapsed if elapsed else None,
+                   "detector": detector, "batched": batched, "window_size": window_size, "trainIterations": trainIterations, **modelOptions})
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Labeled replay and backtest of the anomaly detector.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="write a labeled series generated by data.py")
+    generate.add_argument("path", help=".npy or .csv output file")
+    generate.add_argument("--points", type=int, default=10000)
+    generate.add_argument("--contamination", type=int, default=10)
+    generate.add_argument("--train-iterations", type=int, default=3000)
+    generate.add_argument("--seed", type=int, default=0)
+
+    run = commands.add_parser("run", help="replay a labeled series through the detector")
+    run.add_argument("path", help=".npy recording or .csv file with timestamp,value[,label] columns")
+    run.add_argument("--train-iterations", type=int, default=3000)
+    run.add_argument("--window-size", type=int, default=10000)
+    run.add_argument("--chunk-size", type=int, default=1000)
+    run.add_argument("--batched", action="store_true", help="score every chunk with predict_batch")
+    run.add_argument("--detector", default="stl", choices=list(detectors.DETECTORS))
+    run.add_argument("--mode", default="batch", choices=["batch", "online", "forecast"], help="mode of the stl detector")
+    run.add_argument("--threshold", default="frozen", choices=["frozen", "ewm"])
+    run.add_argument("--threshold-buckets", type=int, default=1)
+    run.add_argument("--compact", action="store_true", help="float32 window with implicit hourly timestamps")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--output", help="file the JSON report is written to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        generateRecording(args.path, args.points, args.contamination, args.train_iterations, args.seed)
+        logging.info("Wrote %d points to %s", args.points, args.path)
+        return 0
+
+    report = backtest(args.path, args.train_iterations, args.window_size, args.chunk_size, args.batched, args.seed,
+                      detector=args.detector, mode=args.mode, thresholdMode=args.threshold, thresholdBuckets=args.threshold_buckets,
+                      compact=args.compact)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
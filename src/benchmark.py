@@ -0,0 +1,253 @@
+#custom build modules
+import data
+import detectors
+import sharding
+
+#External Libraries
+import numpy as np
+import argparse
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def benchmarkConfig(window_size, trainIterations, points, mode="batch", contamination=10, seed=0, detector="stl", engine="kernel",
+                    compact=False):
+    """
+    Benchmark a single detector configuration without any GUI or pacing.
+
+    The detector is trained, then fed `points` generated samples one at a time through its predict method
+    while the latency of every call is recorded.
+
+    Parameters:
+    - window_size (int): Number of data points the model holds.
+    - trainIterations (int): Number of points used to train the model.
+    - points (int): Number of points to score after training.
+    - mode (str): STLModel mode, "batch", "online" or "forecast".
+    - contamination (int): Probability of a scored point being anomalous (0-100).
+    - seed (int): Seed of the data generator.
+    - detector (str): Name of the detector in the detectors.DETECTORS registry.
+    - engine (str): STL decomposition engine of the stl detector, "kernel" or "statsmodels".
+    - compact (bool): Keep the window as float32 values with implicit timestamps.
+
+    Returns:
+    - dict: The configuration and its measurements (points/sec, latency percentiles in ms, peak RSS, time-to-first-prediction).
+    """
+    #the stream starts where the training data ended so that the schedule stays aligned
+    values, _ = data.generateCPUDataBulk(points, contamination=contamination, seed=seed, start=trainIterations)
+    latencies = np.empty(points)
+
+    start = time.perf_counter()
+    model = detectors.makeDetector(detector, mode=mode, window_size=window_size, verbose=False, engine=engine, compact=compact)
+    model.train(trainIterations, seed=seed)
+    trained = time.perf_counter()
+
+    for i, value in enumerate(values):
+        before = time.perf_counter()
+        model.predict(value, window_size)
+        latencies[i] = time.perf_counter() - before
+        if i == 0:
+            firstPrediction = time.perf_counter() - start
+
+    total = time.perf_counter() - trained
+    model.close()
+    memory = model.memoryUsage()
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+
+    return {
+        "window_size": window_size,
+        "trainIterations": trainIterations,
+        "detector": detector,
+        "mode": mode if detector == "stl" else None,
+        "engine": engine if detector == "stl" else None,
+        "compact": compact,
+        "points": points,
+        "points_per_sec": points / total,
+        "latency_ms": {"p50": p50, "p95": p95, "p99": p99},
+        "train_sec": trained - start,
+        "time_to_first_prediction_sec": firstPrediction,
+        "anomalies": len(model.anomalyLog),
+        "model_bytes": memory["total"],
+        #ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+#Runs in a fresh interpreter: times the imports a short-lived job pays before its first prediction, and records which
+#heavy libraries are loaded at each step
+STARTUP_PROBE = """
+import json, sys, time
+heavy = lambda: sorted(name for name in ("numpy", "pandas", "statsmodels", "matplotlib") if name in sys.modules)
+start = time.perf_counter()
+import argparse, validation
+validation.parameterValidation(1, 10, {window_size}, {trainIterations})
+validated, atValidation = time.perf_counter(), heavy()
+import models
+imported, atImport = time.perf_counter(), heavy()
+model = models.STLModel(mode="{mode}", window_size={window_size}, verbose=False)
+model.TrainSTLModel({trainIterations}, seed=0)
+model.predict(50.0, {window_size})
+predicted, atPrediction = time.perf_counter(), heavy()
+model.close()
+json.dump({{"validation_sec": validated - start, "import_sec": imported - start, "time_to_first_prediction_sec": predicted - start,
+           "loaded_at_validation": atValidation, "loaded_at_import": atImport, "loaded_at_first_prediction": atPrediction}}, sys.stdout)
+"""
+
+def benchmarkStartup(mode="forecast", window_size=2000, trainIterations=500, repeats=3):
+    """
+    Measure the cold start of a short-lived job: argument validation, importing the detector and time-to-first-prediction,
+    each in a fresh interpreter. The best of `repeats` runs is kept, as the others only add disk cache noise.
+
+    Returns:
+    - dict: The configuration, the timings in seconds and the heavy libraries loaded after each step
+      (validation must load none of them and importing models must not load statsmodels or matplotlib).
+    """
+    probe = STARTUP_PROBE.format(mode=mode, window_size=window_size, trainIterations=trainIterations)
+    source = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", probe], cwd=source, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output))
+
+    result = min(runs, key=lambda run: run["time_to_first_prediction_sec"])
+    result.update({"mode": mode, "window_size": window_size, "trainIterations": trainIterations})
+    logging.info("startup (%s): validation %.3fs, import %.3fs, first prediction %.3fs, loaded at import: %s", mode,
+                 result["validation_sec"], result["import_sec"], result["time_to_first_prediction_sec"], result["loaded_at_import"])
+    return result
+
+def runSweep(windowSizes, trainSizes, points, modes=("batch",), contamination=10, seed=0, detectorNames=("stl",), engine="kernel", compact=False):
+    """
+    Run benchmarkConfig for every valid combination of detector, window size, training size and mode (modes only apply to stl).
+    Each configuration runs in a fresh process so that peak RSS and warm caches do not leak between configurations.
+    Combinations where window_size < trainIterations are skipped, as visualizeData would reject them.
+
+    Returns:
+    - list: One result dict per configuration.
+    """
+    results = []
+    context = multiprocessing.get_context("spawn")
+    configs = [(detector, mode) for detector in detectorNames for mode in (modes if detector == "stl" else (None,))]
+    for detector, mode in configs:
+        for window_size in windowSizes:
+            for trainIterations in trainSizes:
+                if window_size < trainIterations:
+                    continue
+
+                with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    result = pool.submit(benchmarkConfig, window_size, trainIterations, points, mode, contamination, seed, detector, engine, compact).result()
+
+                logging.info("detector=%s mode=%s window_size=%d trainIterations=%d: %.1f points/sec, p50 %.2f ms, p99 %.2f ms, model %d bytes, peak RSS %.1f MB",
+                             detector, mode, window_size, trainIterations, result["points_per_sec"], result["latency_ms"]["p50"],
+                             result["latency_ms"]["p99"], result["model_bytes"], result["peak_rss_mb"])
+                results.append(result)
+    return results
+
+def benchmarkSharding(shardCounts, streams, ticks, trainIterations=500, window_size=2000, mode="batch", contamination=10, seed=0):
+    """
+    Measure how throughput scales with the number of worker processes of a ShardedRunner.
+    Every tick carries one point for each of the streams. The workers are started and every stream model is trained
+    before the clock starts, so only steady-state scoring is measured.
+
+    Returns:
+    - list: One result dict per shard count, with points/sec and the speedup over the first shard count.
+    """
+    values = np.stack([data.generateCPUDataBulk(ticks, contamination=contamination, seed=seed + stream, start=trainIterations)[0]
+                       for stream in range(streams)])
+    results = []
+    for shards in shardCounts:
+        with sharding.ShardedRunner(shards, trainIterations=trainIterations, mode=mode, window_size=window_size) as runner:
+            runner.score((stream, values[stream, 0]) for stream in range(streams)) #trains every model
+
+            start = time.perf_counter()
+            for tick in range(1, ticks):
+                runner.score((stream, values[stream, tick]) for stream in range(streams))
+            elapsed = time.perf_counter() - start
+
+        result = {"shards": shards, "streams": streams, "mode": mode, "window_size": window_size,
+                  "points_per_sec": streams * (ticks - 1) / elapsed}
+        result["speedup"] = result["points_per_sec"] / (results[0]["points_per_sec"] if results else result["points_per_sec"])
+        logging.info("shards=%d: %.1f points/sec (speedup %.2fx)", shards, result["points_per_sec"], result["speedup"])
+        results.append(result)
+    return results
+
+def compareResults(results, baseline, tolerance=0.2):
+    """
+    Compare a sweep against a previous run and return the configurations whose throughput dropped by more than tolerance.
+    """
+    key = lambda r: (r.get("detector", "stl"), r.get("engine"), r.get("compact", False), r["mode"], r["window_size"], r.get("trainIterations"), r.get("shards"))
+    previous = {key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        ratio = result["points_per_sec"] / old["points_per_sec"]
+        if ratio < 1 - tolerance:
+            regressions.append({"config": key(result), "ratio": ratio})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless throughput and latency benchmark of the anomaly detector.")
+    parser.add_argument("--window-sizes", type=int, nargs="+", default=[500, 2000, 5000, 10000, 20000])
+    parser.add_argument("--train-iterations", type=int, nargs="+", default=[500, 3000])
+    parser.add_argument("--points", type=int, default=100, help="points scored per configuration")
+    parser.add_argument("--modes", nargs="+", default=["batch", "online", "forecast"], choices=["batch", "online", "forecast"])
+    parser.add_argument("--detectors", nargs="+", default=["stl"], choices=list(detectors.DETECTORS))
+    parser.add_argument("--engine", default="kernel", choices=["kernel", "statsmodels"], help="STL decomposition engine")
+    parser.add_argument("--compact", action="store_true", help="float32 windows with implicit timestamps")
+    parser.add_argument("--contamination", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark.json", help="file the JSON results are written to")
+    parser.add_argument("--baseline", help="previous results file to check for throughput regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative throughput drop against the baseline")
+    parser.add_argument("--shards", type=int, nargs="+", help="benchmark process sharding with these worker counts instead")
+    parser.add_argument("--streams", type=int, default=64, help="number of streams of the sharding benchmark")
+    parser.add_argument("--startup", action="store_true", help="measure import time and time-to-first-prediction instead")
+    parser.add_argument("--max-startup", type=float, help="with --startup, fail if time-to-first-prediction exceeds this many seconds")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        results = [benchmarkStartup(mode, args.window_sizes[0], args.train_iterations[0]) for mode in args.modes]
+    elif args.shards:
+        results = benchmarkSharding(args.shards, args.streams, args.points, window_size=args.window_sizes[0],
+                                    trainIterations=args.train_iterations[0], mode=args.modes[0],
+                                    contamination=args.contamination, seed=args.seed)
+    else:
+        results = runSweep(args.window_sizes, args.train_iterations, args.points, args.modes, args.contamination, args.seed, args.detectors, args.engine, args.compact)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    logging.info("Results written to %s", args.output)
+
+    if args.startup:
+        slow = [r for r in results if args.max_startup and r["time_to_first_prediction_sec"] > args.max_startup]
+        eager = [r for r in results if set(r["loaded_at_validation"]) or {"statsmodels", "matplotlib"} & set(r["loaded_at_import"])]
+        for result in slow + eager:
+            logging.error("Startup regression: %s", result)
+        return 1 if slow or eager else 0
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compareResults(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            logging.error("Throughput regression: %s", regression)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,21 @@
+import asyncio
 import random
 import time
+import numpy as np
+import pandas as pd
 
-def generateCPUData(contamination = 10, timeOfDay = 0, dayOfWeek = 0, trainMode = False):
+#Date index of the first training point of every model, hour 0 of the simulated schedule (timeOfDay 0, dayOfWeek 0)
+ORIGIN = pd.Timestamp("1-1-2023")
+
+def clock(start):
+  """
+  Returns the (timeOfDay, dayOfWeek) of the simulated schedule at `start`: a date (for example a model's date index,
+  where its training data ended) or a number of hours after ORIGIN.
+  """
+  hours = start if isinstance(start, (int, np.integer)) else int((pd.Timestamp(start) - ORIGIN) // pd.Timedelta(1, "h"))
+  return hours % 24, (hours // 24) % 7
+
+def generateCPUData(contamination = 10, timeOfDay = 0, dayOfWeek = 0, trainMode = False, start = None, seed = None):
   """
   The aim is to simulate CPU utilization of a company employee that works from 8am - 4pm, from monday to friday. 
   This employee leaves his device operational 24/7.
@@ -20,18 +34,24 @@ def generateCPUData(contamination = 10, timeOfDay = 0, dayOfWeek = 0, trainMode
   - timeOfDay (int): Current time of day (0-23).
   - dayOfWeek (int): Current dayOfWeek (0-6).
   - trainMode (bool): Flag to set the function to train mode (for fasting building)
+  - start (pd.Timestamp or int): Date of the first instance, or hours after ORIGIN, instead of timeOfDay and dayOfWeek (see clock).
+  - seed (int): Seed of the random draws, for reproducible streams (the shared random module is used otherwise).
 
   Yields the next instance of the data stream
   """ 
+  if(start is not None):
+    timeOfDay, dayOfWeek = clock(start)
+  rng = random if seed is None else random.Random(seed)
+
   while(True): #infinite loop as this is an infinite generator
 
     #Manual Contaimination
-    contaimNumber = random.randint(1,100) #random num is picked from 1 to 100 
+    contaimNumber = rng.randint(1,100) #random num is picked from 1 to 100 
     if(contaimNumber > (100 - contamination)): #based on the desired contaimination parameter, we set the probability
-      data = noiseData(timeOfDay, dayOfWeek)
+      data = noiseData(timeOfDay, dayOfWeek, rng)
     #Normal Data Generation 
     else:
-      data = getData(timeOfDay, dayOfWeek)
+      data = getData(timeOfDay, dayOfWeek, rng)
 
     #-------Update parameters---------------
     timeOfDay = (timeOfDay + 1) % 24
@@ -44,8 +64,28 @@ def generateCPUData(contamination = 10, timeOfDay = 0, dayOfWeek = 0, trainMode
         time.sleep(0.1) #sleep
     yield data
     
+async def generateCPUDataAsync(contamination = 10, timeOfDay = 0, dayOfWeek = 0, interval = 0.1, start = None):
+  """
+  Asynchronous version of generateCPUData for asyncio pipelines.
+  The same data is produced, but the pacing between two samples is an asyncio.sleep, so the event loop keeps
+  serving the other stages of the pipeline while the source waits.
+
+  Parameters:
+  - contaimination (int): Probability of anomalous generation (0 - 100)
+  - timeOfDay (int): Current time of day (0-23).
+  - dayOfWeek (int): Current dayOfWeek (0-6).
+  - interval (float): Seconds between two samples, 0 only yields control to the event loop.
+  - start (pd.Timestamp or int): Date of the first instance, or hours after ORIGIN, instead of timeOfDay and dayOfWeek.
+
+  Yields the next instance of the data stream
+  """
+  generator = generateCPUData(contamination, timeOfDay, dayOfWeek, trainMode = True, start = start) #pacing is done here instead
+  while(True):
+    await asyncio.sleep(interval)
+    yield next(generator)
+
 #-----------------------------------------------------------
-def getData(timeOfDay, dayOfWeek, ):
+def getData(timeOfDay, dayOfWeek, rng = random):
   """
   Function is responsible for generating regular and seasonal data.
   Regular data: Downtime
@@ -54,6 +94,7 @@ def getData(timeOfDay, dayOfWeek, ):
   Parameters:
   - timeOfDay (int): Current time of day (0-23).
   - dayOfWeek (int): Current dayOfWeek (0-6).
+  - rng: Source of the random draws, the random module or a random.Random.
 
   Returns:
   - float: Simulated CPU utilization value.
@@ -61,16 +102,16 @@ def getData(timeOfDay, dayOfWeek, ):
   #---------Get the Data----------------
   #Check if downtime (weekends or from 4pm to 8am)
   if(5 <= dayOfWeek < 7 or 0 <= timeOfDay < 8 or 17 <= timeOfDay < 24):  
-     x = downTime()
+     x = downTime(rng)
   else:
      #else need to check other parameters before deciding
-    x = upTime()
+    x = upTime(rng)
 
   return x
   #---------------------------------------
 
 
-def noiseData(timeOfDay, dayOfWeek):
+def noiseData(timeOfDay, dayOfWeek, rng = random):
   """
   Function is responsible for generating irregular data/anomalies
   First identifies what is supposed to be the appropriate response and returns one of the other two responses.
@@ -78,7 +119,7 @@ def noiseData(timeOfDay, dayOfWeek):
   Parameters:
   - timeOfDay (int): Current time of day (0-23).
   - dayOfWeek (int): Current day (0-6).
-
+  - rng: Source of the random draws, the random module or a random.Random.
 
   Returns:
   - float: Simulated anomalous CPU utilization value.
@@ -90,25 +131,161 @@ def noiseData(timeOfDay, dayOfWeek):
   else:
     responses.remove(upTime)
   
-  return random.choice(responses)() #Pick a random choice
+  return rng.choice(responses)(rng) #Pick a random choice
   
+#-----------------------------------------------------------
+def generateCPUDataBulk(instances, contamination = 10, timeOfDay = 0, dayOfWeek = 0, seed = None, start = None):
+  """
+  Vectorized counterpart of generateCPUData, returns a whole block of samples in one call.
+  The same employee schedule is simulated, but the hour-of-day/day-of-week masks, the contamination draw and the
+  value draws are all done on NumPy arrays with a seeded numpy.random.Generator instead of one Python call per sample.
+
+  Parameters:
+  - instances (int): Number of samples to generate.
+  - contaimination (int): Probability of anomalous generation (0 - 100)
+  - timeOfDay (int): Time of day of the first sample (0-23).
+  - dayOfWeek (int): dayOfWeek of the first sample (0-6).
+  - seed (int): Seed of the random generator, for reproducible data sets.
+  - start (pd.Timestamp or int): Date of the first sample, or hours after ORIGIN, instead of timeOfDay and dayOfWeek.
+
+  Returns:
+  - (np.ndarray, np.ndarray): The simulated CPU utilization values and a boolean array flagging the contaminated samples.
+  """
+  if(start is not None):
+    timeOfDay, dayOfWeek = clock(start)
+  rng = np.random.default_rng(seed)
+  low, high, heavy = parseBoundaries()
+
+  #Clock of every sample
+  hours = dayOfWeek * 24 + timeOfDay + np.arange(instances)
+  hourOfDay = hours % 24
+  day = (hours // 24) % 7
+  downtime = (day >= 5) | (hourOfDay < 8) | (hourOfDay >= 17) #same schedule as getData
+
+  #Manual Contaimination, same probability as randint(1,100) > (100 - contamination)
+  labels = rng.integers(1, 101, size=instances) > (100 - contamination)
+
+  #Normal Data Generation: downtime or uptime depending on the schedule
+  values = np.where(downtime, rng.uniform(*low, size=instances), rng.uniform(*high, size=instances))
+
+  #Anomalies: one of the two responses that do not fit the schedule (see noiseData)
+  heavyChoice = rng.integers(0, 2, size=instances).astype(bool)
+  wrongResponse = np.where(downtime, rng.uniform(*high, size=instances), rng.uniform(*low, size=instances))
+  noise = np.where(heavyChoice, rng.uniform(*heavy, size=instances), wrongResponse)
+  values = np.where(labels, noise, values)
+
+  return values, labels
+
+#-----------------------------------------------------------
+#Per-host parameters of a simulated fleet: local work hours, timezone (hours from UTC), downtime and uptime ranges,
+#contamination (0-100), drift (utilization points per hour) and the hour the drift starts
+FLEET_PROFILE = np.dtype([("workStart", "i8"), ("workEnd", "i8"), ("timezone", "i8"), ("downLow", "f8"), ("downHigh", "f8"),
+                          ("upLow", "f8"), ("upHigh", "f8"), ("contamination", "f8"), ("drift", "f8"), ("driftStart", "i8")])
+
+def fleetProfiles(hosts, seed = None, shift = 2, timezones = (-8, 8), spread = 5, contamination = (0, 10), drift = 0.02, driftShare = 0.1, start = 0):
+  """
+  Draw the profile of every host of a simulated fleet. Every host follows the employee schedule of generateCPUData, but
+  with its own variations.
+
+  Parameters:
+  - hosts (int): Number of hosts.
+  - seed (int or numpy.random.Generator): Seed of the random draws, for reproducible fleets.
+  - shift (int): Work hours start up to shift hours before or after 8am (the work day keeps its length).
+  - timezones (tuple): Range of the timezone offsets in hours.
+  - spread (float): The downtime and uptime ranges move by up to spread points.
+  - contamination (tuple): Range of the per-host contamination (0 - 100).
+  - drift (float): Largest drift in utilization points per hour, up or down.
+  - driftShare (float): Share of the hosts that drift.
+  - start (int): Hour the drift starts, counted like the hours of generateFleetDataBulk.
+
+  Returns:
+  - np.ndarray: One FLEET_PROFILE record per host.
+  """
+  rng = np.random.default_rng(seed)
+  low, high, heavy = parseBoundaries()
+  profiles = np.zeros(hosts, dtype = FLEET_PROFILE)
+
+  profiles["workStart"] = 8 + rng.integers(-shift, shift + 1, size = hosts)
+  profiles["workEnd"] = profiles["workStart"] + 9 #same length as the 8am - 5pm day of getData
+  profiles["timezone"] = rng.integers(timezones[0], timezones[1] + 1, size = hosts)
+
+  profiles["downLow"] = low[0]
+  profiles["downHigh"] = low[1] + rng.uniform(0, spread, size = hosts)
+  profiles["upLow"] = high[0] + rng.uniform(-spread, spread, size = hosts)
+  profiles["upHigh"] = high[1] + rng.uniform(-spread, spread, size = hosts)
+
+  profiles["contamination"] = rng.uniform(*contamination, size = hosts)
+  drifting = rng.random(hosts) < driftShare
+  profiles["drift"] = np.where(drifting, rng.uniform(-drift, drift, size = hosts), 0.0)
+  profiles["driftStart"] = start
+  return profiles
+
+def generateFleetDataBulk(profiles, instances, startHour = 0, seed = None):
+  """
+  Fleet counterpart of generateCPUDataBulk: `instances` consecutive hours of samples for every host of a fleet at once.
+  Hours are counted in UTC from Monday 0:00, each host applies its own timezone and work hours (see fleetProfiles),
+  its contamination rate and its drift, and the values are clipped to 0 - 100.
+
+  Parameters:
+  - profiles (np.ndarray): FLEET_PROFILE records, one per host.
+  - instances (int): Number of hours to generate.
+  - startHour (int): UTC hour of the first sample.
+  - seed (int or numpy.random.Generator): Seed of the random draws, pass the same Generator to continue a simulation.
+
+  Returns:
+  - (np.ndarray, np.ndarray): The values and the contamination labels, both (instances, hosts).
+  """
+  rng = np.random.default_rng(seed)
+  low, high, heavy = parseBoundaries()
+  shape = (instances, len(profiles))
+
+  #Local clock of every sample
+  hours = startHour + np.arange(instances)[:, None]
+  local = hours + profiles["timezone"]
+  hourOfDay = local % 24
+  day = (local // 24) % 7
+  downtime = (day >= 5) | (hourOfDay < profiles["workStart"]) | (hourOfDay >= profiles["workEnd"])
+
+  labels = rng.uniform(0, 100, size = shape) < profiles["contamination"]
+
+  #Normal Data Generation with the ranges of every host
+  values = np.where(downtime, rng.uniform(profiles["downLow"], profiles["downHigh"], size = shape),
+                    rng.uniform(profiles["upLow"], profiles["upHigh"], size = shape))
+
+  #Anomalies: one of the two responses that do not fit the schedule, as in generateCPUDataBulk
+  heavyChoice = rng.integers(0, 2, size = shape).astype(bool)
+  wrongResponse = np.where(downtime, rng.uniform(profiles["upLow"], profiles["upHigh"], size = shape),
+                           rng.uniform(profiles["downLow"], profiles["downHigh"], size = shape))
+  noise = np.where(heavyChoice, rng.uniform(*heavy, size = shape), wrongResponse)
+  values = np.where(labels, noise, values)
+
+  #Injected drift
+  values = values + profiles["drift"] * np.maximum(hours - profiles["driftStart"], 0)
+  return np.clip(values, 0, 100), labels
+
 #-----------------------------------------------------------
 
 boundaries = "0110206070"
 
+def parseBoundaries():
+  #Returns the (downTime, upTime, heavyLoad) ranges encoded in boundaries
+  return ((int(boundaries[0:2]), int(boundaries[2:4])),
+          (int(boundaries[4:6]), int(boundaries[6:8])),
+          (int(boundaries[8:10]), 100))
+
 #------data events---------------------
 
-def downTime():
+def downTime(rng = random):
   #downtime range from 1 - 10% (default)
-  return random.uniform(int(boundaries[0:2]),int(boundaries[2:4])) 
+  return rng.uniform(int(boundaries[0:2]),int(boundaries[2:4])) 
 
-def upTime():
+def upTime(rng = random):
   #uptime range from 20 - 60% (default)
-  return random.uniform(int(boundaries[4:6]), int(boundaries[6:8]))
+  return rng.uniform(int(boundaries[4:6]), int(boundaries[6:8]))
 
-def heavyLoad():
+def heavyLoad(rng = random):
     #HeavyLoad range from 70 - 100% (default)
-  return random.uniform(int(boundaries[8:10]),100) 
+  return rng.uniform(int(boundaries[8:10]),100) 
 
 
 #--------Extra Functions
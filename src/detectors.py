@@ -0,0 +1,233 @@
+#custom build modules
+import models
+from history import TieredHistory
+from models import Detector
+from thresholds import HOUR, bucketMoments
+
+#External Libraries
+import numpy as np
+import pandas as pd
+
+class ProfileDetector(Detector):
+    """
+    Seasonal-profile z-score: the mean and standard deviation of every hour of the week are learned from the training
+    data, and a point's residual is its z-score against the profile of its hour. Scoring is a lookup and a division.
+    With alpha > 0 the profile follows drift with an exponentially weighted update (points clipped to the thresholds
+    first, so anomalies barely move it).
+    A bucket learned from fewer than minCount training points (about 3 per hour of the week for 500 points) would get
+    statistics too noisy to score against, so it takes those of its hour of the day, learned from the 7 days together.
+
+    Class Attributes:
+        - buckets: Number of hour-of-week buckets (168 for weekly seasonality, 24 for daily).
+        - alpha: Weight of a new point in the profile update, 0 keeps the profile frozen.
+        - minCount: Training points a bucket needs to keep its own statistics.
+        - mean, variance: The profile of every bucket.
+    """
+    __slots__ = ("buckets", "alpha", "minCount", "mean", "variance")
+
+    def __init__(self, buckets=168, alpha=0.02, minCount=10, **options):
+        super().__init__(**options)
+        self.buckets = buckets
+        self.alpha = alpha
+        self.minCount = minCount
+        models.checkMemoryBudget(self)
+
+    def stateBytes(self):
+        #The profile, allocated by train
+        return 16 * self.buckets
+
+    def learn(self, values, timestamps):
+        buckets = (timestamps // HOUR) % self.buckets
+        counts, mean, scatter = bucketMoments(values, buckets, self.buckets)
+
+        #Buckets without enough training points fall back to the statistics of their hour of the day (buckets that are
+        #not hours of the week fall back to the global statistics), and those to the global ones when they have none
+        period = 24 if self.buckets % 24 == 0 else 1
+        hourCounts, hourMean, hourScatter = bucketMoments(values, (timestamps // HOUR) % period, period)
+        hourVariance = np.where(hourCounts > 1, hourScatter / np.maximum(hourCounts - 1, 1), values.var(ddof=1))
+        hours = np.arange(self.buckets) % period
+
+        reliable = counts >= max(self.minCount, 2)
+        self.mean = np.where(reliable, mean, np.where(hourCounts > 0, hourMean, values.mean())[hours])
+        self.variance = np.maximum(np.where(reliable, scatter / np.maximum(counts - 1, 1), hourVariance[hours]), 1e-12)
+        return (values - self.mean[buckets]) / np.sqrt(self.variance[buckets])
+
+    def scoreOne(self, value, timestamp):
+        bucket = (timestamp // HOUR) % self.buckets
+        mean, variance = self.mean[bucket], self.variance[bucket]
+        deviation = np.sqrt(variance)
+        residual = (value - mean) / deviation
+
+        if self.alpha:
+            clipped = mean + min(max(residual, -self.threshold_factor), self.threshold_factor) * deviation
+            difference = clipped - mean
+            self.mean[bucket] = mean + self.alpha * difference
+            self.variance[bucket] = (1 - self.alpha) * (variance + self.alpha * difference ** 2)
+        return residual
+
+    def score(self, values, timestamps):
+        if not self.alpha:
+            buckets = (timestamps // HOUR) % self.buckets
+            return (values - self.mean[buckets]) / np.sqrt(self.variance[buckets])
+
+        #Hourly points of one block of `buckets` consecutive hours fall in distinct buckets, so each block is one vector update
+        residuals = np.empty(len(values))
+        for start in range(0, len(values), self.buckets):
+            block, stamps = values[start:start + self.buckets], timestamps[start:start + self.buckets]
+            buckets = (stamps // HOUR) % self.buckets
+            mean, variance = self.mean[buckets], self.variance[buckets]
+            deviation = np.sqrt(variance)
+            residuals[start:start + len(block)] = residual = (block - mean) / deviation
+
+            difference = np.clip(residual, -self.threshold_factor, self.threshold_factor) * deviation
+            self.mean[buckets] = mean + self.alpha * difference
+            self.variance[buckets] = (1 - self.alpha) * (variance + self.alpha * difference ** 2)
+        return residuals
+
+class MADDetector(Detector):
+    """
+    Rolling median/MAD: a point's residual is its distance to the median of the previous `length` points, in units of
+    their (normal-consistent) median absolute deviation. The statistics are robust, so anomalies in the history do not
+    need to be clipped, and there is no state besides the window.
+
+    Class Attributes:
+        - length: Number of previous points the median and MAD are taken over.
+    """
+    __slots__ = ("length",)
+
+    def __init__(self, length=9, **options):
+        super().__init__(**options)
+        self.length = length
+        models.checkMemoryBudget(self)
+
+    def robustScores(self, history, values):
+        #z-like score of every value against the `length` points before it
+        windows = np.lib.stride_tricks.sliding_window_view(np.concatenate([history, values]), self.length)[:len(values)]
+        median = np.median(windows, axis=1)
+        mad = 1.4826 * np.median(np.abs(windows - median[:, None]), axis=1)
+        return (values - median) / np.maximum(mad, 1e-9)
+
+    def learn(self, values, timestamps):
+        if self.length >= len(values):
+            raise ValueError("the training set must be longer than the rolling window.")
+        return self.robustScores(values[:self.length], values[self.length:])
+
+    def scoreOne(self, value, timestamp):
+        history, _ = self.window.view()
+        return self.robustScores(history[-self.length:], np.array([value]))[0]
+
+    def score(self, values, timestamps):
+        history, _ = self.window.view()
+        return self.robustScores(history[-self.length:], values)
+
+class EWMADetector(Detector):
+    """
+    EWMA residual: a point's residual is its distance to an exponentially weighted moving average of the previous
+    points. One multiply-add per point; points are clipped to the thresholds before they update the average.
+
+    Class Attributes:
+        - alpha: Weight of a new point in the moving average.
+        - level: The moving average.
+    """
+    __slots__ = ("alpha", "level")
+
+    def __init__(self, alpha=0.3, **options):
+        super().__init__(**options)
+        self.alpha = alpha
+        models.checkMemoryBudget(self)
+
+    def learn(self, values, timestamps):
+        residuals = np.empty(len(values) - 1)
+        self.level = values[0]
+        for i, value in enumerate(values[1:]):
+            residuals[i] = value - self.level
+            self.level += self.alpha * residuals[i]
+        return residuals
+
+    def scoreOne(self, value, timestamp):
+        residual = value - self.level
+        self.level += self.alpha * min(max(residual, self.lower), self.upper)
+        return residual
+
+class TieredDetector(Detector):
+    """
+    Seasonal baseline from a multi-resolution history (see TieredHistory): only the most recent points are kept at full
+    resolution, older points are folded into an hour-of-week profile. A point's residual is its
+    z-score against the profile of its hour, shifted by the drift of the recent tier (the median distance of the
+    recent points to their profile), so the trend is followed without keeping weeks of raw points. Memory and scoring
+    cost depend on the size of the recent tier only, not on the length of the history; window_size and compact are ignored.
+
+    Class Attributes:
+        - history: The TieredHistory, whose recent tier is also the detector's window.
+    """
+    __slots__ = ("history",)
+
+    def __init__(self, recent=336, alpha=0.1, **options):
+        options["window_size"] = recent #the window is replaced by the recent tier
+        super().__init__(**options)
+        self.history = TieredHistory(recent, 168, alpha, self.threshold_factor)
+        self.window = self.history.recent
+        models.checkMemoryBudget(self)
+
+    def stateBytes(self):
+        #The aggregates of the history, the recent tier is counted as the window
+        return self.history.nbytes() - self.window.nbytes()
+
+    def remember(self, value, timestamp, window_size):
+        self.history.append(value, timestamp)
+
+    def rememberBlock(self, values, timestamps, window_size):
+        self.history.extend(values, timestamps)
+
+    def drift(self, mean):
+        #Median distance of the recent points to the profile of their bucket
+        values, timestamps = self.history.recent.view()
+        if len(values) == 0:
+            return 0.0
+        #Median with a partial sort, np.median costs more than the partition itself on a few hundred points
+        distances = values - mean[self.history.bucket(timestamps)]
+        middle = len(distances) // 2
+        distances.partition((middle - 1, middle) if middle else middle)
+        return distances[middle] if len(distances) % 2 else (distances[middle - 1] + distances[middle]) / 2
+
+    def learn(self, values, timestamps):
+        #The profile is seeded from the training points older than the recent tier, which profile() combines with the recent
+        #ones: a bucket with training points keeps a positive deviation as points are folded in
+        self.history.seed(values, timestamps)
+        _, deviation = self.history.profile()
+        if not np.all(deviation > 0):
+            raise ValueError("the training data has no spread in some hours of the week, the tiered detector cannot score against them.")
+        return self.score(values, timestamps)
+
+    def scoreOne(self, value, timestamp):
+        mean, deviation = self.history.profile()
+        bucket = self.history.bucket(timestamp)
+        return (value - mean[bucket] - self.drift(mean)) / deviation[bucket]
+
+    def score(self, values, timestamps):
+        #The profile and the drift in force at the start of the block are used for the whole block
+        mean, deviation = self.history.profile()
+        buckets = self.history.bucket(timestamps)
+        return (values - mean[buckets] - self.drift(mean)) / deviation[buckets]
+
+#Registry of the detectors selectable by name, see makeDetector
+DETECTORS = {
+    "stl": models.STLModel,
+    "profile": ProfileDetector,
+    "mad": MADDetector,
+    "ewma": EWMADetector,
+    "tiered": TieredDetector,
+}
+
+def makeDetector(name="stl", **options):
+    """
+    Returns a new, untrained detector selected by name from DETECTORS.
+    The options are passed to its constructor; STL-only options (mode, refitInterval, ...) are dropped for the
+    other detectors.
+    """
+    if name not in DETECTORS:
+        raise ValueError(f"detector must be one of {', '.join(DETECTORS)}.")
+    if name != "stl":
+        for option in ("mode", "period", "refitInterval", "smoothing", "refitSeconds", "engine"):
+            options.pop(option, None)
+    return DETECTORS[name](**options)
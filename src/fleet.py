@@ -0,0 +1,217 @@
+#custom build modules
+import data
+
+#External Libraries
+import numpy as np
+import pandas as pd
+
+def classicalDecomposition(values, period):
+    """
+    Vectorized classical (moving average) seasonal decomposition of many series at once.
+
+    The trend is a centered moving average of one period (2 x period for even periods), computed with cumulative sums along
+    the time axis, and the seasonal profile is the mean detrended value of every position in the cycle.
+
+    Parameters:
+    - values (np.ndarray): 2-D array (streams x time) of equally spaced observations.
+    - period (int): Length of the seasonal cycle.
+
+    Returns:
+    - (np.ndarray, np.ndarray): The trend (streams x time, NaN where the moving average is not defined) and the
+      seasonal profile (streams x period, indexed by position in the cycle counted from the first column).
+    """
+    streams, length = values.shape
+    if length < 2 * period:
+        raise ValueError("at least two full periods are required to decompose the series.")
+
+    cumulative = np.zeros((streams, length + 1))
+    np.cumsum(values, axis=1, out=cumulative[:, 1:])
+    average = (cumulative[:, period:] - cumulative[:, :-period]) / period
+
+    trend = np.full((streams, length), np.nan)
+    if period % 2:
+        trend[:, period // 2:length - period // 2] = average
+    else:
+        trend[:, period // 2:length - period // 2] = (average[:, 1:] + average[:, :-1]) / 2
+
+    detrended = values - trend
+    profile = np.empty((streams, period))
+    for position in range(period):
+        profile[:, position] = np.nanmean(detrended[:, position::period], axis=1)
+
+    #The seasonal component must not carry any level, that belongs to the trend
+    profile -= profile.mean(axis=1, keepdims=True)
+    return trend, profile
+
+class MultiStreamDetector:
+    """
+    MultiStreamDetector scores many series (for example the hourly CPU utilization of a whole fleet) in one process.
+
+    Instead of one STLModel per host, all state lives in 2-D NumPy arrays with one row per stream: a circular window
+    (streams x window_size), the seasonal profile (streams x period) and the level/slope of the trend. A tick carries one
+    value for every stream and is scored with a handful of vectorized operations, using the same incremental
+    Holt-Winters decomposition as the online mode of STLModel. Each stream keeps its own thresholds from training.
+
+    Class Attributes:
+        - streams: Number of series monitored.
+        - window: Circular buffer of the recent values (streams x window_size), used for the periodic refits.
+        - timestamps: Timestamp (ns) of every column of the window, shared by all streams.
+        - seasonalProfile, level, slope: Incremental decomposition state of every stream.
+        - lower, upper: Per-stream thresholds for anomaly detection.
+        - anomalyCount: Number of anomalies detected per stream.
+    """
+
+    def __init__(self, streams, window_size=720, period=24, threshold=3, refitInterval=168,
+                 smoothing=(0.1, 0.01, 0.1), dtype=np.float32):
+        if window_size < 2 * period:
+            raise ValueError("window_size must hold at least two periods.")
+
+        self.streams = streams
+        self.window_size = window_size
+        self.period = period
+        self.threshold_factor = threshold
+        self.refitInterval = refitInterval
+        self.smoothing = smoothing
+
+        self.window = np.zeros((streams, window_size), dtype=dtype)
+        self.timestamps = np.zeros(window_size, dtype=np.int64)
+        self.head = 0
+        self.size = 0
+
+        self.seasonalProfile = np.zeros((streams, period))
+        self.level = np.zeros(streams)
+        self.slope = np.zeros(streams)
+        self.lower = np.full(streams, -np.inf)
+        self.upper = np.full(streams, np.inf)
+        self.anomalyCount = np.zeros(streams, dtype=np.int64)
+
+        self.phase = 0
+        self.sinceRefit = 0
+        self.date = data.ORIGIN
+
+    def memoryPerStream(self):
+        """
+        Returns the number of bytes of state held for each stream.
+        """
+        perStream = self.window.itemsize * self.window_size + self.seasonalProfile.itemsize * self.period
+        perStream += 5 * 8 #level, slope, lower, upper and anomaly count
+        return perStream
+
+    def append(self, values):
+        #Write one tick into the circular window
+        self.window[:, self.head] = values
+        self.timestamps[self.head] = self.date.value
+        self.head = (self.head + 1) % self.window_size
+        self.size = min(self.size + 1, self.window_size)
+
+    def recent(self):
+        """
+        Returns a copy of the window, oldest column first.
+        """
+        order = (self.head - self.size + np.arange(self.size)) % self.window_size
+        return self.window[:, order]
+
+    def resetState(self, values, phase):
+        """
+        Initialise the incremental state of every stream from a classical decomposition of values (streams x time).
+        phase is the position in the cycle of the first column. The state is positioned at the start of the values,
+        so that they can be replayed through the incremental update.
+        """
+        values = np.asarray(values, dtype=np.float64)
+
+        #Missing samples are filled with the stream mean, the moving averages cannot skip them
+        if np.isnan(values).any():
+            values = np.where(np.isnan(values), np.nanmean(values, axis=1, keepdims=True), values)
+
+        trend, profile = classicalDecomposition(values, self.period)
+
+        #Align the profile so that seasonalProfile[:, i] belongs to cycle position i
+        self.seasonalProfile = np.roll(profile, phase, axis=1)
+
+        first = self.period // 2
+        self.slope = (trend[:, first + self.period] - trend[:, first]) / self.period
+        self.level = trend[:, first] - self.slope * (first + 1)
+        self.phase = phase
+
+    def update(self, values, clip=True):
+        """
+        Score one tick for all streams against the incremental state and fold it into the state.
+        Streams whose value is NaN (missing sample) are left untouched.
+        Returns the residuals of the tick.
+        """
+        alpha, beta, gamma = self.smoothing
+        seasonal = self.seasonalProfile[:, self.phase]
+        forecast = self.level + self.slope
+        residuals = values - seasonal - forecast
+
+        present = ~np.isnan(residuals)
+        clipped = np.clip(residuals, self.lower, self.upper) if clip else residuals
+        clipped = np.where(present, clipped, 0.0)
+
+        level = forecast + alpha * clipped
+        self.slope = np.where(present, self.slope + beta * (level - self.level - self.slope), self.slope)
+        self.level = np.where(present, level, self.level)
+        self.seasonalProfile[:, self.phase] = seasonal + gamma * (clipped + forecast - level)
+
+        self.phase = (self.phase + 1) % self.period
+        return residuals
+
+    def train(self, values):
+        """
+        Train the detector on historical values (streams x time) and set the per-stream thresholds.
+        The state is initialised from a classical decomposition of the training data, the training data is then replayed
+        through the incremental update, and the thresholds are set from the mean and standard deviation of the residuals
+        of that replay, so that they match the residuals produced while scoring.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape[0] != self.streams:
+            raise ValueError("values must have one row per stream.")
+
+        self.resetState(values, phase=0)
+        residuals = np.empty_like(values)
+        for column in range(values.shape[1]):
+            residuals[:, column] = self.update(values[:, column], clip=False)
+            self.append(values[:, column])
+            self.date += pd.Timedelta(1, "h")
+
+        #the first cycle only serves to settle the state
+        settled = residuals[:, self.period:]
+        resid_mu = settled.mean(axis=1)
+        resid_dev = settled.std(axis=1, ddof=1)
+        self.lower = resid_mu - self.threshold_factor * resid_dev
+        self.upper = resid_mu + self.threshold_factor * resid_dev
+        self.sinceRefit = 0
+
+    def refit(self):
+        """
+        Correct the incremental state of every stream from a classical decomposition of the current window.
+        The window is replayed through the update, without touching the thresholds.
+        """
+        values = self.recent().astype(np.float64)
+        self.resetState(values, phase=(self.phase - values.shape[1]) % self.period)
+        for column in range(values.shape[1]):
+            self.update(values[:, column])
+        self.sinceRefit = 0
+
+    def tick(self, values):
+        """
+        Score one new value for every stream.
+
+        Parameters:
+        - values (array-like): One value per stream, NaN for streams without a sample in this tick.
+
+        Returns a tuple (mask, residuals) of arrays with one entry per stream.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        residuals = self.update(values)
+        self.append(values)
+        self.date += pd.Timedelta(1, "h")
+
+        #Vectorized threshold comparison across streams (NaN compares False)
+        mask = (residuals < self.lower) | (residuals > self.upper)
+        self.anomalyCount += mask
+
+        self.sinceRefit += 1
+        if self.sinceRefit >= self.refitInterval:
+            self.refit()
+        return mask, residuals
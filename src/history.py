@@ -0,0 +1,169 @@
+from thresholds import HOUR, bucketMoments
+from window import RingBuffer
+import numpy as np
+
+class TieredHistory:
+    """
+    TieredHistory keeps a long stream history in a fixed amount of memory, at decreasing resolution.
+
+    - recent: the last `recent` points at full resolution, in a RingBuffer.
+    - profile: per hour-of-week bucket, the exponentially weighted mean and variance of the points that left the recent
+      tier. This is the seasonal baseline, and with it the weekly seasonality no longer needs a window of weeks of raw
+      points. The weight of a point is 1 / count until a bucket has seen 1 / alpha points, so the profile is a plain
+      average at first and then forgets old weeks. Points are clipped to the bucket's mean +/- clip standard deviations
+      before they are folded in, so anomalies barely move it. A bucket that has seen fewer than minCount points uses the
+      statistics of its hour of the day instead (see profile).
+
+    The trend is not kept at a coarser resolution: the detector follows it from the recent tier (see TieredDetector.drift).
+    Memory is about 32 * recent + 24 * buckets bytes, whatever the length of the stream.
+
+    Class Attributes:
+        - recent: Ring buffer of the most recent points.
+        - buckets: Number of hour-of-week buckets of the profile.
+        - alpha: Smallest weight of a point in the profile.
+        - clip: Number of standard deviations points are clipped to before being folded into the profile.
+        - minCount: Points a bucket needs to have seen before its own statistics are used.
+        - count, mean, variance: The profile of every bucket.
+        - seeded: Timestamp (ns) the training points the profile was seeded from end at, those are not folded in again.
+        - cached: The last result of profile(), dropped whenever the profile changes.
+    """
+
+    def __init__(self, recent=336, buckets=168, alpha=0.1, clip=3, minCount=10):
+        self.recent = RingBuffer(recent)
+        self.buckets = buckets
+        self.alpha = alpha
+        self.clip = clip
+        self.minCount = minCount
+        self.count = np.zeros(buckets)
+        self.mean = np.zeros(buckets)
+        self.variance = np.zeros(buckets)
+        self.seeded = np.iinfo(np.int64).min
+        self.cached = None
+
+    def __len__(self):
+        return len(self.recent)
+
+    def nbytes(self):
+        #Memory held by the history
+        arrays = (self.recent.values, self.recent.timestamps, self.count, self.mean, self.variance)
+        return sum(array.nbytes for array in arrays)
+
+    def bucket(self, timestamps):
+        #Hour-of-week bucket of the given timestamps (ns)
+        return (timestamps // HOUR) % self.buckets
+
+    def append(self, value, timestamp):
+        """
+        Add a single point: it enters the recent tier and the oldest recent point is folded into the profile.
+        """
+        recent = self.recent
+        #The training points the profile was seeded from are not folded in again
+        if len(recent) == recent.capacity and recent.timestamps[recent.head] >= self.seeded:
+            self.fold(recent.values[recent.head], recent.timestamps[recent.head])
+        recent.append(value, timestamp)
+
+    def extend(self, values, timestamps):
+        """
+        Add a block of points in bulk, with the same result as appending them one by one.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if len(values) == 0:
+            return
+
+        #Points of the recent tier and of the block that do not fit in the recent tier any more, oldest first
+        current, currentTimestamps = self.recent.view()
+        leaving = len(current) + len(values) - self.recent.capacity
+        if leaving > 0:
+            olderValues = np.concatenate([current, values])[:leaving]
+            olderTimestamps = np.concatenate([currentTimestamps, timestamps])[:leaving]
+            #The training points the profile was seeded from are not folded in again
+            unseeded = olderTimestamps >= self.seeded
+            olderValues, olderTimestamps = olderValues[unseeded], olderTimestamps[unseeded]
+            #Consecutive hourly points of one block of `buckets` hours fall in distinct buckets, so each block is one vector update
+            for start in range(0, len(olderValues), self.buckets):
+                self.foldBlock(olderValues[start:start + self.buckets], olderTimestamps[start:start + self.buckets])
+
+        self.recent.extend(values, timestamps)
+
+    def fold(self, value, timestamp):
+        #Fold one point that leaves the recent tier into the profile of its bucket, scalar version of foldBlock
+        self.cached = None
+        bucket = self.bucket(timestamp)
+        count, mean, variance = self.count[bucket] + 1, self.mean[bucket], self.variance[bucket]
+        deviation = variance ** 0.5
+        if count > 2 and deviation > 0:
+            value = min(max(value, mean - self.clip * deviation), mean + self.clip * deviation)
+
+        weight = max(1 / count, self.alpha)
+        difference = value - mean
+        increment = weight * difference
+        self.count[bucket] = count
+        self.mean[bucket] = mean + increment
+        self.variance[bucket] = (1 - weight) * (variance + difference * increment)
+
+    def foldBlock(self, values, timestamps):
+        #Fold points of distinct buckets into the profile in one vector update (West's weighted mean and variance)
+        self.cached = None
+        buckets = self.bucket(timestamps)
+        count, mean, variance = self.count[buckets] + 1, self.mean[buckets], self.variance[buckets]
+        deviation = np.sqrt(variance)
+        limited = (count > 2) & (deviation > 0)
+        values = np.where(limited, np.clip(values, mean - self.clip * deviation, mean + self.clip * deviation), values)
+
+        weight = np.maximum(1 / count, self.alpha)
+        difference = values - mean
+        increment = weight * difference
+        self.count[buckets] = count
+        self.mean[buckets] = mean + increment
+        self.variance[buckets] = (1 - weight) * (variance + difference * increment)
+
+    def seed(self, values, timestamps):
+        """
+        Set the profile from a block of training points, replacing what was folded so far. All the points are used,
+        including those still in the recent tier: a training set of a few weeks leaves only a few points per bucket
+        otherwise, and none at all when it fits in the recent tier. Points up to the end of the block are then no longer
+        folded when they leave the recent tier, so that none of them is counted twice.
+        """
+        timestamps = np.asarray(timestamps)
+        self.count, self.mean, scatter = bucketMoments(np.asarray(values, dtype=np.float64), self.bucket(timestamps), self.buckets)
+        self.count = self.count.astype(np.float64)
+        self.variance = scatter / np.maximum(self.count, 1)
+        self.seeded = int(timestamps[-1]) + 1
+        self.cached = None
+
+    def profile(self):
+        """
+        Returns the (mean, standard deviation) of every hour-of-week bucket.
+        Buckets that have seen fewer than minCount points, whose statistics are mostly noise, fall back to the combined
+        statistics of the buckets of the same hour of the day (all the buckets when they are not hours of the week),
+        and those to the statistics of all buckets when they have seen fewer than minCount points too.
+        """
+        if self.cached is None:
+            self.cached = self.computeProfile()
+        return self.cached
+
+    def computeProfile(self):
+        #Body of profile(), whose result is cached until the profile changes
+        count, mean, variance = self.count, self.mean, self.variance
+        reliable = count >= self.minCount
+        if reliable.all():
+            return mean, np.sqrt(variance)
+
+        period = 24 if self.buckets % 24 == 0 else 1
+        groups = np.arange(self.buckets) % period
+        groupCount, groupMean, groupVariance = pooled(count, mean, variance, groups, period)
+        _, totalMean, totalVariance = pooled(count, mean, variance, np.zeros(self.buckets, dtype=np.int64), 1)
+        sparse = groupCount < self.minCount
+        groupMean[sparse], groupVariance[sparse] = totalMean[0], totalVariance[0]
+
+        mean = np.where(reliable, mean, groupMean[groups])
+        deviation = np.sqrt(np.where(reliable, variance, groupVariance[groups]))
+        return mean, deviation
+
+def pooled(count, mean, variance, groups, size):
+    #Count, mean and variance of the points of every group of buckets (law of total variance)
+    groupCount = np.bincount(groups, weights=count, minlength=size)
+    groupMean = np.bincount(groups, weights=count * mean, minlength=size) / np.maximum(groupCount, 1)
+    spread = variance + (mean - groupMean[groups]) ** 2
+    return groupCount, groupMean, np.bincount(groups, weights=count * spread, minlength=size) / np.maximum(groupCount, 1)
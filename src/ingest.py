@@ -0,0 +1,693 @@
+#custom build modules
+import alerts as alerting
+import data
+import detectors
+import metrics
+
+#External Libraries
+import numpy as np
+import pandas as pd
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import logging
+import struct
+import sys
+import time
+import zlib
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+#Binary protocol: a frame is a header (magic, kind, count) followed by `count` packed records for SAMPLES frames.
+#PING and PONG frames carry no record, their count field is the ping id.
+MAGIC = b"ADS1"
+HEADER = struct.Struct("<4sII")
+SAMPLES, PING, PONG = 0, 1, 2
+
+#One sample on the wire: stream id, timestamp in nanoseconds since epoch and value, little-endian and packed (20 bytes)
+RECORD = np.dtype([("stream", "<u4"), ("timestamp", "<i8"), ("value", "<f8")])
+
+#Samples of one stream handed to its detector at once, arrived is the loop time the oldest of them was received
+Batch = collections.namedtuple("Batch", ["stream", "timestamps", "values", "arrived"])
+
+def encodeFrame(records):
+    """
+    Encode a RECORD array as one binary SAMPLES frame.
+    """
+    records = np.asarray(records, dtype=RECORD)
+    return HEADER.pack(MAGIC, SAMPLES, len(records)) + records.tobytes()
+
+def encodeLines(records):
+    """
+    Encode a RECORD array in the line protocol, one "stream,timestamp,value" line per sample.
+    """
+    return "".join(f"{stream},{timestamp},{value!r}\n" for stream, timestamp, value in records.tolist()).encode()
+
+def decodeFrames(buffer):
+    """
+    Generator over the binary frames of a buffer (a whole datagram), yielding (kind, records) for SAMPLES frames and
+    (kind, id) for PING and PONG frames. The records are a read-only view of the buffer, no sample is copied.
+    Raises ValueError on a bad magic or a truncated frame.
+    """
+    offset = 0
+    while offset < len(buffer):
+        if len(buffer) - offset < HEADER.size:
+            raise ValueError("truncated frame header.")
+        magic, kind, count = HEADER.unpack_from(buffer, offset)
+        if magic != MAGIC:
+            raise ValueError("bad frame magic.")
+        offset += HEADER.size
+        if kind != SAMPLES:
+            yield kind, count
+            continue
+        if len(buffer) - offset < count * RECORD.itemsize:
+            raise ValueError("truncated frame.")
+        yield kind, np.frombuffer(buffer, dtype=RECORD, count=count, offset=offset)
+        offset += count * RECORD.itemsize
+
+def parseLines(lines):
+    """
+    Parse lines of the line protocol ("stream,timestamp,value", the timestamp in nanoseconds since epoch or ISO 8601)
+    into a RECORD array. "#ping ID" lines are returned apart.
+
+    Returns:
+    - (np.ndarray, list, int): The records, the ids of the pings and the number of malformed lines skipped.
+    """
+    streams, timestamps, values, pings = [], [], [], []
+    malformed = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            if line.startswith(b"#ping"):
+                pings.append(int(line[5:]))
+                continue
+            stream, timestamp, value = line.split(b",")
+            try:
+                timestamp = int(timestamp)
+            except ValueError:
+                timestamp = pd.Timestamp(timestamp.decode().strip()).value
+            stream = int(stream)
+            #Out of range of a RECORD field, the array assignment would raise OverflowError for the whole chunk (or wrap)
+            if not (0 <= stream < 2**32 and -2**63 <= timestamp < 2**63):
+                raise ValueError("stream id or timestamp out of range.")
+            streams.append(stream)
+            timestamps.append(timestamp)
+            values.append(float(value))
+        except ValueError:
+            malformed += 1
+
+    records = np.empty(len(values), dtype=RECORD)
+    records["stream"], records["timestamp"], records["value"] = streams, timestamps, values
+    return records, pings, malformed
+
+class StreamBatcher:
+    """
+    StreamBatcher groups incoming samples per stream, so that every detector scores blocks of points with predict_batch
+    instead of one point at a time.
+
+    A stream's samples are handed over as soon as batchSize of them are waiting, or once the oldest of them has waited
+    maxDelay seconds (see expired), which bounds the latency a slow stream adds.
+
+    Class Attributes:
+        - batchSize: Number of samples of a stream scored together.
+        - maxDelay: Longest time (seconds) a sample waits for its batch to fill up.
+        - pending: streamId -> (list of RECORD arrays, number of samples, arrival time of the oldest one).
+    """
+
+    def __init__(self, batchSize=64, maxDelay=0.05):
+        self.batchSize = batchSize
+        self.maxDelay = maxDelay
+        self.pending = {}
+
+    def add(self, records, arrived):
+        """
+        Add a RECORD array received at loop time `arrived`. Returns the batches that are full.
+        """
+        ready = []
+        if len(records) == 0:
+            return ready
+
+        streams = records["stream"]
+        if (streams == streams[0]).all():
+            groups = [(streams[0], records)] #frames usually carry a single stream
+        else:
+            #a stable sort keeps the samples of every stream in arrival order
+            records = records[np.argsort(streams, kind="stable")]
+            ids, starts = np.unique(records["stream"], return_index=True)
+            groups = zip(ids, np.split(records, starts[1:]))
+
+        for streamId, group in groups:
+            streamId = int(streamId)
+            entry = self.pending.get(streamId)
+            if entry is None:
+                entry = self.pending[streamId] = [[], 0, arrived]
+            entry[0].append(group)
+            entry[1] += len(group)
+            if entry[1] >= self.batchSize:
+                ready.extend(self.take(streamId))
+        return ready
+
+    def take(self, streamId):
+        #Remove the waiting samples of a stream, as batches of at most batchSize samples
+        groups, _, arrived = self.pending.pop(streamId)
+        records = np.concatenate(groups) if len(groups) > 1 else groups[0]
+        return [Batch(streamId, records["timestamp"][start:start + self.batchSize].copy(),
+                      records["value"][start:start + self.batchSize].copy(), arrived)
+                for start in range(0, len(records), self.batchSize)]
+
+    def expired(self, now):
+        """
+        Returns the batches of every stream whose oldest sample has waited maxDelay seconds or more.
+        """
+        late = [streamId for streamId, entry in self.pending.items() if now - entry[2] >= self.maxDelay]
+        return [batch for streamId in late for batch in self.take(streamId)]
+
+    def drain(self):
+        """
+        Returns the batches of every waiting sample.
+        """
+        return [batch for streamId in list(self.pending) for batch in self.take(streamId)]
+
+class IngestStats:
+    """
+    Counters of an IngestServer.
+
+    Class Attributes:
+        - received: Samples decoded from the network.
+        - malformed: Lines or frames that could not be decoded.
+        - dropped: Samples discarded because the scoring queue was full (UDP only, TCP applies backpressure instead).
+        - failed: Samples whose detector raised an error.
+        - scored: Samples scored by their detector.
+        - batches: Number of predict_batch calls.
+        - anomalies: Anomalous points detected.
+        - streams: Number of streams seen.
+        - queueDepth / maxQueueDepth: Current and highest number of batches waiting to be scored.
+        - lag / maxLag: Seconds between the oldest sample of a batch being received and the batch being scored (last and highest).
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.malformed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.scored = 0
+        self.batches = 0
+        self.anomalies = 0
+        self.streams = 0
+        self.queueDepth = 0
+        self.maxQueueDepth = 0
+        self.lag = 0.0
+        self.maxLag = 0.0
+
+    def snapshot(self):
+        return dict(vars(self))
+
+class DatagramIngest(asyncio.DatagramProtocol):
+    #UDP transport of an IngestServer: every datagram holds binary frames or text lines
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, payload, address):
+        server = self.server
+        if payload.startswith(MAGIC):
+            try:
+                for kind, content in decodeFrames(payload):
+                    if kind == SAMPLES:
+                        server.enqueueNowait(server.accept(content))
+                    elif kind == PING:
+                        asyncio.ensure_future(server.pong(lambda id=content: self.transport.sendto(HEADER.pack(MAGIC, PONG, id), address)))
+            except ValueError as e:
+                server.stats.malformed += 1
+                logging.warning("Dropping datagram from %s: %s", address, e)
+        else:
+            records, pings, malformed = parseLines(payload.split(b"\n"))
+            server.stats.malformed += malformed
+            server.enqueueNowait(server.accept(records))
+            for id in pings:
+                asyncio.ensure_future(server.pong(lambda id=id: self.transport.sendto(b"#pong %d\n" % id, address)))
+
+class IngestServer:
+    """
+    IngestServer receives metric samples (stream id, timestamp, value) over TCP and UDP and scores them with one
+    detector per stream.
+
+    Two wire formats are accepted on both transports, told apart by their first bytes:
+    - the line protocol, "stream,timestamp,value" per line, convenient from a shell (`nc`);
+    - binary frames (see HEADER and RECORD), decoded with np.frombuffer straight from the received bytes.
+    A client can send a ping ("#ping ID" or a PING frame), answered once every sample it sent before the ping has been
+    scored, which measures the end-to-end latency.
+
+    Samples are grouped per stream by a StreamBatcher and the batches wait in a bounded queue for the scorer, which runs
+    the detectors in a single worker thread (the models are not thread safe), so the event loop keeps receiving while a
+    decomposition runs. When the queue is full TCP connections stop being read, which pushes back on the sender, and UDP
+    samples are dropped and counted. A detector is created and trained the first time a stream is seen, as in
+    sharding.worker, with an IncidentTracker that reports its anomalies as coalesced, rate limited incidents.
+
+    Class Attributes:
+        - detector: Name of the detector of every stream, in the detectors.DETECTORS registry.
+        - trainIterations: Number of points used to train the detector of a new stream.
+        - modelOptions: Keyword arguments of the detectors (mode, window_size, ...).
+        - models: streamId -> detector.
+        - batcher: StreamBatcher of the samples waiting for their batch to fill up.
+        - queue: Batches (and pending pings) waiting for the scorer.
+        - stats: IngestStats of the server.
+        - sink: AlertSink the incidents of every stream are emitted to.
+    """
+
+    def __init__(self, detector="stl", trainIterations=500, batchSize=64, maxDelay=0.05, queueSize=1000, alerts=None, **modelOptions):
+        if batchSize > modelOptions.get("window_size", 10000):
+            raise ValueError("batchSize cannot be larger than window_size.")
+        self.detector = detector
+        self.trainIterations = trainIterations
+        self.modelOptions = modelOptions
+        self.models = {}
+        self.batcher = StreamBatcher(batchSize, maxDelay)
+        self.queueSize = queueSize
+        self.queue = None
+        self.stats = IngestStats()
+        self.sink = alerting.makeSink(alerts)
+
+        self.executor = None
+        self.servers = []
+        self.tasks = []
+
+    async def start(self, host="127.0.0.1", tcpPort=9200, udpPort=None):
+        """
+        Start listening (a port of None disables that transport, 0 picks a free port) and start the scorer.
+        Returns the (tcpPort, udpPort) actually bound.
+        """
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queueSize)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.tasks = [asyncio.create_task(self.scorer()), asyncio.create_task(self.flusher())]
+
+        ports = [None, None]
+        if tcpPort is not None:
+            server = await asyncio.start_server(self.handleConnection, host, tcpPort)
+            self.servers.append(server)
+            ports[0] = server.sockets[0].getsockname()[1]
+        if udpPort is not None:
+            transport, _ = await loop.create_datagram_endpoint(lambda: DatagramIngest(self), local_addr=(host, udpPort))
+            self.servers.append(transport)
+            ports[1] = transport.get_extra_info("sockname")[1]
+        logging.info("Ingest server listening on %s (tcp: %s, udp: %s)", host, ports[0], ports[1])
+        return tuple(ports)
+
+    async def close(self):
+        #Stop listening, score what is still waiting and close every detector
+        for server in self.servers:
+            server.close()
+        await self.enqueue(self.batcher.drain())
+        await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+        self.executor.shutdown()
+        for model in self.models.values():
+            model.close()
+        self.sink.close()
+
+    def accept(self, records):
+        """
+        Count received records and add them to the batcher. Returns the batches that are ready to be scored.
+        """
+        self.stats.received += len(records)
+        metrics.increment("ingest_samples", len(records))
+        return self.batcher.add(records, asyncio.get_running_loop().time())
+
+    async def enqueue(self, batches):
+        #Queue batches for the scorer, waiting for room (backpressure)
+        for batch in batches:
+            await self.queue.put(batch)
+        self.updateDepth()
+
+    def enqueueNowait(self, batches):
+        #Queue batches for the scorer, dropping them when the queue is full
+        for batch in batches:
+            try:
+                self.queue.put_nowait(batch)
+            except asyncio.QueueFull:
+                self.stats.dropped += len(batch.values)
+                metrics.increment("ingest_dropped", len(batch.values))
+        self.updateDepth()
+
+    def updateDepth(self):
+        self.stats.queueDepth = self.queue.qsize()
+        self.stats.maxQueueDepth = max(self.stats.maxQueueDepth, self.stats.queueDepth)
+
+    async def pong(self, reply):
+        """
+        Answer a ping: every sample received so far is queued and reply is called once the scorer has reached them.
+        """
+        await self.enqueue(self.batcher.drain())
+        done = asyncio.get_running_loop().create_future()
+        await self.queue.put(done)
+        await done
+        reply()
+
+    async def flusher(self):
+        #Hand over the batches of slow streams once their oldest sample has waited maxDelay
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.batcher.maxDelay / 2)
+            await self.enqueue(self.batcher.expired(loop.time()))
+
+    async def scorer(self):
+        """
+        Scoring stage: takes everything waiting in the queue and scores it in the worker thread in one go, then answers
+        the pings that were queued behind those batches.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            while not self.queue.empty():
+                items.append(self.queue.get_nowait())
+            self.stats.queueDepth = self.queue.qsize()
+
+            batches = [item for item in items if isinstance(item, Batch)]
+            if batches:
+                await loop.run_in_executor(self.executor, self.scoreBatches, batches)
+                now = loop.time()
+                self.stats.lag = now - min(batch.arrived for batch in batches)
+                self.stats.maxLag = max(self.stats.maxLag, self.stats.lag)
+
+            for item in items:
+                if not isinstance(item, Batch) and not item.done():
+                    item.set_result(None)
+                self.queue.task_done()
+
+    def scoreBatches(self, batches):
+        #Runs in the worker thread: score every batch with the detector of its stream
+        for batch in batches:
+            try:
+                model = self.models.get(batch.stream)
+                if model is None:
+                    model = detectors.makeDetector(self.detector, verbose=False, alerts=alerting.IncidentTracker(self.sink, batch.stream),
+                                                   **self.modelOptions)
+                    model.train(self.trainIterations, seed=zlib.crc32(str(batch.stream).encode()))
+                    self.models[batch.stream] = model
+                    self.stats.streams += 1
+                mask, residuals = model.predict_batch(batch.values, batch.timestamps)
+            except Exception as e:
+                logging.error("Scoring %d samples of stream %d failed: %s", len(batch.values), batch.stream, e)
+                self.stats.failed += len(batch.values)
+                continue
+
+            self.stats.scored += len(batch.values)
+            self.stats.batches += 1
+            self.stats.anomalies += int(mask.sum())
+
+    async def handleConnection(self, reader, writer):
+        """
+        Serve one TCP connection, in the binary protocol when it starts with MAGIC and in the line protocol otherwise.
+        """
+        peer = writer.get_extra_info("peername")
+        try:
+            try:
+                start = await reader.readexactly(len(MAGIC))
+            except asyncio.IncompleteReadError as e:
+                start = e.partial
+            if start == MAGIC:
+                await self.readFrames(reader, writer)
+            else:
+                await self.readLines(start, reader, writer)
+        except (ConnectionError, ValueError) as e:
+            logging.warning("Closing connection from %s: %s", peer, e)
+        finally:
+            writer.close()
+
+    async def readFrames(self, reader, writer):
+        #Binary protocol: the magic of the first frame has already been read
+        while True:
+            header = await reader.readexactly(HEADER.size - len(MAGIC))
+            kind, count = struct.unpack("<II", header)
+            if kind == SAMPLES:
+                payload = await reader.readexactly(count * RECORD.itemsize)
+                await self.enqueue(self.accept(np.frombuffer(payload, dtype=RECORD)))
+            elif kind == PING:
+                asyncio.ensure_future(self.pong(lambda id=count: writer.write(HEADER.pack(MAGIC, PONG, id))))
+            else:
+                self.stats.malformed += 1
+                raise ValueError(f"unexpected frame kind {kind}.")
+
+            try:
+                magic = await reader.readexactly(len(MAGIC))
+            except asyncio.IncompleteReadError as e:
+                if e.partial:
+                    raise ValueError("truncated frame.")
+                return
+            if magic != MAGIC:
+                self.stats.malformed += 1
+                raise ValueError("bad frame magic.")
+
+    async def readLines(self, start, reader, writer):
+        #Line protocol, read in large chunks and split on newlines (a partial last line waits for the next chunk)
+        remainder = start
+        while True:
+            chunk = await reader.read(1 << 16)
+            buffer = remainder + chunk
+            if not chunk:
+                lines, remainder = [buffer], b""
+            else:
+                lines = buffer.split(b"\n")
+                remainder = lines.pop()
+
+            with metrics.stage("ingest_decode"):
+                records, pings, malformed = parseLines(lines)
+            self.stats.malformed += malformed
+            await self.enqueue(self.accept(records))
+            for id in pings:
+                asyncio.ensure_future(self.pong(lambda id=id: writer.write(b"#pong %d\n" % id)))
+            if not chunk:
+                return
+
+async def reporter(stats, interval):
+    #Periodically log the server counters
+    while True:
+        await asyncio.sleep(interval)
+        logging.info("Ingest stats: %s", stats.snapshot())
+
+async def serve(host="127.0.0.1", tcpPort=9200, udpPort=9201, duration=None, reportInterval=None, **serverOptions):
+    """
+    Run an IngestServer until it is interrupted, or for `duration` seconds.
+    Returns the IngestStats of the run.
+    """
+    server = IngestServer(**serverOptions)
+    await server.start(host, tcpPort, udpPort)
+    report = asyncio.create_task(reporter(server.stats, reportInterval)) if reportInterval else None
+    try:
+        if duration is None:
+            await asyncio.Event().wait()
+        else:
+            await asyncio.sleep(duration)
+    finally:
+        if report:
+            report.cancel()
+        await server.close()
+    return server.stats
+
+def generateLoad(streams, points, trainIterations=500, contamination=10, seed=0):
+    """
+    Generate points samples for each of the streams with generateCPUDataBulk, as a RECORD array interleaved in time
+    (one sample of every stream per hour). Every stream starts right after the trainIterations hours of training data
+    that the server generates for it, so that the simulated schedule stays aligned with its trained model.
+    """
+    start = data.ORIGIN + pd.Timedelta(trainIterations, "h")
+    records = np.empty((points, streams), dtype=RECORD)
+    records["stream"] = np.arange(streams, dtype=np.uint32)
+    records["timestamp"] = pd.date_range(start, periods=points, freq="1h").asi8[:, None]
+    for stream in range(streams):
+        records["value"][:, stream] = data.generateCPUDataBulk(points, contamination=contamination, seed=seed + stream, start=start)[0]
+    return records.ravel()
+
+async def loadTest(host="127.0.0.1", port=9200, transport="tcp", protocol="binary", streams=16, points=2000, frameSize=256,
+                   rate=None, pingInterval=0.1, trainIterations=500, contamination=10, seed=0, timeout=60.0):
+    """
+    Load-test client: send streams x points generated samples to an IngestServer and measure the sustained ingest rate
+    and the end-to-end latency.
+
+    Frames are encoded before the clock starts. A ping is sent every pingInterval seconds and once more after the last
+    sample: the latency of a ping is the time until every sample sent before it has been scored, and the sustained rate
+    counts the samples until the last ping is answered, so it cannot exceed what the detectors keep up with.
+
+    Parameters:
+    - transport (str): "tcp" or "udp".
+    - protocol (str): "binary" frames or "line" protocol.
+    - frameSize (int): Samples per frame (per datagram over UDP).
+    - rate (float): Target samples/sec, None to send as fast as the transport allows.
+
+    Returns:
+    - dict: The configuration, the send and sustained rates (samples/sec) and the ping latencies in ms.
+    """
+    records = generateLoad(streams, points, trainIterations, contamination, seed)
+    encode = encodeFrame if protocol == "binary" else encodeLines
+    frames = [encode(records[start:start + frameSize]) for start in range(0, len(records), frameSize)]
+    if protocol == "binary":
+        ping = lambda id: HEADER.pack(MAGIC, PING, id)
+    else:
+        ping = lambda id: b"#ping %d\n" % id
+
+    loop = asyncio.get_running_loop()
+    sentAt, answered = {}, {}
+    finished = loop.create_future()
+
+    def received(payload):
+        #Record the answer time of the pongs in a reply
+        now = time.perf_counter()
+        if protocol == "binary":
+            ids = [id for kind, id in decodeFrames(payload) if kind == PONG]
+        else:
+            ids = [int(line[5:]) for line in payload.split(b"\n") if line.startswith(b"#pong")]
+        for id in ids:
+            answered[id] = now
+            if id == last and not finished.done():
+                finished.set_result(now)
+
+    last = -1
+    if transport == "tcp":
+        reader, writer = await asyncio.open_connection(host, port)
+        send = writer.write
+
+        async def receive():
+            buffer = b""
+            while True:
+                chunk = await reader.read(1 << 16)
+                if not chunk:
+                    return
+                buffer += chunk
+                #replies are whole frames or lines, keep an incomplete tail for the next read
+                cut = len(buffer) - len(buffer) % HEADER.size if protocol == "binary" else buffer.rfind(b"\n") + 1
+                received(buffer[:cut])
+                buffer = buffer[cut:]
+        receiving = asyncio.create_task(receive())
+    else:
+        class Replies(asyncio.DatagramProtocol):
+            def datagram_received(self, payload, address):
+                received(payload)
+        endpoint, _ = await loop.create_datagram_endpoint(Replies, remote_addr=(host, port))
+        send = endpoint.sendto
+
+    start = time.perf_counter()
+    nextPing, sent = start, 0
+    for frame, first in zip(frames, range(0, len(records), frameSize)):
+        now = time.perf_counter()
+        if now >= nextPing:
+            sentAt[len(sentAt)] = now
+            send(ping(len(sentAt) - 1))
+            nextPing = now + pingInterval
+
+        send(frame)
+        sent = min(first + frameSize, len(records))
+        if rate:
+            delay = start + sent / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif transport == "tcp":
+            await writer.drain()
+        else:
+            await asyncio.sleep(0)
+    sendTime = time.perf_counter() - start
+
+    last = len(sentAt)
+    sentAt[last] = time.perf_counter()
+    send(ping(last))
+    try:
+        end = await asyncio.wait_for(finished, timeout)
+    except asyncio.TimeoutError:
+        end = None
+        logging.error("The last ping was not answered within %.0f seconds", timeout)
+
+    if transport == "tcp":
+        writer.close()
+        receiving.cancel()
+    else:
+        endpoint.close()
+
+    latencies = np.array([answered[id] - sentAt[id] for id in answered]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (None, None, None)
+    result = {
+        "transport": transport,
+        "protocol": protocol,
+        "streams": streams,
+        "samples": len(records),
+        "frames": len(frames),
+        "frame_size": frameSize,
+        "target_rate": rate,
+        "send_per_sec": len(records) / sendTime,
+        "sustained_per_sec": len(records) / (end - start) if end else None,
+        "latency_ms": {"p50": p50, "p95": p95, "p99": p99, "max": latencies.max() if len(latencies) else None},
+        "pings": len(sentAt),
+        "pings_lost": len(sentAt) - len(answered),
+    }
+    logging.info("%s/%s: sent %.0f samples/sec, sustained %s samples/sec, latency p50 %s ms, p99 %s ms, %d of %d pings lost",
+                 transport, protocol, result["send_per_sec"], result["sustained_per_sec"], p50, p99, result["pings_lost"], result["pings"])
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Socket ingest server of the anomaly detector and its load-test client.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    server = commands.add_parser("serve", help="receive samples over TCP/UDP and score them, incidents are written to stdout")
+    server.add_argument("--host", default="127.0.0.1")
+    server.add_argument("--tcp-port", type=int, default=9200)
+    server.add_argument("--udp-port", type=int, default=9201)
+    server.add_argument("--detector", default="stl", choices=list(detectors.DETECTORS))
+    server.add_argument("--mode", default="forecast", choices=["batch", "online", "forecast"], help="mode of the stl detector")
+    server.add_argument("--window-size", type=int, default=2000)
+    server.add_argument("--train-iterations", type=int, default=500)
+    server.add_argument("--batch-size", type=int, default=64, help="samples of a stream scored together")
+    server.add_argument("--max-delay", type=float, default=0.05, help="seconds a sample waits for its batch to fill up")
+    server.add_argument("--queue-size", type=int, default=1000, help="batches waiting to be scored before backpressure")
+    server.add_argument("--compact", action="store_true", help="float32 windows with implicit hourly timestamps")
+    server.add_argument("--duration", type=float, help="stop after this many seconds")
+    server.add_argument("--report-interval", type=float, default=10.0)
+    server.add_argument("--alerts", help="file or http:// URL the incidents are sent to (default: stdout)")
+
+    load = commands.add_parser("load", help="send generated samples to a server and measure ingest rate and latency")
+    load.add_argument("--host", default="127.0.0.1")
+    load.add_argument("--port", type=int, default=9200)
+    load.add_argument("--transport", default="tcp", choices=["tcp", "udp"])
+    load.add_argument("--protocol", default="binary", choices=["binary", "line"])
+    load.add_argument("--streams", type=int, default=16)
+    load.add_argument("--points", type=int, default=2000, help="samples per stream")
+    load.add_argument("--frame-size", type=int, default=256, help="samples per frame or datagram")
+    load.add_argument("--rate", type=float, help="target samples/sec (default: as fast as possible)")
+    load.add_argument("--ping-interval", type=float, default=0.1)
+    load.add_argument("--train-iterations", type=int, default=500, help="must match the server's, to align the schedule")
+    load.add_argument("--contamination", type=int, default=10)
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--output", help="file the JSON report is written to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            stats = asyncio.run(serve(args.host, args.tcp_port, args.udp_port, args.duration, args.report_interval,
+                                      detector=args.detector, trainIterations=args.train_iterations, batchSize=args.batch_size,
+                                      maxDelay=args.max_delay, queueSize=args.queue_size, alerts=args.alerts, mode=args.mode,
+                                      window_size=args.window_size, compact=args.compact))
+            logging.info("Ingest server stopped: %s", stats.snapshot())
+        except KeyboardInterrupt:
+            logging.info("Ingest server interrupted")
+        return 0
+
+    report = asyncio.run(loadTest(args.host, args.port, args.transport, args.protocol, args.streams, args.points, args.frame_size,
+                                  args.rate, args.ping_interval, args.train_iterations, args.contamination, args.seed))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import collections
+import functools
+import numpy as np
+import scipy.sparse as sparse
+
+#Same attribute names as the statsmodels result, so callers of STLModel.fit do not depend on the engine
+DecomposeResult = collections.namedtuple("DecomposeResult", ["observed", "seasonal", "trend", "resid"])
+
+def loessWeights(n, length, degree, xs, nleft, nright):
+    """
+    Weights of the local (degree 0 or 1) LOESS estimates at positions xs, from the points nleft..nright of a series of
+    n points (all positions 1-based). This is the weight computation of STL's `est` routine: tricube weights over the
+    neighborhood, normalised, then tilted for the local linear fit. Without robustness weights they do not depend on the
+    values, which is what makes the smoothers linear operators that can be built once.
+
+    Returns:
+    - (np.ndarray, np.ndarray, np.ndarray): 0-based column of every weight, the weights (one row per estimate, zero
+      outside the neighborhood) and a flag per estimate that is False where STL falls back to the raw value.
+    """
+    xs, nleft, nright = (np.asarray(a, dtype=np.float64) for a in (xs, nleft, nright))
+    width = int((nright - nleft).max()) + 1
+    j = nleft[:, None] + np.arange(width)
+    inside = j <= nright[:, None]
+
+    h = np.maximum(xs - nleft, nright - xs)
+    if length > n:
+        h = h + (length - n) // 2
+    h = h[:, None]
+    r = np.abs(j - xs[:, None])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = np.where(r <= 0.001 * h, 1.0, (1 - (r / h) ** 3) ** 3)
+    w = np.where(inside & (r <= 0.999 * h), w, 0.0)
+
+    total = w.sum(axis=1)
+    ok = total > 0
+    w = w / np.where(ok, total, 1)[:, None]
+
+    if degree > 0:
+        a = (w * j).sum(axis=1)
+        c = (w * (j - a[:, None]) ** 2).sum(axis=1)
+        tilt = (h[:, 0] > 0) & (np.sqrt(c) > 0.001 * (n - 1))
+        b = np.where(tilt, (xs - a) / np.where(tilt, c, 1), 0.0)
+        w = w * (b[:, None] * (j - a[:, None]) + 1)
+        w[~inside] = 0.0
+
+    return np.clip(j - 1, 0, n - 1).astype(np.int64), w, ok
+
+def loessMatrix(n, length, degree):
+    """
+    Dense (n, n) matrix of STL's LOESS smoother `ess` with jump 1: row i holds the weights of the estimate at point i.
+    Estimates STL cannot compute (no weight in the neighborhood) keep the raw value.
+    """
+    if n < 2:
+        return np.eye(n)
+
+    positions = np.arange(1, n + 1)
+    if length >= n:
+        nleft, nright = np.ones(n), np.full(n, n)
+    else:
+        half = (length + 1) // 2
+        nleft = np.clip(positions - half + 1, 1, n - length + 1)
+        nright = nleft + length - 1
+    columns, weights, ok = loessWeights(n, length, degree, positions, nleft, nright)
+
+    matrix = np.zeros((n, n))
+    np.add.at(matrix, (np.repeat(np.arange(n), columns.shape[1]), columns.ravel()), weights.ravel())
+    matrix[~ok] = np.eye(n)[~ok]
+    return matrix
+
+def loessOperator(n, length, degree):
+    #Sparse (banded) version of loessMatrix, built straight from the band of weights so no dense (n, n) matrix is allocated
+    if n < 2 or length >= n:
+        return sparse.csr_matrix(loessMatrix(n, length, degree))
+
+    positions = np.arange(1, n + 1)
+    half = (length + 1) // 2
+    nleft = np.clip(positions - half + 1, 1, n - length + 1)
+    columns, weights, ok = loessWeights(n, length, degree, positions, nleft, nleft + length - 1)
+    weights[~ok] = 0.0
+    weights[~ok, 0] = 1.0
+    columns[~ok, 0] = positions[~ok] - 1
+    rows = np.repeat(np.arange(n), columns.shape[1])
+    return sparse.csr_matrix((weights.ravel(), (rows, columns.ravel())), shape=(n, n))
+
+def subseriesMatrix(k, length, degree):
+    """
+    Dense (k + 2, k) matrix of the smoothing of one cycle-subseries of k points (STL's `ss` routine): the k smoothed
+    points plus one point extrapolated at each end, which copies its neighbor when it cannot be estimated.
+    """
+    matrix = np.zeros((k + 2, k))
+    matrix[1:k + 1] = loessMatrix(k, length, degree)
+
+    for row, xs, nleft, nright, neighbor in ((0, 0, 1, min(length, k), 1), (k + 1, k + 1, max(1, k - length + 1), k, k)):
+        columns, weights, ok = loessWeights(k, length, degree, [xs], [nleft], [nright])
+        if ok[0]:
+            np.add.at(matrix[row], columns[0], weights[0])
+        else:
+            matrix[row] = matrix[neighbor]
+    return matrix
+
+def cycleSubseriesOperator(n, period, length, degree):
+    """
+    Sparse (n + 2 * period, n) operator smoothing every cycle-subseries (the points at the same position of the cycle)
+    of a series of n points, extended by one cycle at each end.
+    """
+    rows, columns, values = [], [], []
+    smoothers = {} #the subseries only come in two lengths
+    for j in range(period):
+        k = (n - j - 1) // period + 1
+        if k not in smoothers:
+            smoothers[k] = sparse.coo_matrix(subseriesMatrix(k, length, degree))
+        local = smoothers[k]
+        rows.append(local.row * period + j)
+        columns.append(local.col * period + j)
+        values.append(local.data)
+    return sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                             shape=(n + 2 * period, n))
+
+def lowPassFilter(n, period):
+    """
+    Sparse (n, n + 2 * period) operator of the moving averages of STL's low-pass filter (period, period, then 3 points).
+    Their composition is a single convolution with a kernel of 2 * period + 2 points.
+    """
+    kernel = np.convolve(np.convolve(np.ones(period) / period, np.ones(period) / period), np.ones(3) / 3)
+    return sparse.diags(list(kernel), list(range(len(kernel))), shape=(n, n + 2 * period), format="csr")
+
+class STLKernel:
+    """
+    STLKernel is a precomputed, non-robust STL decomposition for series of a fixed length and period.
+
+    STL without robustness weights is linear in the data: the cycle-subseries smoother, the low-pass filter (three
+    moving averages and a LOESS) and the trend LOESS only depend on the positions of the points. They are built once as
+    sparse banded matrices, after which every decomposition is a few sparse matrix-vector products per inner iteration
+    instead of recomputing every LOESS neighborhood and weight. The defaults and the algorithm are those of
+    statsmodels.tsa.seasonal.STL (jumps of 1, non-robust), whose results it reproduces to rounding error.
+
+    Class Attributes:
+        - n: Length of the series the kernel decomposes.
+        - period: Length of the seasonal cycle.
+        - seasonal, trend, low_pass: Spans of the seasonal, trend and low-pass LOESS smoothers.
+        - inner_iter: Number of passes of the inner loop.
+        - cycle: Cycle-subseries operator, (n + 2 * period, n).
+        - lowPass: Low-pass operator applied to the cycle-subseries, (n, n + 2 * period).
+        - trendSmoother: Trend operator, (n, n).
+    """
+
+    def __init__(self, n, period, seasonal=7, trend=None, low_pass=None, seasonal_deg=1, trend_deg=1, low_pass_deg=1,
+                 inner_iter=5):
+        if period < 2:
+            raise ValueError("period must be a positive integer >= 2.")
+        if n < 2 * period:
+            raise ValueError("the series must contain at least two full periods.")
+        if seasonal < 3 or seasonal % 2 == 0:
+            raise ValueError("seasonal must be an odd integer >= 3.")
+
+        #Default spans, as in statsmodels
+        if trend is None:
+            trend = int(np.ceil(1.5 * period / (1 - 1.5 / seasonal)))
+            trend += trend % 2 == 0
+        if low_pass is None:
+            low_pass = period + 1
+            low_pass += low_pass % 2 == 0
+
+        self.n = n
+        self.period = period
+        self.seasonal = seasonal
+        self.trend = trend
+        self.low_pass = low_pass
+        self.inner_iter = inner_iter
+
+        self.cycle = cycleSubseriesOperator(n, period, seasonal, seasonal_deg)
+        self.lowPass = (loessOperator(n, low_pass, low_pass_deg) @ lowPassFilter(n, period)).tocsr()
+        self.trendSmoother = loessOperator(n, trend, trend_deg)
+
+    def fit(self, values):
+        """
+        Decompose a series of n values.
+        Returns a DecomposeResult (observed, seasonal, trend, resid) of NumPy arrays.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) != self.n:
+            raise ValueError(f"the kernel decomposes series of {self.n} values, got {len(values)}.")
+
+        trend = np.zeros(self.n)
+        for _ in range(self.inner_iter):
+            cycle = self.cycle @ (values - trend)
+            seasonal = cycle[self.period:self.period + self.n] - self.lowPass @ cycle
+            trend = self.trendSmoother @ (values - seasonal)
+        return DecomposeResult(values, seasonal, trend, values - seasonal - trend)
+
+    def nbytes(self):
+        #Memory held by the sparse operators
+        return sum(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+                   for matrix in (self.cycle, self.lowPass, self.trendSmoother))
+
+@functools.lru_cache(maxsize=4)
+def kernelFor(n, period):
+    """
+    Returns the default STLKernel for series of n points and the given period, shared by every caller: the operators
+    only depend on n and period, so all the streams with the same window hold a single copy.
+    """
+    return STLKernel(n, period)
@@ -0,0 +1,163 @@
+import bisect
+import contextlib
+import http.server
+import logging
+import threading
+import time
+
+#Instrumentation is off unless enable() is called, stage() then hands out a shared no-op context manager
+ENABLED = False
+
+#Upper bounds (seconds) of the latency histogram buckets, from 1 microsecond to 10 seconds
+BUCKETS = [1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+           1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+NULL_STAGE = contextlib.nullcontext()
+
+class Histogram:
+    """
+    Latency histogram of one stage, with fixed buckets so that observing a value is a binary search and an increment.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1) #the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile (an estimate, as precise as the buckets).
+        """
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS + [float("inf")], self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class Timer:
+    #Context manager timing a block into a histogram
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+histograms = {}
+counters = {}
+
+def enable():
+    """
+    Turn the instrumentation on (it is off by default).
+    """
+    global ENABLED
+    ENABLED = True
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+def stage(name):
+    """
+    Returns a context manager timing a stage of the hot path into the histogram `name`.
+    When the instrumentation is disabled this is a shared no-op object, so the cost is a function call.
+    """
+    if not ENABLED:
+        return NULL_STAGE
+    histogram = histograms.get(name)
+    if histogram is None:
+        histogram = histograms[name] = Histogram()
+    return Timer(histogram)
+
+def increment(name, amount=1):
+    """
+    Add amount to the counter `name` (no-op when the instrumentation is disabled).
+    """
+    if ENABLED:
+        counters[name] = counters.get(name, 0) + amount
+
+def exposition():
+    """
+    Returns the current metrics in the Prometheus text exposition format.
+    """
+    lines = ["# HELP detector_stage_seconds Time spent in each stage of the detection pipeline.",
+             "# TYPE detector_stage_seconds histogram"]
+    for name, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + [float("inf")], histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'detector_stage_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'detector_stage_seconds_sum{{stage="{name}"}} {histogram.sum}')
+        lines.append(f'detector_stage_seconds_count{{stage="{name}"}} {histogram.count}')
+
+    lines += ["# HELP detector_events_total Number of events seen by the detector.",
+              "# TYPE detector_events_total counter"]
+    for name, value in sorted(counters.items()):
+        lines.append(f'detector_events_total{{event="{name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def summary():
+    """
+    Returns a one-line summary of every stage (count, mean and p99 in milliseconds) and every counter.
+    """
+    parts = [f"{name}: n={h.count} mean={1000 * h.sum / max(h.count, 1):.3f}ms p99<={1000 * h.quantile(0.99):.3f}ms"
+             for name, h in sorted(histograms.items())]
+    parts += [f"{name}={value}" for name, value in sorted(counters.items())]
+    return ", ".join(parts)
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    #Serves the exposition on /metrics
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        #Keep scrapes out of the application log
+        pass
+
+def serve(port=9100, host="127.0.0.1"):
+    """
+    Enable the instrumentation and serve the Prometheus page on http://host:port/metrics from a background thread.
+    Returns the server (call shutdown() to stop it).
+    """
+    enable()
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info("Serving metrics on http://%s:%d/metrics", host, server.server_port)
+    return server
+
+def startLogging(interval=10.0):
+    """
+    Enable the instrumentation and log the summary line every interval seconds from a background thread.
+    """
+    enable()
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            logging.info("Metrics: %s", summary())
+
+    threading.Thread(target=loop, daemon=True).start()
@@ -1,9 +1,238 @@
 import data
+from alerts import IncidentTracker
+from anomalies import AnomalyLog
+import metrics
+from thresholds import HOUR, makeThreshold
+from window import CompactRingBuffer, RingBuffer
 import numpy as np
 import pandas as pd
-from statsmodels.tsa.seasonal import STL
+import json
+import logging
+import os
+import shutil
+import threading
 
-class STLModel:
+def checkMemoryBudget(model):
+    """
+    Raise a ValueError when the most memory the model can hold (its memoryUsage with the anomaly log at full capacity)
+    exceeds its memoryBudget.
+    """
+    if model.memoryBudget is not None:
+        usage = model.memoryUsage(peak=True)
+        if usage["total"] > model.memoryBudget:
+            raise ValueError(f"the model needs up to {usage['total']} bytes ({usage}), over its memory budget of {model.memoryBudget} bytes.")
+
+class Detector:
+    """
+    Detector is the base class of STLModel and of its cheap alternatives (see detectors.py). It holds what they share:
+    the interface (train/TrainSTLModel, predict, predict_batch, close) and attributes (window, date, anomalyLog,
+    thresholds, lower, upper) the visualization, the headless runner and the benchmarks use, whatever the detector.
+
+    The base class maintains the window, the thresholds, the anomaly log and the incident alerts; a detector only implements:
+        - learn(values, timestamps): fit its state to the training data and return the training residuals.
+        - scoreOne(value, timestamp): residual of a new point, folding the point into the state.
+        - score(values, timestamps): the same for a block of points (defaults to a loop over scoreOne).
+    Scored points are stored with remember/rememberBlock, in the window unless a detector keeps its own history: after
+    they are scored, or before when rememberFirst is set (STLModel decomposes the window the new points are part of).
+    The residuals are then compared to the thresholds (see thresholds.py).
+
+    Class Attributes:
+        - window: Ring buffer holding the incoming data points (values and timestamps).
+        - threshold_factor: Factor to determine the sensitivity of anomaly detection.
+        - date: Current date index for the data stream.
+        - anomalyLog: Bounded, columnar log of the detected anomalies (see AnomalyLog).
+        - thresholds: Estimator of the thresholds, frozen after training or adapted online.
+        - lower, upper: Thresholds used for the latest point.
+        - verbose: Report the detected anomalies as incidents on stdout, unless alerts are given.
+        - alerts: IncidentTracker the scored points are folded into, which emits coalesced and rate limited incident
+          alerts to its sink (see alerts.py), None for no alerts.
+        - compact: Keep the window as float32 values with implicit hourly timestamps (see CompactRingBuffer).
+        - memoryBudget: Maximum number of bytes the model may hold (see memoryUsage), None for no limit.
+    """
+    rememberFirst = False
+    __slots__ = ("window", "seriesCache", "threshold_factor", "thresholds", "thresholdMode", "date", "anomalyLog", "verbose",
+                 "alerts", "compact", "memoryBudget", "lower", "upper")
+
+    def __init__(self, threshold=3, window_size=10000, verbose=True, anomalyCapacity=10000, spillPath=None,
+                 thresholdMode="frozen", thresholdAlpha=0.01, thresholdBuckets=1, compact=False, memoryBudget=None, alerts=None):
+        self.window = CompactRingBuffer(window_size) if compact else RingBuffer(window_size)
+        self.compact = compact
+        self.memoryBudget = memoryBudget
+        self.seriesCache = (None, None) #(window version, materialized Series)
+        self.threshold_factor = threshold
+        self.thresholds = makeThreshold(thresholdMode, threshold, thresholdAlpha, thresholdBuckets)
+        self.thresholdMode = thresholdMode
+        self.date = data.ORIGIN
+        self.anomalyLog = AnomalyLog(anomalyCapacity, spillPath)
+        self.verbose = verbose
+        self.alerts = IncidentTracker() if alerts is None and verbose else alerts
+
+    @property
+    def data_points(self):
+        """
+        The current window as a pandas Series indexed by date.
+        The Series is only rebuilt when the window changed since the last access.
+        """
+        version, series = self.seriesCache
+        if version != self.window.version:
+            series = self.window.toSeries()
+            self.seriesCache = (self.window.version, series)
+        return series
+
+    @property
+    def anomalies(self):
+        """
+        All detected anomalies as a pandas Series indexed by date, including the records spilled to disk.
+        """
+        return self.anomalyLog.toSeries()
+
+    def stateBytes(self):
+        #Memory held by the detector's own state, besides the window and the anomaly log
+        return 0
+
+    def memoryUsage(self, peak=False):
+        """
+        Bytes held by the detector, per component: the window, the anomaly log (at its full capacity with peak=True) and
+        the detector and threshold state.
+        """
+        usage = {"window": self.window.nbytes(), "anomalies": self.anomalyLog.nbytes(peak),
+                 "state": self.thresholds.nbytes() + self.stateBytes()}
+        usage["total"] = sum(usage.values())
+        return usage
+
+    def learn(self, values, timestamps):
+        raise NotImplementedError
+
+    def scoreOne(self, value, timestamp):
+        raise NotImplementedError
+
+    def score(self, values, timestamps):
+        return np.array([self.scoreOne(value, timestamp) for value, timestamp in zip(values, timestamps)])
+
+    def remember(self, value, timestamp, window_size):
+        #Add a scored point to the window, the buffer drops the oldest point once it is full
+        if window_size != self.window.capacity:
+            self.window.resize(window_size)
+            checkMemoryBudget(self)
+        self.window.append(value, timestamp)
+
+    def rememberBlock(self, values, timestamps, window_size):
+        if window_size != self.window.capacity:
+            self.window.resize(window_size)
+            checkMemoryBudget(self)
+        self.window.extend(values, timestamps)
+
+    def train(self, instances, seed=None):
+        """
+        Train the detector on `instances` generated points without contamination and seed the thresholds from the
+        training residuals. The seed makes the generated training set reproducible.
+        """
+        with metrics.stage("train"):
+            values, _ = data.generateCPUDataBulk(instances, contamination=0, seed=seed)
+            index = pd.date_range(self.date, periods=instances, freq="1h")
+
+            #The window must hold the whole training set, the first prediction trims it back to window_size
+            self.rememberBlock(values, index.asi8, max(instances, self.window.capacity))
+            self.date = index[-1] + pd.Timedelta(1, "h")
+
+            #Detectors that need some history return residuals for the tail of the training set only
+            residuals = self.learn(values, index.asi8)
+            self.thresholds.seed(residuals, index.asi8[-len(residuals):])
+            self.lower, self.upper = self.thresholds.bounds(self.date.value)
+
+    #Name used by the callers written for STLModel
+    TrainSTLModel = train
+
+    def predict(self, data, window_size):
+        """
+        Score a single incoming point and add it to the window.
+        Returns a tuple (is_anomaly, residual) for the new point.
+        """
+        timestamp = self.date.value
+        with metrics.stage("window"):
+            if self.rememberFirst:
+                self.remember(data, timestamp, window_size)
+            self.lower, self.upper = self.thresholds.bounds(timestamp)
+            self.date = self.date + pd.Timedelta(1, "h")
+
+        with metrics.stage("fit"):
+            residual = self.scoreOne(data, timestamp)
+
+        if not self.rememberFirst:
+            with metrics.stage("window"):
+                self.remember(data, timestamp, window_size)
+
+        with metrics.stage("threshold"):
+            is_anomaly = residual < self.lower or residual > self.upper
+            self.thresholds.update(residual, timestamp)
+            if is_anomaly:
+                self.anomalyLog.append(timestamp, data, residual, self.lower, self.upper)
+                metrics.increment("anomalies")
+            if self.alerts is not None:
+                self.alerts.observe(timestamp, data, residual, is_anomaly)
+
+        metrics.increment("points")
+        return is_anomaly, residual
+
+    def predict_batch(self, values, timestamps=None, window_size=None):
+        """
+        Score a whole block of incoming points at once.
+
+        Parameters:
+        - values (array-like): The new data points, oldest first.
+        - timestamps (array-like): Dates of the new points, defaults to consecutive hours from the current date index.
+        - window_size (int): Number of data points the model holds, defaults to the current window capacity.
+
+        Returns a tuple (mask, residuals) of NumPy arrays, with one entry per point of the block.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if window_size is None:
+            window_size = self.window.capacity
+        if len(values) == 0:
+            return np.zeros(0, dtype=bool), np.zeros(0)
+
+        if timestamps is None:
+            index = pd.date_range(self.date, periods=len(values), freq="1h")
+        else:
+            index = pd.DatetimeIndex(timestamps)
+            if len(index) != len(values):
+                raise ValueError("values and timestamps must have the same length.")
+
+        with metrics.stage("batch_window"):
+            if self.rememberFirst:
+                self.rememberBlock(values, index.asi8, window_size)
+            lower, upper = self.thresholds.bounds(index.asi8) #thresholds in force at the start of the block
+            self.lower, self.upper = self.thresholds.bounds(index.asi8[0])
+            self.date = index[-1] + pd.Timedelta(1, "h")
+
+        with metrics.stage("batch_fit"):
+            residuals = self.score(values, index.asi8)
+
+        if not self.rememberFirst:
+            with metrics.stage("batch_window"):
+                self.rememberBlock(values, index.asi8, window_size)
+
+        with metrics.stage("batch_threshold"):
+            mask = (residuals < lower) | (residuals > upper)
+            if self.thresholds.adaptive:
+                for residual, timestamp in zip(residuals, index.asi8):
+                    self.thresholds.update(residual, timestamp)
+            if mask.any():
+                self.anomalyLog.extend(index.asi8[mask], values[mask], residuals[mask],
+                                       np.broadcast_to(lower, mask.shape)[mask], np.broadcast_to(upper, mask.shape)[mask])
+            if self.alerts is not None:
+                self.alerts.observeBlock(index.asi8, values, residuals, mask)
+
+        metrics.increment("points", len(values))
+        return mask, residuals
+
+    def close(self):
+        #Close the open incident and remove the temporary spill file of the anomaly log
+        if self.alerts is not None:
+            self.alerts.close()
+        self.anomalyLog.close()
+
+class STLModel(Detector):
     """
     STLModel class is designed to detect anomalies in a data stream using STL (Seasonal-Trend decomposition using LOESS).
 
@@ -14,78 +243,420 @@ class STLModel:
     When compared to heavier models within the unsupervised scene, such an ensemble methods, STL provides a lightweight and efficient approach
     to detecting anomalies in our data. 
 
+    The window, the thresholds, the anomaly log and the alerts are maintained by Detector, STLModel fits the window and
+    scores the new points.
+
     Class Attributes:
-        - data_points: Stores the incoming data points for analysis.
-        - threshold_factor: Factor to determine the sensitivity of anomaly detection.
-        - date: Current date index for the data stream.
-        - anomalies: Series to store detected anomalies.
-        - lower: Lower threshold for anomaly detection.
-        - upper: Upper threshold for anomaly detection.
+        - mode: "batch" refits STL on the whole window for every point, "online" updates the decomposition incrementally,
+          "forecast" scores every point against an hour-of-week baseline from the last fit, which is refreshed in the background
+          (the window and the training data must cover a week).
+        - period: Length of the seasonal cycle in points (24 for hourly data).
+        - refitInterval: In online and forecast mode, number of points between full STL refits.
+        - refitSeconds: In forecast mode, also refit on a timer every refitSeconds seconds.
+        - baseline: In forecast mode, the (hour-of-week profile, trend offset) estimate used for scoring, swapped as a whole after a refit.
+        - smoothing: In online mode, the (level, slope, seasonal) smoothing factors used for the incremental update.
+        - engine: "kernel" decomposes with precomputed LOESS operators (see loess.py), "statsmodels" with statsmodels' STL.
     """
+    #The window is decomposed with the new points in it
+    rememberFirst = True
+    __slots__ = ("mode", "period", "refitInterval", "smoothing", "sinceRefit", "refitSeconds", "refitThread", "refitTimer",
+                 "stopped", "engine", "kernel", "phase", "seasonalProfile", "level", "slope", "baseline")
 
-    def __init__(self, threshold=3):
-        self.data_points = []
-        self.threshold_factor = threshold
-        self.date = "1-1-2023"
-        self.anomalies = pd.Series([])
+    def __init__(self, threshold=3, mode="batch", period=24, refitInterval=168, smoothing=(0.1, 0.01, 0.1), window_size=10000, verbose=True,
+                 anomalyCapacity=10000, spillPath=None, refitSeconds=None, thresholdMode="frozen", thresholdAlpha=0.01,
+                 thresholdBuckets=1, engine="kernel", compact=False, memoryBudget=None, alerts=None):
+        if mode not in ("batch", "online", "forecast"):
+            raise ValueError("mode must be either 'batch', 'online' or 'forecast'.")
+        if mode == "forecast" and window_size < 168:
+            raise ValueError("forecast mode needs a window_size of at least 168, one point per hour of the week.")
+        if engine not in ("kernel", "statsmodels"):
+            raise ValueError("engine must be either 'kernel' or 'statsmodels'.")
+
+        super().__init__(threshold, window_size, verbose, anomalyCapacity, spillPath, thresholdMode, thresholdAlpha,
+                         thresholdBuckets, compact, memoryBudget, alerts)
+        self.mode = mode
+        self.period = period
+        self.refitInterval = refitInterval
+        self.smoothing = smoothing
+        self.sinceRefit = 0
+        self.refitSeconds = refitSeconds
+        self.refitThread = None
+        self.refitTimer = None
+        self.stopped = threading.Event()
+        self.engine = engine
+        self.kernel = None #STLKernel of the last window length, built on the first fit
+        checkMemoryBudget(self)
 
-    def fit(self):
+    def fit(self, values=None):
         """
         Apply STL decomposition to the data points.
-        Returns the fitted STL result.
+        The decomposition runs directly on a zero-copy view of the window buffer, unless other values are given.
+        With the "kernel" engine it is a few sparse products with the LOESS operators of an STLKernel built for the window
+        length and period, which is only rebuilt when the length changes (while the window fills up); the
+        "statsmodels" engine fits statsmodels' STL from scratch. Both give the same decomposition.
+        Returns the fitted STL result (seasonal, trend and resid components).
         """
-        stl = STL(self.data_points)
+        if values is None:
+            values, _ = self.window.view()
+
+        if self.engine == "kernel" and len(values) >= 2 * self.period:
+            #scipy, like statsmodels below, is only imported on the first fit
+            from loess import kernelFor
+
+            kernel = self.kernel
+            if kernel is None or kernel.n != len(values):
+                kernel = self.kernel = kernelFor(len(values), self.period)
+            return kernel.fit(values)
+
+        #statsmodels is only imported on the first fit, so runs that never decompose (or only load a checkpoint) start fast
+        from statsmodels.tsa.seasonal import STL
+
+        stl = STL(values, period=self.period)
         res = stl.fit()
         return res
 
-    def TrainSTLModel(self, instances):
+    def resetState(self, result):
+        """
+        Initialise the incremental decomposition state from a full STL fit.
+        The seasonal profile is the last full cycle of the seasonal component, indexed by position in the cycle,
+        and the trend is carried forward as a level and a slope taken from the end of the trend component.
+        """
+        seasonal = np.asarray(result.seasonal)
+        trend = np.asarray(result.trend)
+
+        #Position (within the seasonal cycle) of the next point to arrive
+        self.phase = len(seasonal) % self.period
+
+        #seasonalProfile[i] holds the seasonal estimate for cycle position i
+        self.seasonalProfile = np.empty(self.period)
+        tail = np.arange(len(seasonal) - self.period, len(seasonal))
+        self.seasonalProfile[tail % self.period] = seasonal[tail]
+
+        self.level = trend[-1]
+        self.slope = trend[-1] - trend[-2]
+        self.sinceRefit = 0
+
+    def replayState(self, result, values, start=0):
+        """
+        Initialise the incremental state at position `start` of a full STL fit of values (the seasonal cycle starting
+        there, level and slope of the trend there) and replay values[start:] through the incremental update, clipped to
+        the current thresholds. The state ends positioned after the last value, warmed up the way it is while scoring.
+        Returns the one-step residuals of the replay.
+        """
+        seasonal = np.asarray(result.seasonal)
+        trend = np.asarray(result.trend)
+
+        cycle = np.arange(start, start + self.period)
+        self.seasonalProfile = np.empty(self.period)
+        self.seasonalProfile[cycle % self.period] = seasonal[cycle]
+        self.phase = start % self.period
+        self.slope = trend[start + 1] - trend[start]
+        self.level = trend[start] - self.slope
+
+        residuals = np.array([self.updateState(value) for value in values[start:]])
+        self.sinceRefit = 0
+        return residuals
+
+    def refitState(self):
+        #Periodic correction of online mode: refit the window and replay its last refitInterval points
+        values, _ = self.window.view()
+        self.replayState(self.fit(values), values, max(0, len(values) - self.refitInterval - self.period))
+
+    def updateState(self, data):
+        """
+        Score a new point against the incremental decomposition and fold it into the state in O(1).
+        This is the additive Holt-Winters update: the level/slope pair tracks the trend and the seasonal
+        profile entry of the current cycle position is nudged towards the new deseasonalised value.
+        Anomalous points are clipped to the thresholds before the update so that they do not drag the state.
+        Returns the residual of the new point.
+        """
+        alpha, beta, gamma = self.smoothing
+        seasonal = self.seasonalProfile[self.phase]
+        forecast = self.level + self.slope
+        residual = data - seasonal - forecast
+
+        #Limit the influence of outliers on the state
+        clipped = min(max(residual, self.lower), self.upper)
+
+        level = forecast + alpha * clipped
+        self.slope = self.slope + beta * (level - self.level - self.slope)
+        self.level = level
+        self.seasonalProfile[self.phase] = seasonal + gamma * (clipped + forecast - level)
+
+        self.phase = (self.phase + 1) % self.period
+        self.sinceRefit += 1
+        return residual
+
+    def baselineFrom(self, result, timestamps):
+        """
+        Build the forecast baseline from a full STL fit.
+        The profile holds, for every hour of the week, the average seasonal + trend estimate of the window relative to the
+        mean trend, so weekday/weekend differences that the daily STL period leaves in the trend are kept. The offset is
+        the trend averaged over the last week, which carries the current level (and any drift) forward.
+        Returns the (profile, offset) tuple.
+        """
+        trend = np.asarray(result.trend)
+        fitted = np.asarray(result.seasonal) + trend - trend.mean()
+        hourOfWeek = (timestamps // HOUR) % 168
+
+        counts = np.bincount(hourOfWeek, minlength=168)
+        profile = np.bincount(hourOfWeek, weights=fitted, minlength=168) / np.maximum(counts, 1)
+        return profile, trend[-168:].mean()
+
+    def forecast(self, timestamps):
+        """
+        Seasonal + trend estimate of the given timestamps (ns) projected from the last fit: a lookup in the
+        hour-of-week profile plus the trend offset.
+        """
+        profile, offset = self.baseline #read once, a background refit may swap it at any time
+        return profile[(timestamps // HOUR) % 168] + offset
+
+    def refitBaseline(self, values, timestamps):
+        #Body of a background refit: fit the snapshot of the window and swap the new baseline in atomically
+        try:
+            self.baseline = self.baselineFrom(self.fit(values), timestamps)
+        except Exception as e:
+            logging.error("Background refit failed: %s", e)
+
+    def scheduleRefit(self):
+        """
+        Start a background refit on a snapshot of the window, unless one is already running.
+        Scoring keeps using the previous baseline until the new one is swapped in.
+        """
+        if self.refitThread is not None and self.refitThread.is_alive():
+            return
+        values, timestamps = self.window.view()
+        self.refitThread = threading.Thread(target=self.refitBaseline, args=(values.copy(), timestamps.copy()), daemon=True)
+        self.refitThread.start()
+        self.sinceRefit = 0
+
+    def refitLoop(self):
+        #Timer thread of forecast mode: refit every refitSeconds until close() is called
+        while not self.stopped.wait(self.refitSeconds):
+            self.scheduleRefit()
+
+    def close(self):
+        """
+        Stop the refit timer, wait for a running background refit to finish, close the open incident and remove the
+        temporary spill file of the anomaly log.
+        """
+        self.stopped.set()
+        for thread in (self.refitTimer, self.refitThread):
+            if thread is not None:
+                thread.join()
+        super().close()
+
+    def TrainSTLModel(self, instances, seed=None):
         """
         Train the STL model with a given number of instances.
         Generates training data without contamination, fits the STL model,
-        and calculates the residual mean and standard deviation to set the anomaly detection thresholds.
+        and calculates the residual mean and standard deviation to set the anomaly detection thresholds (per hour-of-week
+        bucket when the thresholds are bucketed). The residuals are those of the mode: in-sample STL residuals in batch
+        mode, one-step errors of the incremental update replayed over the training data in online mode and errors of the
+        hour-of-week baseline in forecast mode.
         If our data had a more varying trend, we could introduce retraining, however, the data remains static so 
         we it is not required for this use case.
+        The seed makes the generated training set reproducible.
+        Forecast mode needs at least a week of training data: an hour of the week without any training point would have
+        no baseline to score against.
         """
-        #Generate training data without contamination
-        trainingGenerator = data.generateCPUData(contamination=0, trainMode=True)
-        
-        #Create a time series index for the training data
-        self.data_points = pd.Series(
-            [next(trainingGenerator) for _ in range(instances)], 
-            index=pd.date_range(self.date, periods=instances, freq="1h")
-        )
+        if self.mode == "forecast" and instances < 168:
+            raise ValueError("forecast mode needs at least 168 training points, one per hour of the week.")
+
+        super().train(instances, seed)
+
+        if self.mode == "forecast":
+            if self.refitSeconds and self.refitTimer is None:
+                self.refitTimer = threading.Thread(target=self.refitLoop, daemon=True)
+                self.refitTimer.start()
 
-        #Update the current date index 
-        self.date = self.data_points.index[-1] + pd.Timedelta(1, "h")
+    #Name of TrainSTLModel in the common detector interface
+    train = TrainSTLModel
 
-        #Fit the STL model and calculate residual statistics
+    def learn(self, values, timestamps):
+        #Fit the STL model to the training data in the window, the residuals the thresholds are set from depend on the mode
         result = self.fit()
-        resid_mu = result.resid.mean()
-        resid_dev = result.resid.std()
 
-        #Set lower and upper thresholds for anomaly detection
-        self.lower = resid_mu - self.threshold_factor * resid_dev
-        self.upper = resid_mu + self.threshold_factor * resid_dev
+        if self.mode == "forecast":
+            #Forecast residuals include the week-to-week variation, so the thresholds are set from them instead
+            self.baseline = self.baselineFrom(result, timestamps)
+            return values - self.forecast(timestamps)
+        if self.mode == "online":
+            #Online scoring produces one-step Holt-Winters errors, which are larger than the in-sample STL residuals,
+            #so the thresholds are set from an unclipped replay of the training data through the incremental update,
+            #which also leaves the incremental state where scoring starts (the first cycle only settles the state)
+            self.lower, self.upper = -np.inf, np.inf
+            return self.replayState(result, values)[self.period:]
 
-    def predict(self, data, window_size):
+        #Seed the incremental state from the training fit
+        self.resetState(result)
+        return np.asarray(result.resid)
+
+    def scoreOne(self, value, timestamp):
         """
-        Predict anomalies in the incoming data point and updates the data stream with the new data point.
-        We refit the data with the new data point and check if the residual of the latest data point is outside the defined thresholds.
-        If an anomaly is detected, it is recorded in the anomalies series of the class.
+        Residual of a new point, which is already in the window.
+        In batch mode the whole window is refitted. In online mode the full refit is replaced by an O(1) incremental
+        update, with a full refit every refitInterval points to correct any drift of the incremental state.
+        In forecast mode the point is scored with a lookup in the baseline of the last fit and a subtraction, and the
+        refit runs in a background thread every refitInterval points (and/or every refitSeconds).
         """
-        #Add new data point to the series
-        new_point = pd.Series([data], index=[self.date])
-        self.data_points = pd.concat([self.data_points, new_point])[-window_size:]
-        
-        #Update the current date index for the next point
-        self.date = self.data_points.index[-1] + pd.Timedelta(1, "h")
+        if self.mode == "online":
+            #Score against the incremental state, then periodically correct it with a full refit
+            residual = self.updateState(value)
+            if self.sinceRefit >= self.refitInterval:
+                self.refitState()
+        elif self.mode == "forecast":
+            #Constant time scoring, the refit happens off the hot path
+            residual = value - self.forecast(timestamp)
+            self.sinceRefit += 1
+            if self.sinceRefit >= self.refitInterval:
+                self.scheduleRefit()
+        else:
+            #refit the data
+            residual = self.fit().resid[-1]
+        return residual
 
-        #refit the data
-        result = self.fit()
-        residual = result.resid[-1]
+    def score(self, values, timestamps):
+        """
+        Residuals of a block of new points, which are already in the window: the window is decomposed a single time, so
+        a burst of points costs about one fit instead of one fit per point. In online mode the points are folded into the
+        incremental state one after the other and the periodic refit runs at most once for the block.
+        """
+        if self.mode == "online":
+            residuals = np.array([self.updateState(value) for value in values])
+            if self.sinceRefit >= self.refitInterval:
+                self.refitState()
+        elif self.mode == "forecast":
+            residuals = values - self.forecast(timestamps)
+            self.sinceRefit += len(values)
+            if self.sinceRefit >= self.refitInterval:
+                self.scheduleRefit()
+        else:
+            #one refit for the whole block, the residuals of the block are the tail of the decomposition
+            residuals = np.asarray(self.fit().resid[-len(values):])
+        return residuals
+
+    def predict_batch(self, values, timestamps=None, window_size=None):
+        """
+        Predict anomalies for a whole block of incoming data points at once (see Detector.predict_batch).
+        The block is decomposed with the window, so it cannot be larger than window_size.
+        """
+        if len(values) > (self.window.capacity if window_size is None else window_size):
+            raise ValueError("a batch cannot be larger than window_size.")
+        return super().predict_batch(values, timestamps, window_size)
+
+    def stateBytes(self):
+        #The incremental and forecast state, set by train
+        state = 0
+        if hasattr(self, "seasonalProfile"):
+            state += self.seasonalProfile.nbytes
+        if hasattr(self, "baseline"):
+            state += self.baseline[0].nbytes
+        return state
+
+    def memoryUsage(self, peak=False):
+        """
+        Bytes held by the model, per component (see Detector.memoryUsage). The STL kernel is shared by every model with
+        the same window length and period, so it is reported on its own and not counted in the total.
+        """
+        usage = super().memoryUsage(peak)
+        usage["kernel_shared"] = self.kernel.nbytes() if self.kernel is not None else 0
+        return usage
+
+    def save(self, path):
+        """
+        Checkpoint the model state to the directory `path`: the window buffer, the thresholds, the date cursor,
+        the incremental decomposition state and the anomaly log.
+        Arrays are stored as .npy files, which load() memory-maps, and the settings as meta.json.
+        The checkpoint is written next to `path` first and then swapped in, so a crash never leaves a partial checkpoint.
+        The records the anomaly log spilled to disk are copied into the checkpoint, which is then self-contained.
+        """
+        temporary = path.rstrip(os.sep) + ".tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+
+        values, timestamps = self.window.view()
+        np.save(os.path.join(temporary, "values.npy"), values)
+        np.save(os.path.join(temporary, "timestamps.npy"), timestamps)
+        np.save(os.path.join(temporary, "anomalies.npy"), self.anomalyLog.records[:self.anomalyLog.size])
+        if self.anomalyLog.spilled:
+            self.anomalyLog.export(os.path.join(temporary, "spilled.anomalies"))
+        if hasattr(self, "seasonalProfile"):
+            np.save(os.path.join(temporary, "seasonal.npy"), self.seasonalProfile)
+        if hasattr(self, "baseline"):
+            np.save(os.path.join(temporary, "baseline.npy"), self.baseline[0])
+
+        meta = {
+            "threshold": self.threshold_factor,
+            "mode": self.mode,
+            "period": self.period,
+            "refitInterval": self.refitInterval,
+            "smoothing": list(self.smoothing),
+            "window_size": self.window.capacity,
+            "date": self.date.value,
+            "lower": getattr(self, "lower", None),
+            "upper": getattr(self, "upper", None),
+            "phase": getattr(self, "phase", None),
+            "level": getattr(self, "level", None),
+            "slope": getattr(self, "slope", None),
+            "sinceRefit": self.sinceRefit,
+            "refitSeconds": self.refitSeconds,
+            "offset": self.baseline[1] if hasattr(self, "baseline") else None,
+            "thresholdMode": self.thresholdMode,
+            "thresholdAlpha": getattr(self.thresholds, "alpha", None),
+            "thresholdBuckets": getattr(self.thresholds, "buckets", 1),
+            "thresholdState": self.thresholds.state(),
+            "engine": self.engine,
+            "compact": self.compact,
+            "memoryBudget": self.memoryBudget,
+            "anomalyCapacity": self.anomalyLog.capacity,
+            "spillFile": "spilled.anomalies" if self.anomalyLog.spilled else None, #relative to the checkpoint
+            "spilled": self.anomalyLog.spilled,
+        }
+        with open(os.path.join(temporary, "meta.json"), "w") as f:
+            json.dump({key: float(value) if isinstance(value, np.floating) else value for key, value in meta.items()}, f)
+
+        #Swap the new checkpoint in
+        previous = path.rstrip(os.sep) + ".old"
+        if os.path.exists(path):
+            shutil.rmtree(previous, ignore_errors=True)
+            os.rename(path, previous)
+        os.rename(temporary, path)
+        shutil.rmtree(previous, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path, verbose=True, alerts=None):
+        """
+        Restore a model checkpointed with save(). The arrays are memory-mapped rather than read, so a restarted
+        detector resumes scoring, on the same time index, without generating training data or fitting STL.
+        """
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        model = cls(threshold=meta["threshold"], mode=meta["mode"], period=meta["period"], refitInterval=meta["refitInterval"],
+                    smoothing=tuple(meta["smoothing"]), window_size=meta["window_size"], verbose=verbose, alerts=alerts,
+                    anomalyCapacity=meta["anomalyCapacity"], spillPath=meta.get("spillPath"), refitSeconds=meta["refitSeconds"],
+                    thresholdMode=meta["thresholdMode"], thresholdAlpha=meta["thresholdAlpha"] or 0.01,
+                    thresholdBuckets=meta["thresholdBuckets"], engine=meta.get("engine", "kernel"),
+                    compact=meta.get("compact", False), memoryBudget=meta.get("memoryBudget"))
 
-        #Anomaly detection: check Threshold Graph.png for reference
-        if residual < self.lower or residual > self.upper:
-            self.anomalies = pd.concat([self.anomalies, new_point])
-            print(f"Anomaly detected at time {self.date}: {data}")
+        values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+        timestamps = np.load(os.path.join(path, "timestamps.npy"), mmap_mode="r")
+        model.window.extend(values, timestamps)
+        spillFile = os.path.join(path, meta["spillFile"]) if meta.get("spillFile") else None
+        model.anomalyLog.restore(np.load(os.path.join(path, "anomalies.npy"), mmap_mode="r"), meta["spilled"], spillFile)
 
+        model.date = pd.Timestamp(meta["date"])
+        model.sinceRefit = meta["sinceRefit"]
+        model.thresholds.restore(meta["thresholdState"])
+        for key in ("lower", "upper", "phase", "level", "slope"):
+            if meta[key] is not None:
+                setattr(model, key, meta[key])
+        if os.path.exists(os.path.join(path, "seasonal.npy")):
+            model.seasonalProfile = np.load(os.path.join(path, "seasonal.npy"))
+        if os.path.exists(os.path.join(path, "baseline.npy")):
+            model.baseline = (np.load(os.path.join(path, "baseline.npy")), meta["offset"])
+            if model.refitSeconds:
+                model.refitTimer = threading.Thread(target=model.refitLoop, daemon=True)
+                model.refitTimer.start()
+        return model
@@ -0,0 +1,188 @@
+#custom build modules
+import data
+import models
+
+#External Libraries
+import pandas as pd
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import logging
+import sys
+import time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class PipelineStats:
+    """
+    Counters shared by the stages of the asyncio pipeline, so that backpressure is measurable.
+
+    Class Attributes:
+        - produced: Points emitted by the source.
+        - dropped: Points discarded because the queue was full (drop policy only).
+        - scored: Points scored by the detector.
+        - anomalies: Anomalies handed to the sink.
+        - queueDepth / maxQueueDepth: Current and highest number of points waiting to be scored.
+        - lag / maxLag: Seconds between a point entering the queue and its score being available (last and highest).
+        - blockedTime: Total seconds the source spent waiting for room in the queue (block policy only).
+    """
+
+    def __init__(self):
+        self.produced = 0
+        self.dropped = 0
+        self.scored = 0
+        self.anomalies = 0
+        self.queueDepth = 0
+        self.maxQueueDepth = 0
+        self.lag = 0.0
+        self.maxLag = 0.0
+        self.blockedTime = 0.0
+
+    def snapshot(self):
+        return dict(vars(self))
+
+async def source(queue, stats, points, start, policy="block"):
+    """
+    Source stage: moves the points of an async iterable into the bounded queue.
+    Every point is queued with its timestamp, one hour after the previous point starting at `start`, so a point is
+    scored against its own hour of the week even when points before it were dropped.
+    With the "block" policy the source waits for room in the queue (backpressure reaches the producer), with the
+    "drop" policy the oldest waiting point is discarded to make room (the producer is never slowed down).
+    A None is queued at the end of the stream.
+    """
+    loop = asyncio.get_running_loop()
+    async for value in points:
+        timestamp = start + pd.Timedelta(stats.produced, "h")
+        stats.produced += 1
+        if queue.full():
+            if policy == "drop":
+                queue.get_nowait()
+                stats.dropped += 1
+            else:
+                waiting = loop.time()
+                await queue.put((timestamp, value, loop.time()))
+                stats.blockedTime += loop.time() - waiting
+                stats.queueDepth = queue.qsize()
+                continue
+
+        queue.put_nowait((timestamp, value, loop.time()))
+        stats.queueDepth = queue.qsize()
+        stats.maxQueueDepth = max(stats.maxQueueDepth, stats.queueDepth)
+    await queue.put(None)
+
+async def scorer(queue, results, stats, model, window_size, executor):
+    """
+    Scoring stage: takes points off the queue and runs STLModel.predict (and therefore the STL fit) in the executor,
+    so the event loop is free to ingest and emit while the decomposition runs. The model's date index is set to the
+    timestamp of every point before it is scored.
+    Anomalies are forwarded to the results queue, a None is forwarded at the end of the stream.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await queue.get()
+        stats.queueDepth = queue.qsize()
+        if item is None:
+            await results.put(None)
+            break
+
+        timestamp, value, enqueued = item
+        model.date = timestamp
+        is_anomaly, residual = await loop.run_in_executor(executor, model.predict, value, window_size)
+
+        stats.scored += 1
+        stats.lag = loop.time() - enqueued
+        stats.maxLag = max(stats.maxLag, stats.lag)
+        if is_anomaly:
+            await results.put({"timestamp": timestamp.isoformat(), "value": value, "residual": float(residual)})
+
+async def sink(results, stats, out):
+    """
+    Sink stage: writes every anomaly as a JSON line to out.
+    """
+    while True:
+        anomaly = await results.get()
+        if anomaly is None:
+            break
+        stats.anomalies += 1
+        out.write(json.dumps(anomaly) + "\n")
+
+async def reporter(stats, interval):
+    #Periodically log the pipeline counters
+    while True:
+        await asyncio.sleep(interval)
+        logging.info("Pipeline stats: %s", stats.snapshot())
+
+async def runPipeline(points, model, window_size, queueSize=100, policy="block", out=None, stats=None, reportInterval=None):
+    """
+    Run the source -> bounded queue -> scorer -> sink pipeline until points is exhausted.
+
+    Parameters:
+    - points: Async iterable of hourly values following the training data of the model, for example
+      data.generateCPUDataAsync started at the model's date index.
+    - model: A trained STLModel.
+    - window_size: Number of data points the model holds.
+    - queueSize: Capacity of the queue between the source and the scorer.
+    - policy: "block" to apply backpressure to the source, "drop" to discard the oldest waiting points.
+    - out: Text stream the anomalies are written to, defaults to stdout.
+    - stats: PipelineStats to update, a new one is created by default.
+    - reportInterval: Seconds between two log lines of the counters, None disables them.
+
+    Returns the PipelineStats of the run.
+    """
+    if policy not in ("block", "drop"):
+        raise ValueError("policy must be either 'block' or 'drop'.")
+
+    stats = stats or PipelineStats()
+    queue = asyncio.Queue(maxsize=queueSize)
+    results = asyncio.Queue()
+
+    #A single thread: the model is not thread safe and points of a stream must be scored in order
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        report = asyncio.create_task(reporter(stats, reportInterval)) if reportInterval else None
+        try:
+            await asyncio.gather(
+                source(queue, stats, points, model.date, policy),
+                scorer(queue, results, stats, model, window_size, executor),
+                sink(results, stats, out or sys.stdout),
+            )
+        finally:
+            if report:
+                report.cancel()
+    return stats
+
+async def limit(points, iterations):
+    #Stop an endless async source after a number of points
+    count = 0
+    async for value in points:
+        if count >= iterations:
+            break
+        count += 1
+        yield value
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the detector as an asyncio pipeline fed by the paced generator.")
+    parser.add_argument("--iterations", type=int, default=150)
+    parser.add_argument("--contamination", type=int, default=10)
+    parser.add_argument("--window-size", type=int, default=10000)
+    parser.add_argument("--train-iterations", type=int, default=3000)
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between two generated points")
+    parser.add_argument("--queue-size", type=int, default=100)
+    parser.add_argument("--policy", default="block", choices=["block", "drop"])
+    parser.add_argument("--mode", default="batch", choices=["batch", "online", "forecast"])
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    model = models.STLModel(mode=args.mode, window_size=args.window_size, verbose=False)
+    model.TrainSTLModel(args.train_iterations)
+
+    points = limit(data.generateCPUDataAsync(args.contamination, interval=args.interval, start=model.date), args.iterations)
+    start = time.perf_counter()
+    stats = asyncio.run(runPipeline(points, model, args.window_size, args.queue_size, args.policy,
+                                    reportInterval=args.report_interval))
+    model.close()
+    logging.info("Pipeline finished in %.2f s: %s", time.perf_counter() - start, stats.snapshot())
+
+if __name__ == "__main__":
+    main()
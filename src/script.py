@@ -1,6 +1,7 @@
-import visualization as v
+import argparse
 import sys
 import logging
+from validation import parameterValidation #standard library only, so bad arguments are rejected before any heavy import
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -11,30 +12,86 @@ def get_user_input(prompt, default):
     return int(user_input) if user_input else default
 
 
-#There are three methods of starting the system
+parser = argparse.ArgumentParser(description="Real-time anomaly detection on a CPU utilization data stream.")
+parser.add_argument("params", nargs="*", help="iterations contamination window_size trainIterations")
+parser.add_argument("--headless", action="store_true", help="run without a display and write anomalies as JSON lines to stdout")
+parser.add_argument("--input", help="file to read values from in headless mode, '-' for stdin (default: built-in generator)")
+#The names of detectors.DETECTORS, spelled out so that parsing the arguments does not import NumPy
+parser.add_argument("--detector", default="stl", choices=["stl", "profile", "mad", "ewma", "tiered"], help="anomaly detector (see detectors.py)")
+parser.add_argument("--mode", default="batch", choices=["batch", "online", "forecast"], help="STL decomposition mode")
+parser.add_argument("--threshold", default="frozen", choices=["frozen", "ewm"], help="headless mode: frozen or online adaptive thresholds")
+parser.add_argument("--threshold-buckets", type=int, default=1, help="headless mode: hour-of-week buckets of adaptive thresholds (1 or 168)")
+parser.add_argument("--checkpoint", help="headless mode: directory to warm start the model from and to checkpoint it to")
+parser.add_argument("--checkpoint-interval", type=int, help="headless mode: also checkpoint every N points")
+parser.add_argument("--compact", action="store_true", help="headless mode: keep the window as float32 values with implicit hourly timestamps")
+parser.add_argument("--alerts", help="headless mode: write coalesced, rate limited incidents to a file, '-' (stdout) or an http:// URL instead of every anomalous point")
+parser.add_argument("--memory-budget", type=int, help="headless mode: maximum number of bytes the model may hold")
+parser.add_argument("--separate-process", action="store_true", help="plotting mode: run the detector in its own process, handing points over through shared memory")
+parser.add_argument("--fps", type=int, default=10, help="plotting mode with --separate-process: frames drawn per second")
+parser.add_argument("--metrics-port", type=int, help="serve per-stage timings in the Prometheus text format on http://127.0.0.1:PORT/metrics")
+parser.add_argument("--metrics-log", type=float, help="log a summary of the per-stage timings every N seconds")
+args = parser.parse_args()
+
+#The instrumentation is only switched on when asked for, it costs close to nothing otherwise
+if args.metrics_port is not None or args.metrics_log is not None:
+    import metrics
+
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    if args.metrics_log is not None:
+        metrics.startLogging(args.metrics_log)
+
+#There are four methods of starting the system
 
 #Method 1: using default values, if the user does not provide any values
 iterations, contamination, window_size, trainIterations = 150, 10, 10000, 3000
 
 
-if len(sys.argv) > 1: #Method 2: Through the command line
+if args.params: #Method 2: Through the command line
     # If parameters are passed via command line arguments
     try:
-        iterations = int(sys.argv[1])
-        contamination = int(sys.argv[2])
-        window_size = int(sys.argv[3])
-        trainIterations = int(sys.argv[4])
+        iterations = int(args.params[0])
+        contamination = int(args.params[1])
+        window_size = int(args.params[2])
+        trainIterations = int(args.params[3])
     except (IndexError, ValueError):
         logging.error("Invalid command line arguments. Using default values.")
 
-else:
+elif not args.headless:
     # Ask the user if they want to input parameters
     use_defaults = input("Do you want to use default values? (yes/no): ").strip().lower()
-    
+
     if use_defaults == 'no': #Method 3: Through user input
         iterations = get_user_input("Enter iterations (default 150): ", 150)
         contamination = get_user_input("Enter contamination (0-100, default 10): ", 10)
         window_size = get_user_input("Enter window_size (default 10000): ", 10000)
         trainIterations = get_user_input("Enter trainIterations (default 3000): ", 3000)
 
-v.visualizeData(iterations=iterations, contamination=contamination, window_size=window_size, trainIterations=trainIterations)
\ No newline at end of file
+try:
+    parameterValidation(iterations, contamination, window_size, trainIterations)
+except ValueError as ve:
+    logging.error("Parameter validation error: %s", ve)
+    sys.exit(1)
+
+if args.headless: #Method 4: Headless, no display and no matplotlib
+    import stream
+
+    options = dict(mode=args.mode, checkpoint=args.checkpoint, checkpointInterval=args.checkpoint_interval,
+                   thresholdMode=args.threshold, thresholdBuckets=args.threshold_buckets, detector=args.detector,
+                   compact=args.compact, memoryBudget=args.memory_budget, alerts=args.alerts)
+    try:
+        if args.input is None:
+            stream.runHeadless(iterations, contamination, window_size, trainIterations, **options)
+        elif args.input == "-":
+            stream.runHeadless(iterations, contamination, window_size, trainIterations, source=sys.stdin, **options)
+        else:
+            with open(args.input) as source:
+                stream.runHeadless(iterations, contamination, window_size, trainIterations, source=source, **options)
+    except ValueError as ve:
+        logging.error("Parameter validation error: %s", ve)
+        sys.exit(1)
+else:
+    import visualization as v
+
+    v.visualizeData(iterations=iterations, contamination=contamination, window_size=window_size, trainIterations=trainIterations, mode=args.mode, detector=args.detector,
+                    separate=args.separate_process, fps=args.fps)
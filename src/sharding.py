@@ -0,0 +1,153 @@
+#custom build modules
+import models
+
+#External Libraries
+import numpy as np
+import logging
+import multiprocessing
+import queue
+import zlib
+
+def shardOf(streamId, shards):
+    """
+    Returns the shard (worker index) that owns a stream.
+    A CRC32 of the stream id is used instead of hash(), which is randomized per interpreter and would route the same
+    stream to different workers in different processes.
+    """
+    return zlib.crc32(str(streamId).encode()) % shards
+
+def worker(shard, inbox, outbox, modelOptions, trainIterations, batched):
+    """
+    Body of a worker process. Owns the STLModel of every stream routed to it, creating and training a model the first
+    time a stream is seen, and answers every scoring request with the results of each stream in arrival order.
+
+    Messages on the inbox are (requestId, {streamId: values}) tuples, None stops the worker.
+    Replies on the outbox are (requestId, shard, {streamId: (mask, residuals)}) tuples.
+    """
+    streams = {}
+    while True:
+        message = inbox.get()
+        if message is None:
+            break
+        requestId, batch = message
+
+        results = {}
+        try:
+            for streamId, values in batch.items():
+                model = streams.get(streamId)
+                if model is None:
+                    model = models.STLModel(verbose=False, **modelOptions)
+                    model.TrainSTLModel(trainIterations, seed=zlib.crc32(str(streamId).encode()))
+                    streams[streamId] = model
+
+                if batched:
+                    results[streamId] = model.predict_batch(values)
+                else:
+                    scored = [model.predict(value, model.window.capacity) for value in values]
+                    results[streamId] = (np.array([s[0] for s in scored], dtype=bool), np.array([s[1] for s in scored]))
+        except Exception as e:
+            logging.error("Worker failed on request %d: %s", requestId, e)
+            results = e
+        outbox.put((requestId, shard, results))
+
+class ShardedRunner:
+    """
+    ShardedRunner spreads the streams of a fleet over a pool of worker processes, so that STL decomposition
+    of different streams runs on different CPU cores.
+
+    Every stream id is owned by exactly one worker (see shardOf), which keeps that stream's STLModel for the lifetime
+    of the runner. Incoming points are grouped per worker and per stream, sent to every worker at once and the results
+    are collected back, in arrival order for each stream.
+
+    Class Attributes:
+        - shards: Number of worker processes.
+        - trainIterations: Number of points used to train each new stream model.
+        - pollInterval: Seconds between two liveness checks of the workers while waiting for their replies.
+    """
+
+    def __init__(self, shards=None, trainIterations=3000, batched=False, pollInterval=1.0, **modelOptions):
+        """
+        Parameters:
+        - shards (int): Number of worker processes, defaults to the number of CPU cores.
+        - trainIterations (int): Number of points used to train the model of every new stream.
+        - batched (bool): Score the points of a stream received in one call with predict_batch instead of predict.
+        - pollInterval (float): Seconds between two liveness checks of the workers while waiting for their replies.
+        - modelOptions: Keyword arguments passed on to STLModel (mode, window_size, ...).
+        """
+        self.shards = shards or multiprocessing.cpu_count()
+        self.trainIterations = trainIterations
+        self.pollInterval = pollInterval
+        self.requestId = 0
+
+        self.outbox = multiprocessing.Queue()
+        self.inboxes = []
+        self.processes = []
+        for shard in range(self.shards):
+            inbox = multiprocessing.Queue()
+            process = multiprocessing.Process(target=worker, args=(shard, inbox, self.outbox, modelOptions, trainIterations, batched), daemon=True)
+            process.start()
+            self.inboxes.append(inbox)
+            self.processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def score(self, points):
+        """
+        Score a group of points across the workers.
+
+        Parameters:
+        - points (iterable): (streamId, value) pairs, in arrival order.
+
+        Returns:
+        - dict: streamId -> (mask, residuals) arrays, in arrival order for that stream.
+
+        Raises a RuntimeError when a worker that owes a reply has died (killed, out of memory, crashed); its streams
+        and their models are lost, so the runner cannot be used any more.
+        """
+        requestId = self.requestId
+        self.requestId += 1
+
+        #Route every point to the worker owning its stream, keeping the order within each stream
+        batches = [{} for _ in range(self.shards)]
+        for streamId, value in points:
+            batches[shardOf(streamId, self.shards)].setdefault(streamId, []).append(value)
+
+        pending = set()
+        for shard, (inbox, batch) in enumerate(zip(self.inboxes, batches)):
+            if batch:
+                inbox.put((requestId, batch))
+                pending.add(shard)
+
+        results = {}
+        while pending:
+            try:
+                replyId, shard, reply = self.outbox.get(timeout=self.pollInterval)
+            except queue.Empty:
+                #Training a new stream can take a while, only a dead worker ends the wait
+                for shard in pending:
+                    process = self.processes[shard]
+                    if not process.is_alive():
+                        raise RuntimeError(f"shard {shard} (pid {process.pid}) exited with code {process.exitcode} before replying.")
+                continue
+            if replyId != requestId:
+                continue #left over from a request that failed
+            if isinstance(reply, Exception):
+                raise reply
+            results.update(reply)
+            pending.discard(shard)
+
+        return results
+
+    def close(self):
+        #Stop the workers and wait for them to exit
+        if not self.processes:
+            return
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for process in self.processes:
+            process.join()
+        self.processes = []
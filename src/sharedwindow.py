@@ -0,0 +1,191 @@
+#custom build modules
+from window import RingBuffer
+
+#External Libraries
+import numpy as np
+import logging
+import time
+from multiprocessing import shared_memory
+
+#Fields of the int64 header at the start of the shared block
+SEQUENCE, HEAD, SIZE, PUBLISHED, ANOMALY_HEAD, ANOMALY_SIZE, ANOMALIES, DONE, STOP, WINDOW, SLACK, ANOMALY_WINDOW = range(12)
+HEADER_FIELDS = 16
+
+class SharedWindow:
+    """
+    SharedWindow hands the stream over from a detector process to a plotting process through one
+    multiprocessing.shared_memory block: the most recent points and the most recent anomalies, each in a RingBuffer
+    whose arrays live in the shared block, plus an int64 header (positions, counters and flags).
+
+    The writer never waits for the reader. It bumps a sequence number to an odd value, appends the point (and the
+    anomaly), updates the header and bumps the sequence back to even (a seqlock), which costs a few array writes per point.
+    The reader only retries the short read of the header, then works on zero-copy views of the rings. The rings are
+    `slack` points larger than what the reader looks at, and with the double-write layout of RingBuffer the writer's next
+    `slack` appends land outside the viewed range; the reader checks afterwards that fewer points than that were
+    published meanwhile, so a view it used can never have been torn.
+
+    Class Attributes:
+        - memory: The SharedMemory block, its name is what the other process attaches to.
+        - header: int64 view of the header fields (see SEQUENCE, HEAD, ...).
+        - points: RingBuffer of the last window + slack points (values and timestamps in ns).
+        - anomalies: RingBuffer of the last anomalyWindow + slack anomalies.
+        - window, anomalyWindow: Number of points and anomalies the reader sees.
+        - slack: Points (and anomalies) the writer may publish during one read.
+    """
+
+    def __init__(self, window=10000, anomalyWindow=1024, slack=None, name=None):
+        """
+        Create a block (name is None) or attach to the block of another process (window and the sizes are then read
+        from its header).
+        """
+        if name is None:
+            slack = slack or window
+            size = self.layout(window, anomalyWindow, slack)
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+            self.header = np.ndarray(HEADER_FIELDS, dtype=np.int64, buffer=self.memory.buf)
+            self.header[:] = 0
+            self.header[WINDOW], self.header[SLACK], self.header[ANOMALY_WINDOW] = window, slack, anomalyWindow
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.header = np.ndarray(HEADER_FIELDS, dtype=np.int64, buffer=self.memory.buf)
+
+        self.window, self.slack, self.anomalyWindow = (int(self.header[field]) for field in (WINDOW, SLACK, ANOMALY_WINDOW))
+        offset = HEADER_FIELDS * 8
+        self.points, offset = self.ring(self.window + self.slack, offset)
+        self.anomalies, offset = self.ring(self.anomalyWindow + self.slack, offset)
+
+    @staticmethod
+    def layout(window, anomalyWindow, slack):
+        #Size in bytes of the block: the header, then values and timestamps of both rings (2 * capacity each)
+        return HEADER_FIELDS * 8 + 32 * (window + slack) + 32 * (anomalyWindow + slack)
+
+    def ring(self, capacity, offset):
+        #A RingBuffer whose backing arrays are views of the shared block, and the offset after them
+        ring = RingBuffer(capacity)
+        ring.values = np.ndarray(2 * capacity, dtype=np.float64, buffer=self.memory.buf, offset=offset)
+        ring.timestamps = np.ndarray(2 * capacity, dtype=np.int64, buffer=self.memory.buf, offset=offset + 16 * capacity)
+        return ring, offset + 32 * capacity
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    #---------Writer side (detector process)----------------
+    def publish(self, value, timestamp, is_anomaly):
+        """
+        Publish a scored point (timestamp in ns).
+        """
+        header = self.header
+        header[SEQUENCE] += 1
+        self.points.append(value, timestamp)
+        if is_anomaly:
+            self.anomalies.append(value, timestamp)
+            header[ANOMALY_HEAD], header[ANOMALY_SIZE] = self.anomalies.head, self.anomalies.size
+            header[ANOMALIES] += 1
+        header[HEAD], header[SIZE] = self.points.head, self.points.size
+        header[PUBLISHED] += 1
+        header[SEQUENCE] += 1
+
+    def publishBlock(self, values, timestamps, mask):
+        """
+        Publish a block of scored points, as predict_batch returns them.
+        """
+        header = self.header
+        header[SEQUENCE] += 1
+        self.points.extend(values, timestamps)
+        if mask.any():
+            self.anomalies.extend(np.asarray(values)[mask], np.asarray(timestamps)[mask])
+            header[ANOMALY_HEAD], header[ANOMALY_SIZE] = self.anomalies.head, self.anomalies.size
+            header[ANOMALIES] += int(mask.sum())
+        header[HEAD], header[SIZE] = self.points.head, self.points.size
+        header[PUBLISHED] += len(values)
+        header[SEQUENCE] += 1
+
+    def finish(self):
+        #Tell the reader that no more points will be published
+        self.header[DONE] = 1
+
+    def stopRequested(self):
+        return bool(self.header[STOP])
+
+    #---------Reader side (plotting process)----------------
+    def requestStop(self):
+        #Ask the writer to stop publishing
+        self.header[STOP] = 1
+
+    def done(self):
+        return bool(self.header[DONE])
+
+    def snapshot(self):
+        #Consistent copy of the header fields the reader needs, retried while the writer is in the middle of a publish
+        header = self.header
+        while True:
+            sequence = header[SEQUENCE]
+            if sequence % 2:
+                time.sleep(0) #the writer is mid-publish, let it run
+            else:
+                fields = header[HEAD], header[SIZE], header[PUBLISHED], header[ANOMALY_HEAD], header[ANOMALY_SIZE], header[ANOMALIES]
+                if header[SEQUENCE] == sequence:
+                    return [int(field) for field in fields]
+
+    def read(self, consume, retries=10):
+        """
+        Call consume(values, timestamps, anomalyValues, anomalyTimestamps) on zero-copy views of the last `window`
+        points and `anomalyWindow` anomalies, oldest first, and return its result.
+        consume must not keep the views: whatever it returns has to be computed from them (for example a downsampled
+        copy). When the writer published more than `slack` points or anomalies while consume ran, its result is thrown
+        away and the read starts over, up to `retries` times before giving up (returns None).
+        """
+        for _ in range(retries):
+            head, size, published, anomalyHead, anomalySize, anomalies = self.snapshot()
+            end = head + self.points.capacity
+            count = min(size, self.window)
+            anomalyEnd = anomalyHead + self.anomalies.capacity
+            anomalyCount = min(anomalySize, self.anomalyWindow)
+
+            result = consume(self.points.values[end - count:end], self.points.timestamps[end - count:end],
+                             self.anomalies.values[anomalyEnd - anomalyCount:anomalyEnd],
+                             self.anomalies.timestamps[anomalyEnd - anomalyCount:anomalyEnd])
+
+            _, _, publishedAfter, _, _, anomaliesAfter = self.snapshot()
+            if publishedAfter - published < self.slack and anomaliesAfter - anomalies < self.slack:
+                return result
+        logging.warning("Shared window read abandoned after %d retries, the writer is too fast for the slack", retries)
+        return None
+
+    def close(self):
+        #Detach from the block (the views must not be used any more)
+        self.header = self.points = self.anomalies = None
+        self.memory.close()
+
+    def unlink(self):
+        #Free the block, done once by the process that created it
+        self.memory.unlink()
+
+def publishStream(name, iterations=150, contamination=10, window_size=10000, trainIterations=3000, mode="batch", detector="stl",
+                  paced=True, seed=None):
+    """
+    Body of the detector process: attaches to the SharedWindow `name`, trains a detector and scores the generated stream
+    as fast as the generator produces it, publishing every scored point, until `iterations` points or until the reader
+    asks it to stop. The generator starts at the model's date index, where the training data ended; with paced=False it
+    does not wait between points, and a seed makes both the training data and the stream reproducible.
+    """
+    import data
+    import detectors
+
+    shared = SharedWindow(name=name)
+    model = detectors.makeDetector(detector, mode=mode, window_size=window_size, verbose=False)
+    model.train(trainIterations, seed=seed)
+    generator = data.generateCPUData(contamination=contamination, trainMode=not paced, start=model.date, seed=seed)
+    try:
+        for _ in range(iterations):
+            if shared.stopRequested():
+                break
+            timestamp = model.date.value
+            value = next(generator)
+            is_anomaly, _ = model.predict(value, window_size)
+            shared.publish(value, timestamp, is_anomaly)
+    finally:
+        shared.finish()
+        model.close()
+        shared.close()
@@ -0,0 +1,192 @@
+#custom build modules
+import data
+from ingest import RECORD, encodeFrame, encodeLines
+
+#External Libraries
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import logging
+import socket
+import sys
+import time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+#Largest payload of a UDP datagram
+MAX_DATAGRAM = 65507
+
+class FleetSimulator:
+    """
+    FleetSimulator generates the CPU utilization of a fleet of hosts, one sample per host and per simulated hour, for
+    load testing the detector.
+
+    Every host has its own profile (work hours, timezone, ranges, contamination and drift, see data.fleetProfiles).
+    Samples are generated in blocks of blockHours hours with data.generateFleetDataBulk and returned as RECORD arrays
+    (stream id = host index), ordered by time then host, which is the wire format of ingest.py.
+    All the random draws come from one Generator seeded once and the blocks always have the same size, so a run is
+    reproducible from its seed, whatever the pacing.
+
+    Class Attributes:
+        - profiles: FLEET_PROFILE of every host.
+        - hour: UTC hour of the next sample, counted from Monday 0:00 (data.ORIGIN, the origin of the models).
+        - blockHours: Number of hours generated at once.
+        - rng: Random generator of the simulation.
+    """
+
+    def __init__(self, hosts=1000, seed=0, startHour=500, blockHours=24, **profileOptions):
+        self.rng = np.random.default_rng(seed)
+        self.profiles = data.fleetProfiles(hosts, self.rng, start=startHour, **profileOptions)
+        self.hour = startHour
+        self.blockHours = blockHours
+
+    @property
+    def hosts(self):
+        return len(self.profiles)
+
+    def block(self):
+        """
+        Returns the next blockHours hours of the fleet as a RECORD array of blockHours * hosts samples.
+        """
+        values, _ = data.generateFleetDataBulk(self.profiles, self.blockHours, self.hour, self.rng)
+        records = np.empty(values.shape, dtype=RECORD)
+        records["stream"] = np.arange(self.hosts, dtype=np.uint32)
+        records["timestamp"] = pd.date_range(data.ORIGIN + pd.Timedelta(self.hour, "h"),
+                                             periods=self.blockHours, freq="1h").asi8[:, None]
+        records["value"] = values
+        self.hour += self.blockHours
+        return records.ravel()
+
+    def frames(self, samples, frameSize):
+        """
+        Generator of RECORD arrays of frameSize samples (the last one may be shorter), until `samples` samples.
+        """
+        pending, sent = np.empty(0, dtype=RECORD), 0
+        while sent < samples:
+            if len(pending) < frameSize:
+                pending = np.concatenate([pending, self.block()])
+            frame, pending = pending[:min(frameSize, samples - sent)], pending[min(frameSize, samples - sent):]
+            sent += len(frame)
+            yield frame
+
+def openOutput(target):
+    """
+    Returns (send, close) functions writing bytes to a target: "-" for stdout (a pipe), "tcp://HOST:PORT" or
+    "udp://HOST:PORT" for a socket (one datagram per frame), a path otherwise (a file or a named pipe).
+    """
+    if target == "-":
+        return sys.stdout.buffer.write, sys.stdout.buffer.flush
+    if target.startswith(("tcp://", "udp://")):
+        host, port = target[6:].rsplit(":", 1)
+        if target.startswith("tcp://"):
+            connection = socket.create_connection((host, int(port)))
+            return connection.sendall, connection.close
+        connection = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        connection.connect((host, int(port)))
+
+        def send(frame):
+            if len(frame) > MAX_DATAGRAM:
+                raise ValueError(f"a frame of {len(frame)} bytes does not fit in a datagram, lower the frame size.")
+            connection.send(frame)
+        return send, connection.close
+    output = open(target, "wb")
+    return output.write, output.close
+
+def run(simulator, send, samples, rate=None, frameSize=1000, protocol="binary", spin=0.0005):
+    """
+    Emit `samples` samples of the simulator through send, paced to a target aggregate rate.
+
+    The schedule is fixed in advance: the frame starting at sample n is due at start + n / rate. The sender sleeps until
+    spin seconds before the deadline, then spins on the clock, which keeps the jitter well below the sleep granularity
+    of the OS. The jitter of a frame is how late it was sent. A late frame does not move the schedule (the load stays
+    open-loop, a slow receiver cannot lower it), the following frames are sent as soon as possible until the sender is
+    back on schedule. The data is generated and encoded before each deadline, so it counts against the rate.
+
+    Parameters:
+    - rate (float): Target samples/sec, None to emit as fast as possible.
+    - frameSize (int): Samples per frame (per datagram over UDP).
+    - protocol (str): "binary" frames or "line" protocol of ingest.py.
+    - spin (float): Seconds spent spinning before every deadline.
+
+    Returns:
+    - dict: The configuration, the achieved rate and the jitter percentiles in microseconds.
+    """
+    encode = encodeFrame if protocol == "binary" else encodeLines
+    lateness = []
+    sent = 0
+
+    start = time.perf_counter()
+    for frame in simulator.frames(samples, frameSize):
+        payload = encode(frame)
+        if rate:
+            deadline = start + sent / rate
+            remaining = deadline - time.perf_counter()
+            if remaining > spin:
+                time.sleep(remaining - spin)
+            while time.perf_counter() < deadline:
+                pass
+            lateness.append(time.perf_counter() - deadline)
+        send(payload)
+        sent += len(frame)
+    if rate:
+        time.sleep(max(0.0, start + sent / rate - time.perf_counter())) #the period of the last frame
+    elapsed = time.perf_counter() - start
+
+    lateness = np.array(lateness) * 1e6
+    p50, p99 = np.percentile(lateness, [50, 99]) if len(lateness) else (None, None)
+    result = {
+        "hosts": simulator.hosts,
+        "samples": sent,
+        "frame_size": frameSize,
+        "protocol": protocol,
+        "target_rate": rate,
+        "achieved_rate": sent / elapsed,
+        "elapsed_sec": elapsed,
+        "jitter_us": {"p50": p50, "p99": p99, "max": lateness.max() if len(lateness) else None},
+        "late_frames": int((lateness > 1000).sum()), #more than 1 ms late
+    }
+    logging.info("%d samples from %d hosts in %.2f s: %.0f samples/sec (target %s), jitter p50 %s us, p99 %s us",
+                 sent, simulator.hosts, elapsed, result["achieved_rate"], rate, p50, p99)
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rate-controlled fleet simulator for load testing the detector.")
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=100000, help="target samples/sec over the whole fleet, 0 for as fast as possible")
+    parser.add_argument("--samples", type=int, help="samples to emit (default: 10 seconds at the target rate)")
+    parser.add_argument("--output", default="-", help="'-' for stdout, tcp://HOST:PORT, udp://HOST:PORT or a file path")
+    parser.add_argument("--protocol", default="binary", choices=["binary", "line"], help="wire format of ingest.py")
+    parser.add_argument("--frame-size", type=int, default=1000, help="samples per frame or datagram")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start-hour", type=int, default=500, help="hour of the first sample, 500 follows the training data of ingest.py")
+    parser.add_argument("--shift", type=int, default=2, help="largest shift of the work hours")
+    parser.add_argument("--timezones", type=int, nargs=2, default=[-8, 8], help="range of the timezone offsets")
+    parser.add_argument("--contamination", type=float, nargs=2, default=[0, 10], help="range of the per-host contamination (0-100)")
+    parser.add_argument("--drift", type=float, default=0.02, help="largest drift in points per hour")
+    parser.add_argument("--drift-share", type=float, default=0.1, help="share of the hosts that drift")
+    parser.add_argument("--report", help="file the JSON report is written to (default: stderr log only)")
+    args = parser.parse_args(argv)
+
+    rate = args.rate or None
+    samples = args.samples or int(10 * (rate or 100000))
+    simulator = FleetSimulator(args.hosts, args.seed, args.start_hour, shift=args.shift, timezones=tuple(args.timezones),
+                               contamination=tuple(args.contamination), drift=args.drift, driftShare=args.drift_share)
+
+    send, close = openOutput(args.output)
+    try:
+        result = run(simulator, send, samples, rate, args.frame_size, args.protocol)
+    except (BrokenPipeError, ConnectionError) as e:
+        logging.error("Output closed: %s", e)
+        return 1
+    finally:
+        close()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
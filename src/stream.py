@@ -0,0 +1,110 @@
+#custom build modules
+import alerts as alerting
+import data
+import detectors
+import models
+from validation import parameterValidation
+
+#External Libraries
+import pandas as pd
+import json
+import logging
+import os
+import sys
+
+def readValues(source):
+    """
+    Generator that parses a stream of text lines into (timestamp, value) pairs.
+    Every line is either a single value or "timestamp,value". The timestamp is None when the line does not provide one,
+    in which case the model's own hourly date index is used. Blank and unparsable lines are skipped.
+    """
+    for number, line in enumerate(source, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            if "," in line:
+                timestamp, value = line.rsplit(",", 1)
+                yield pd.Timestamp(timestamp.strip()), float(value)
+            else:
+                yield None, float(line)
+        except ValueError:
+            logging.warning("Skipping invalid input line %d: %r", number, line)
+
+def runHeadless(iterations=150, contamination=10, window_size=10000, trainIterations=3000, source=None, out=None, mode="batch",
+                checkpoint=None, checkpointInterval=None, thresholdMode="frozen", thresholdBuckets=1, detector="stl", compact=False, memoryBudget=None,
+                alerts=None):
+    """
+    Run the detector without any display and write every detected anomaly as a JSON line.
+
+    Parameters:
+    - iterations: Number of data points to simulate when no source is given
+    - contamination: Probability of a simulated data point being anomalous (0-100)
+    - window_size: Number of data points the model holds before dropping old points (must be > trainIterations)
+    - trainIterations: Number of points to generate as base data to "train" the model (must be > 0)
+    - source: Iterable of text lines to score (file or stdin). When None the built-in generator is used, without pacing.
+    - out: Text stream the JSON lines are written to, defaults to stdout.
+    - mode: STLModel mode, "batch", "online" or "forecast".
+    - checkpoint: Directory of a model checkpoint. When it exists the model is restored from it instead of being trained,
+      and the model is checkpointed there at the end of the run.
+    - checkpointInterval: Also checkpoint every checkpointInterval points.
+    - thresholdMode: "frozen" thresholds from training or "ewm" thresholds adapted online.
+    - thresholdBuckets: Number of hour-of-week buckets of the adaptive thresholds (1 or 168).
+    - detector: Name of the detector in the detectors.DETECTORS registry, checkpoints need the "stl" detector.
+    - compact: Keep the window as float32 values with implicit hourly timestamps (input timestamps must then be hourly).
+    - memoryBudget: Maximum number of bytes the model may hold, None for no limit.
+    - alerts: Target of coalesced, rate limited incident alerts (see alerts.makeSink): a file, "-" for stdout or an
+      http:// URL. When given, incidents are written there instead of one JSON line per anomalous point.
+
+    Returns the number of anomalies written.
+    """
+    parameterValidation(iterations, contamination, window_size, trainIterations)
+    if checkpoint and detector != "stl":
+        raise ValueError("checkpoints are only supported by the stl detector.")
+    out = out or sys.stdout
+    tracker = alerting.IncidentTracker(alerting.makeSink(alerts)) if alerts else None
+
+    logging.info("Starting headless detection with parameters - iterations: %d, contamination: %d, window_size: %d, trainIterations: %d",
+                 iterations, contamination, window_size, trainIterations)
+
+    # Create and train the model, or warm start it from a checkpoint
+    if checkpoint and os.path.exists(checkpoint):
+        model = models.STLModel.load(checkpoint, verbose=False, alerts=tracker)
+        logging.info("Resumed model from checkpoint %s at %s", checkpoint, model.date)
+    else:
+        model = detectors.makeDetector(detector, mode=mode, window_size=window_size, verbose=False,
+                                       thresholdMode=thresholdMode, thresholdBuckets=thresholdBuckets, compact=compact,
+                                       memoryBudget=memoryBudget, alerts=tracker)
+        model.train(trainIterations)
+
+    if source is None:
+        #Start the simulated clock where the model's date index is, which matters after a warm start
+        generator = data.generateCPUData(contamination=contamination, trainMode=True, start=model.date)
+        points = ((None, next(generator)) for _ in range(iterations))
+    else:
+        points = readValues(source)
+
+    count = 0
+    for scored, (timestamp, value) in enumerate(points, start=1):
+        if timestamp is not None:
+            model.date = timestamp
+        date = model.date
+        is_anomaly, residual = model.predict(value, window_size)
+
+        if is_anomaly:
+            if tracker is None:
+                out.write(json.dumps({"timestamp": date.isoformat(), "value": value, "residual": float(residual)}) + "\n")
+                out.flush()
+            count += 1
+
+        if checkpoint and checkpointInterval and scored % checkpointInterval == 0:
+            model.save(checkpoint)
+
+    #Checkpoint before closing, close() removes the temporary spill file whose records the checkpoint copies
+    if checkpoint:
+        model.save(checkpoint)
+    model.close()
+    if tracker is not None:
+        tracker.sink.close()
+    logging.info("Headless detection finished, %d anomalies detected, model memory: %s", count, model.memoryUsage())
+    return count
@@ -0,0 +1,174 @@
+import numpy as np
+
+#Nanoseconds in an hour, used to place timestamps in their hour-of-week bucket
+HOUR = 3600 * 10**9
+
+def bucketMoments(values, buckets, count):
+    """
+    Returns the number of values, their mean (0 when there is none) and their sum of squared deviations from that mean,
+    for every bucket, as three arrays of `count` entries.
+    """
+    counts = np.bincount(buckets, minlength=count)
+    sums = np.bincount(buckets, weights=values, minlength=count)
+    squares = np.bincount(buckets, weights=values ** 2, minlength=count)
+    mean = sums / np.maximum(counts, 1)
+    return counts, mean, np.maximum(squares - counts * mean ** 2, 0)
+
+def bucketStatistics(values, buckets, count, prior=10, shrinkMean=True):
+    """
+    Mean and variance of the values of every bucket, shrunk towards the statistics of all the values.
+
+    A bucket that holds a few training values (3 per hour of the week for 500 hourly points) gets a mean and a variance
+    far too noisy to set thresholds from. Every bucket is therefore pooled with `prior` pseudo-values drawn from all
+    the values: its variance is shrunk towards their variance and, with shrinkMean, its mean towards their mean.
+    A bucket holding many more than `prior` values keeps about its own statistics, an empty bucket gets the global ones.
+
+    Parameters:
+    - values (np.ndarray): The training values.
+    - buckets (np.ndarray): Bucket index of every value.
+    - count (int): Number of buckets.
+    - prior (float): Weight, in values, of the global statistics in every bucket.
+    - shrinkMean (bool): Also shrink the means, otherwise a bucket with any value keeps its own mean.
+
+    Returns:
+    - (np.ndarray, np.ndarray): The mean and variance of every bucket.
+    """
+    counts, own, scatter = bucketMoments(values, buckets, count)
+    degrees = np.maximum(counts - 1, 0)
+
+    if shrinkMean:
+        mean = (counts * own + prior * values.mean()) / (counts + prior)
+    else:
+        mean = np.where(counts > 0, own, values.mean())
+    variance = (scatter + prior * values.var(ddof=1)) / (degrees + prior)
+    return mean, variance
+
+class FrozenThreshold:
+    """
+    Thresholds computed once from the training residuals (mean +/- factor * standard deviation) and never updated.
+    This is the original behaviour of STLModel.
+    """
+    adaptive = False
+    __slots__ = ("factor", "lower", "upper")
+
+    def __init__(self, factor=3):
+        self.factor = factor
+        self.lower = -np.inf
+        self.upper = np.inf
+
+    def seed(self, residuals, timestamps):
+        """
+        Set the thresholds from the training residuals.
+        """
+        mu = residuals.mean()
+        dev = residuals.std(ddof=1)
+        self.lower = mu - self.factor * dev
+        self.upper = mu + self.factor * dev
+
+    def bounds(self, timestamps):
+        """
+        Returns the (lower, upper) thresholds in force for the given timestamps (ns), scalars or arrays.
+        """
+        return self.lower, self.upper
+
+    def update(self, residual, timestamp):
+        #Frozen thresholds ignore new residuals
+        pass
+
+    def state(self):
+        return {"lower": float(self.lower), "upper": float(self.upper)}
+
+    def restore(self, state):
+        self.lower, self.upper = state["lower"], state["upper"]
+
+    def nbytes(self):
+        return 16
+
+class EWMThreshold:
+    """
+    Thresholds maintained incrementally from an exponentially weighted mean and variance of the residuals.
+
+    Every new residual updates the estimators in O(1), so the thresholds follow drift without storing or rescanning the
+    residual history. With buckets=168 a separate mean/variance is kept for every hour of the week, so that quiet hours
+    (nights, weekends) and busy hours get their own thresholds.
+    Residuals are clipped to the current thresholds before the update, so a burst of anomalies widens the thresholds
+    only slowly instead of teaching the detector that the burst is normal.
+
+    Class Attributes:
+        - factor: Number of standard deviations between the mean and a threshold.
+        - alpha: Weight of a new residual in the estimators (about 1 / number of points remembered per bucket).
+        - buckets: Number of hour-of-week buckets (1 for a single, global estimator).
+        - prior: Weight, in residuals, of the global statistics in the seed of every bucket (see bucketStatistics).
+        - mean, variance: The estimators of every bucket.
+    """
+    adaptive = True
+    __slots__ = ("factor", "alpha", "buckets", "prior", "mean", "variance")
+
+    def __init__(self, factor=3, alpha=0.01, buckets=1, prior=10):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1].")
+
+        self.factor = factor
+        self.alpha = alpha
+        self.buckets = buckets
+        self.prior = prior
+        self.mean = np.zeros(buckets)
+        self.variance = np.full(buckets, np.inf)
+
+    def bucket(self, timestamps):
+        #Bucket index of the given timestamps (ns)
+        if self.buckets == 1:
+            return 0 if np.ndim(timestamps) == 0 else np.zeros(len(timestamps), dtype=np.int64)
+        return (timestamps // HOUR) % self.buckets
+
+    def seed(self, residuals, timestamps):
+        """
+        Initialise the estimators of every bucket from the training residuals.
+        With several buckets the training set holds few residuals per bucket, so the statistics of every bucket are
+        shrunk towards those of all residuals (see bucketStatistics); buckets without any training residual start
+        from the global statistics.
+        """
+        self.mean, self.variance = bucketStatistics(residuals, self.bucket(np.asarray(timestamps)), self.buckets, self.prior)
+
+    def bounds(self, timestamps):
+        """
+        Returns the (lower, upper) thresholds in force for the given timestamps (ns), scalars or arrays.
+        """
+        bucket = self.bucket(timestamps)
+        mean, deviation = self.mean[bucket], np.sqrt(self.variance[bucket])
+        return mean - self.factor * deviation, mean + self.factor * deviation
+
+    def update(self, residual, timestamp):
+        """
+        Fold one residual into the estimators of its bucket.
+        """
+        bucket = self.bucket(timestamp)
+        mean, variance = self.mean[bucket], self.variance[bucket]
+        deviation = np.sqrt(variance)
+        residual = min(max(residual, mean - self.factor * deviation), mean + self.factor * deviation)
+
+        #Exponentially weighted mean and variance (West, 1979)
+        difference = residual - mean
+        increment = self.alpha * difference
+        self.mean[bucket] = mean + increment
+        self.variance[bucket] = (1 - self.alpha) * (variance + difference * increment)
+
+    def state(self):
+        return {"mean": self.mean.tolist(), "variance": self.variance.tolist()}
+
+    def restore(self, state):
+        self.mean = np.array(state["mean"])
+        self.variance = np.array(state["variance"])
+
+    def nbytes(self):
+        return self.mean.nbytes + self.variance.nbytes
+
+def makeThreshold(kind="frozen", factor=3, alpha=0.01, buckets=1):
+    """
+    Returns the threshold estimator selected by name: "frozen" or "ewm".
+    """
+    if kind == "frozen":
+        return FrozenThreshold(factor)
+    if kind == "ewm":
+        return EWMThreshold(factor, alpha, buckets)
+    raise ValueError("threshold must be either 'frozen' or 'ewm'.")
@@ -0,0 +1,22 @@
+def parameterValidation(iterations, contamination, window_size, trainIterations):
+    """
+    This function validates the parameters shared by visualizeData and the headless runner.
+
+    - iterations, window_size, and trainIterations must be positve integers
+    - contaimation must be an integer from 0 to 100 inclusive
+    - lastly, window_size must be > than trainIterations in order to avoid losing out on any of the train data.
+    """
+    if not isinstance(iterations, int) or iterations < 0:
+        raise ValueError("iterations must be a positive integer.")
+
+    if not isinstance(window_size, int) or window_size < 0:
+        raise ValueError("window_size must be a positive integer.")
+
+    if not isinstance(trainIterations, int) or trainIterations < 0:
+        raise ValueError("trainIterations must be a positive integer.")
+    
+    if not isinstance(contamination, int) or not (0 <= contamination <= 100):
+        raise ValueError("contamination must be a number between 0 and 100.")
+
+    if window_size < trainIterations:
+        raise ValueError("window_size cannot be less than trainIterations.")
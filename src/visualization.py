@@ -1,43 +1,58 @@
 #custom build modules
 import data
-import models
+import detectors
+import metrics
+from validation import parameterValidation
 
 #External Libraries
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib.widgets import Button
-import matplotlib.dates as mdates
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def parameterValidation(iterations, contamination, window_size, trainIterations):
+def lttb(x, y, threshold):
     """
-    This function validates the parameters for the visualizeData function.
+    Downsample a line to `threshold` points with the Largest-Triangle-Three-Buckets algorithm.
+    The first and last points are kept, the points in between are split into equal buckets and from every bucket the point
+    forming the largest triangle with the previously kept point and the average of the next bucket is kept, which preserves
+    the visual shape of the line (peaks included) far better than taking every n-th point.
 
-    - iterations, window_size, and trainIterations must be positve integers
-    - contaimation must be an integer from 0 to 100 inclusive
-    - lastly, window_size must be > than trainIterations in order to avoid losing out on any of the train data.
+    Parameters:
+    - x, y (np.ndarray): Coordinates of the line, x sorted.
+    - threshold (int): Number of points to keep.
+
+    Returns:
+    - (np.ndarray, np.ndarray): The downsampled coordinates.
     """
-    if not isinstance(iterations, int) or iterations < 0:
-        raise ValueError("iterations must be a positive integer.")
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return x, y
 
-    if not isinstance(window_size, int) or window_size < 0:
-        raise ValueError("window_size must be a positive integer.")
+    #Bucket i covers the points edges[i]:edges[i + 1], the first and last point are buckets on their own
+    edges = (np.arange(threshold - 1) * (length - 2) / (threshold - 2)).astype(int) + 1
+    edges[-1] = length - 1
+    counts = np.diff(edges)
+    averageX = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    averageY = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    averageX = np.append(averageX, x[-1])
+    averageY = np.append(averageY, y[-1])
 
-    if not isinstance(trainIterations, int) or trainIterations < 0:
-        raise ValueError("trainIterations must be a positive integer.")
-    
-    if not isinstance(contamination, int) or not (0 <= contamination <= 100):
-        raise ValueError("contamination must be a number between 0 and 100.")
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, length - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        nextX, nextY = averageX[bucket + 1], averageY[bucket + 1]
+        area = np.abs((x[previous] - nextX) * (y[start:end] - y[previous]) - (x[previous] - x[start:end]) * (nextY - y[previous]))
+        previous = start + int(np.argmax(area))
+        keep[bucket + 1] = previous
 
-    if window_size < trainIterations:
-        raise ValueError("window_size cannot be less than trainIterations.")
+    return x[keep], y[keep]
 
-def visualizeData(iterations=150, contamination=10, window_size=10000, trainIterations=3000):
+def visualizeData(iterations=150, contamination=10, window_size=10000, trainIterations=3000, mode="batch", incremental=True, detector="stl",
+                  separate=False, fps=10):
     """
     This function is responsible for creating the real-time visualization graph that displays
     the real-time data stream and any detected anomalies from the chosen algorithm
@@ -47,25 +62,41 @@ def visualizeData(iterations=150, contamination=10, window_size=10000, trainIter
     - contamination: Probability of a data point being anomalous (0-100)
     - window_size: Number of data points the model holds before dropping old points (must be > trainIterations)
     - trainIterations: Number of points to generate as base data to "train" the model (must be > 0)
+    - mode: STL decomposition mode of the model, "batch", "online" or "forecast"
+    - detector: Name of the detector in the detectors.DETECTORS registry (STL by default)
+    - incremental: Keep persistent artists and blit only them on every frame, with the line downsampled to the pixel width
+      of the axes, instead of clearing and replotting the whole graph. The frame cost then stays flat for long streams.
+    - separate: Run the detector in its own process and plot what it publishes to shared memory (see visualizeShared).
+    - fps: With separate, number of frames drawn per second.
 
     This function outputs a matplotlib graph that updates every second.
     """
+    if separate:
+        return visualizeShared(iterations, contamination, window_size, trainIterations, mode, detector, fps)
     try:
         # Validate parameters to ensure they are compatible
         parameterValidation(iterations, contamination, window_size, trainIterations)
         
         logging.info("Starting data visualization with parameters - iterations: %d, contamination: %f, window_size: %d, trainIterations: %d", iterations, contamination, window_size, trainIterations)
 
+        #matplotlib is only imported once plotting is actually requested (lttb and the rest of the module do not need it)
+        import matplotlib.pyplot as plt
+        import matplotlib.animation as animation
+        from matplotlib.widgets import Button
+        import matplotlib.dates as mdates
+
         # Create the plot
         fig, ax = plt.subplots()
         plt.get_current_fig_manager().canvas.manager.set_window_title('Anomaly Detection')
 
         # Create and train the model
-        model = models.STLModel()
-        model.TrainSTLModel(trainIterations)
+        model = detectors.makeDetector(detector, mode=mode, window_size=window_size)
+        model.train(trainIterations)
+        streamStart = model.date #only the streamed points are plotted, the training points may or may not still be in the window
 
-        #Creating the generator that will generate the data stream for us, with a certain contaimination percentage
-        realTimeGenerator = data.generateCPUData(contamination=contamination)
+        #Creating the generator that will generate the data stream for us, with a certain contaimination percentage,
+        #starting where the training data ended so the schedule stays aligned with the model
+        realTimeGenerator = data.generateCPUData(contamination=contamination, start=model.date)
 
         def stop(event):
             """
@@ -87,33 +118,193 @@ def visualizeData(iterations=150, contamination=10, window_size=10000, trainIter
                 data_point = next(realTimeGenerator)
                 model.predict(data_point, window_size)
 
-                #replot the graph
-                ax.clear()
-                ax.set_ylim([0, 100]) #As we are plotting CPU utilization, the y-axis has a range of [0-100]
-                ax.plot(model.data_points.index[trainIterations:], model.data_points[trainIterations:], label="Data Stream", color="blue")
-
-                #If we have anomalies, we need to plot it in the appropriate indices
-                if len(model.anomalies):
-                    ax.scatter(model.anomalies.index , model.anomalies, color='red', marker='D', label='Anomalies')
-
-                #Labelling the graph
-                ax.legend()
-                ax.set_title("Real-Time Data Stream and Anomaly Detection")
-                ax.set_xlabel("Time")
-                ax.set_ylabel("CPU Utilization")
-                ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d'))
+                with metrics.stage("render"):
+                    #replot the graph
+                    ax.clear()
+                    ax.set_ylim([0, 100]) #As we are plotting CPU utilization, the y-axis has a range of [0-100]
+                    streamed = model.data_points[streamStart:]
+                    ax.plot(streamed.index, streamed, label="Data Stream", color="blue")
+
+                    #If we have anomalies, we need to plot it in the appropriate indices
+                    anomalies = model.anomalies
+                    if len(anomalies):
+                        ax.scatter(anomalies.index , anomalies, color='red', marker='D', label='Anomalies')
+
+                    #Labelling the graph
+                    ax.legend()
+                    ax.set_title("Real-Time Data Stream and Anomaly Detection")
+                    ax.set_xlabel("Time")
+                    ax.set_ylabel("CPU Utilization")
+                    ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d'))
+            except Exception as e:
+                logging.error("Error during update: %s", e)
+
+        #Persistent artists of the incremental mode, only their data changes between frames
+        line, = ax.plot([], [], label="Data Stream", color="blue")
+        scatter = ax.scatter([], [], color='red', marker='D', label='Anomalies')
+
+        def init():
+            """
+            Draws everything that does not change between frames once: labels, legend and axis formatting.
+            Returns the artists that are redrawn (blitted) on every frame.
+            """
+            ax.set_ylim([0, 100]) #As we are plotting CPU utilization, the y-axis has a range of [0-100]
+            ax.set_xlim(mdates.date2num(model.date), mdates.date2num(model.date + pd.Timedelta(1, "D")))
+            ax.legend(loc="upper left")
+            ax.set_title("Real-Time Data Stream and Anomaly Detection")
+            ax.set_xlabel("Time")
+            ax.set_ylabel("CPU Utilization")
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d'))
+            return line, scatter
+
+        def updateIncremental(frame):
+            """
+            Incremental version of update: generates and predicts the next point, then only updates the data of the
+            persistent line and scatter artists, which FuncAnimation blits on top of the cached background.
+            The axes (and so the cached background) are only redrawn when the stream runs past the right edge of the
+            x-axis, which is then extended with some headroom so that this happens rarely.
+            """
+            try:
+                #Generate new data point and predict 
+                data_point = next(realTimeGenerator)
+                model.predict(data_point, window_size)
+
+                with metrics.stage("render"):
+                    #Visible part of the stream, straight from the model's window buffer
+                    values, timestamps = model.window.view()
+                    first = np.searchsorted(timestamps, streamStart.value)
+                    x = mdates.date2num(timestamps[first:].view("datetime64[ns]"))
+                    y = values[first:]
+                    if len(x) == 0:
+                        return line, scatter
+
+                    left, right = ax.get_xlim()
+                    if x[-1] > right or x[0] > left + (right - left) / 2:
+                        ax.set_xlim(x[0], x[-1] + max((x[-1] - x[0]) / 4, 1))
+                        fig.canvas.draw() #refresh the background (ticks) before FuncAnimation caches it
+                        left, right = ax.get_xlim()
+
+                    #Downsample the line to the pixel width of the axes
+                    line.set_data(*lttb(x, y, int(ax.bbox.width)))
+
+                    #Only the anomalies of the visible time range are read from the log
+                    visible = model.anomalyLog.query(start=mdates.num2date(left))
+                    if len(visible):
+                        anomalyX = mdates.date2num(visible["timestamp"].view("datetime64[ns]"))
+                        scatter.set_offsets(np.column_stack([anomalyX, visible["value"]]))
             except Exception as e:
                 logging.error("Error during update: %s", e)
+            return line, scatter
 
         # Create a stop button
         stop_button_ax = plt.axes([0.88, 0.01, 0.10, 0.075])
         stop_button = Button(stop_button_ax, 'Stop')
         stop_button.on_clicked(stop) #calls the stop function from earlier
 
-        ani = animation.FuncAnimation(fig, update, frames=iterations, repeat=False)
+        if incremental:
+            ani = animation.FuncAnimation(fig, updateIncremental, init_func=init, frames=iterations, repeat=False, blit=True)
+        else:
+            line.remove()
+            scatter.remove()
+            ani = animation.FuncAnimation(fig, update, frames=iterations, repeat=False)
         plt.show() #shows the plot
 
     except ValueError as ve:
         logging.error("Parameter validation error: %s", ve)
     except Exception as e:
-        logging.error("Unexpected error: %s", e)
\ No newline at end of file
+        logging.error("Unexpected error: %s", e)
+
+def visualizeShared(iterations=150, contamination=10, window_size=10000, trainIterations=3000, mode="batch", detector="stl", fps=10):
+    """
+    Version of visualizeData where detection and drawing run in two processes, each at its own rate.
+
+    The detector process (sharedwindow.publishStream) scores the stream as fast as it arrives and publishes every point
+    to a SharedWindow. This process only draws: every 1 / fps seconds it reads the shared window, without copying it and
+    without ever blocking the writer, downsamples the line to the pixel width of the axes and blits it. A slow STL fit no
+    longer freezes the window and a slow redraw no longer delays detection.
+
+    Parameters are those of visualizeData, fps is the frame rate of the plot.
+    """
+    try:
+        parameterValidation(iterations, contamination, window_size, trainIterations)
+        logging.info("Starting data visualization in a separate detector process with parameters - iterations: %d, contamination: %f, window_size: %d, trainIterations: %d",
+                     iterations, contamination, window_size, trainIterations)
+
+        import matplotlib.pyplot as plt
+        import matplotlib.animation as animation
+        from matplotlib.widgets import Button
+        import matplotlib.dates as mdates
+        import multiprocessing
+        import sharedwindow
+
+        shared = sharedwindow.SharedWindow(window=window_size)
+        #spawn: the detector process starts clean instead of inheriting the GUI state of this one
+        process = multiprocessing.get_context("spawn").Process(target=sharedwindow.publishStream, daemon=True,
+                                                               args=(shared.name, iterations, contamination, window_size, trainIterations, mode, detector))
+        process.start()
+
+        fig, ax = plt.subplots()
+        plt.get_current_fig_manager().canvas.manager.set_window_title('Anomaly Detection')
+        line, = ax.plot([], [], label="Data Stream", color="blue")
+        scatter = ax.scatter([], [], color='red', marker='D', label='Anomalies')
+
+        def stop(event):
+            #Stop both the animation and the detector process
+            ani.event_source.stop()
+            shared.requestStop()
+            logging.info('Stopping animation...')
+
+        def init():
+            #Static parts of the graph, drawn once
+            start = data.ORIGIN + pd.Timedelta(trainIterations, "h")
+            ax.set_ylim([0, 100]) #As we are plotting CPU utilization, the y-axis has a range of [0-100]
+            ax.set_xlim(mdates.date2num(start), mdates.date2num(start + pd.Timedelta(1, "D")))
+            ax.legend(loc="upper left")
+            ax.set_title("Real-Time Data Stream and Anomaly Detection")
+            ax.set_xlabel("Time")
+            ax.set_ylabel("CPU Utilization")
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d'))
+            return line, scatter
+
+        def frame(values, timestamps, anomalyValues, anomalyTimestamps):
+            #Runs on the shared views: only the downsampled line and the anomalies leave this function, as copies
+            x, y = lttb(mdates.date2num(timestamps.view("datetime64[ns]")), values, int(ax.bbox.width))
+            return x, y.copy(), np.column_stack([mdates.date2num(anomalyTimestamps.view("datetime64[ns]")), anomalyValues])
+
+        def update(_):
+            try:
+                with metrics.stage("render"):
+                    result = shared.read(frame)
+                    if result is None or len(result[0]) == 0:
+                        return line, scatter
+                    x, y, anomalies = result
+
+                    left, right = ax.get_xlim()
+                    if x[-1] > right or x[0] > left + (right - left) / 2:
+                        ax.set_xlim(x[0], x[-1] + max((x[-1] - x[0]) / 4, 1))
+                        fig.canvas.draw() #refresh the background (ticks) before FuncAnimation caches it
+
+                    line.set_data(x, y)
+                    if len(anomalies):
+                        scatter.set_offsets(anomalies)
+            except Exception as e:
+                logging.error("Error during update: %s", e)
+            return line, scatter
+
+        stop_button_ax = plt.axes([0.88, 0.01, 0.10, 0.075])
+        stop_button = Button(stop_button_ax, 'Stop')
+        stop_button.on_clicked(stop)
+
+        ani = animation.FuncAnimation(fig, update, init_func=init, interval=1000 / fps, blit=True, cache_frame_data=False)
+        try:
+            plt.show()
+        finally:
+            shared.requestStop()
+            process.join()
+            shared.close()
+            shared.unlink()
+
+    except ValueError as ve:
+        logging.error("Parameter validation error: %s", ve)
+    except Exception as e:
+        logging.error("Unexpected error: %s", e)
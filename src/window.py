@@ -0,0 +1,194 @@
+from thresholds import HOUR
+import numpy as np
+import pandas as pd
+
+class RingBuffer:
+    """
+    RingBuffer is a preallocated, fixed-capacity circular buffer for the sliding window of a data stream.
+
+    Values are kept in a float array and timestamps (nanoseconds since epoch) in an int64 array, so appending a point
+    is a couple of array writes instead of rebuilding a pandas Series and its DatetimeIndex.
+    Every point is written twice, at position i and i + capacity, which means the most recent points are always
+    available as one contiguous slice of the arrays. view() therefore never copies, at the cost of twice the storage.
+
+    Class Attributes:
+        - capacity: Maximum number of points held by the buffer.
+        - values: Backing array of the values (2 * capacity).
+        - timestamps: Backing array of the timestamps in nanoseconds (2 * capacity).
+        - head: Position the next point will be written to (0 to capacity - 1).
+        - size: Number of points currently held.
+    """
+    __slots__ = ("capacity", "values", "timestamps", "head", "size", "version")
+
+    def __init__(self, capacity, dtype=np.float64):
+        if capacity <= 0:
+            raise ValueError("capacity must be a positive integer.")
+
+        self.capacity = capacity
+        self.values = np.zeros(2 * capacity, dtype=dtype)
+        self.timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self.head = 0
+        self.size = 0
+        self.version = 0 #bumped on every write, used by consumers to cache derived objects
+
+    def __len__(self):
+        return self.size
+
+    def append(self, value, timestamp):
+        """
+        Append a single point, overwriting the oldest point once the buffer is full.
+        """
+        self.values[self.head] = self.values[self.head + self.capacity] = value
+        self.timestamps[self.head] = self.timestamps[self.head + self.capacity] = timestamp
+
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.version += 1
+
+    def extend(self, values, timestamps):
+        """
+        Append a block of points in one vectorized write.
+        If the block is larger than the capacity only its most recent points are kept.
+        """
+        values = np.asarray(values)[-self.capacity:]
+        timestamps = np.asarray(timestamps, dtype=np.int64)[-self.capacity:]
+        count = len(values)
+        if count == 0:
+            return
+
+        positions = (self.head + np.arange(count)) % self.capacity
+        self.values[positions] = self.values[positions + self.capacity] = values
+        self.timestamps[positions] = self.timestamps[positions + self.capacity] = timestamps
+
+        self.head = (self.head + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+        self.version += 1
+
+    def view(self):
+        """
+        Returns zero-copy, contiguous (values, timestamps) views of the held points, oldest first.
+        The views are only valid until the next write to the buffer.
+        """
+        end = self.head + self.capacity
+        return self.values[end - self.size:end], self.timestamps[end - self.size:end]
+
+    def resize(self, capacity):
+        """
+        Change the capacity of the buffer, keeping the most recent points that still fit.
+        """
+        values, timestamps = self.view()
+        values, timestamps = values.copy(), timestamps.copy()
+        version = self.version
+
+        self.__init__(capacity, dtype=self.values.dtype)
+        self.extend(values, timestamps)
+        self.version = version + 1
+
+    def toSeries(self):
+        """
+        Materialize the held points as a pandas Series with a DatetimeIndex (copies the data).
+        """
+        values, timestamps = self.view()
+        return pd.Series(values.copy(), index=pd.DatetimeIndex(timestamps.copy()))
+
+    def nbytes(self):
+        #Memory held by the backing arrays
+        return self.values.nbytes + self.timestamps.nbytes
+
+class CompactRingBuffer(RingBuffer):
+    """
+    CompactRingBuffer is the compact variant of RingBuffer for regular streams: values are stored as float32 and the
+    timestamps are implicit, derived from the timestamp of the newest point and the fixed step between two points.
+    Every point is also written once only, instead of twice: a point then costs 4 bytes instead of 32, and float32 is
+    plenty of precision for a 0-100 utilization.
+
+    Points must arrive exactly `step` apart; a gap or an out of order point raises a ValueError.
+    view() builds the timestamps array on every call, and copies the values once the buffer has wrapped around.
+
+    Class Attributes:
+        - step: Time between two points in nanoseconds (one hour by default).
+        - last: Timestamp of the newest point.
+    """
+    __slots__ = ("step", "last")
+
+    def __init__(self, capacity, dtype=np.float32, step=HOUR):
+        if capacity <= 0:
+            raise ValueError("capacity must be a positive integer.")
+
+        self.capacity = capacity
+        self.values = np.zeros(capacity, dtype=dtype)
+        self.timestamps = None
+        self.head = 0
+        self.size = 0
+        self.version = 0
+        self.step = step
+        self.last = None
+
+    def checkTimestamp(self, timestamp):
+        #The first point sets the clock, every later point must be exactly one step after the previous one
+        if self.size and timestamp != self.last + self.step:
+            raise ValueError("a compact window needs a regular stream, one point every step.")
+
+    def append(self, value, timestamp):
+        """
+        Append a single point, overwriting the oldest point once the buffer is full.
+        """
+        self.checkTimestamp(timestamp)
+        self.values[self.head] = value
+        self.last = int(timestamp)
+
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.version += 1
+
+    def extend(self, values, timestamps):
+        """
+        Append a block of points in one vectorized write.
+        If the block is larger than the capacity only its most recent points are kept.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if len(timestamps) == 0:
+            return
+        self.checkTimestamp(timestamps[0])
+        if np.any(np.diff(timestamps) != self.step):
+            raise ValueError("a compact window needs a regular stream, one point every step.")
+        self.last = int(timestamps[-1])
+
+        values = np.asarray(values)[-self.capacity:]
+        count = len(values)
+        positions = (self.head + np.arange(count)) % self.capacity
+        self.values[positions] = values
+
+        self.head = (self.head + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+        self.version += 1
+
+    def view(self):
+        """
+        Returns (values, timestamps) of the held points, oldest first. The values are a zero-copy view valid until the
+        next write while the points are contiguous, a copy once the buffer has wrapped around; the timestamps are computed.
+        """
+        start = (self.head - self.size) % self.capacity
+        if start + self.size <= self.capacity:
+            values = self.values[start:start + self.size]
+        else:
+            values = np.concatenate([self.values[start:], self.values[:self.head]])
+        timestamps = np.arange(self.size, dtype=np.int64) * self.step
+        if self.size:
+            timestamps += self.last - (self.size - 1) * self.step
+        return values, timestamps
+
+    def resize(self, capacity):
+        """
+        Change the capacity of the buffer, keeping the most recent points that still fit.
+        """
+        values, timestamps = self.view()
+        values = values.copy()
+        version = self.version
+
+        self.__init__(capacity, dtype=self.values.dtype, step=self.step)
+        self.extend(values, timestamps)
+        self.version = version + 1
+
+    def nbytes(self):
+        return self.values.nbytes
@@ -0,0 +1,25 @@
+import alerts
+
+import io
+import json
+import sys
+
+def test_jsonLinesSinkClosesOnlyTheFileItOpened(tmp_path):
+    path = str(tmp_path / "alerts.jsonl")
+    sink = alerts.JsonLinesSink(path)
+    sink.emit({"event": "open"})
+    sink.close()
+    sink.close() #the atexit handler closes the sink a second time
+    assert sink.stream.closed
+    with open(path) as f:
+        assert [json.loads(line) for line in f] == [{"event": "open"}]
+
+    stream = io.StringIO()
+    sink = alerts.JsonLinesSink(stream)
+    sink.emit({"event": "open"})
+    sink.close()
+    assert not stream.closed and stream.getvalue() == '{"event": "open"}\n'
+
+    sink = alerts.makeSink("-")
+    sink.close()
+    assert not sys.stdout.closed
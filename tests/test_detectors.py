@@ -0,0 +1,54 @@
+import data
+import detectors
+
+import numpy as np
+import pandas as pd
+import pytest
+
+def cleanStream(model, count, seed=1):
+    #`count` clean hourly points following the training data of a trained model, and their timestamps
+    values, _ = data.generateCPUDataBulk(count, contamination=0, seed=seed, start=model.date)
+    return values, pd.date_range(model.date, periods=count, freq="1h").asi8
+
+def test_profileWithShortTrainingFallsBackToHoursOfTheDay():
+    #500 training points are about 3 per hour-of-week bucket
+    model = detectors.makeDetector("profile", verbose=False)
+    model.train(500, seed=0)
+    assert np.all(np.isfinite(model.variance)) and model.variance.min() > 1e-6
+
+    values, timestamps = cleanStream(model, 1000)
+    mask, _ = model.predict_batch(values, timestamps)
+    assert mask.sum() < 20
+
+def test_tieredWithShortTrainingFlagsAnomalies():
+    #500 training points fit in the 336-point recent tier and a few folded points, the profile must come from all of them
+    model = detectors.makeDetector("tiered", verbose=False)
+    model.train(500, seed=0)
+    mean, deviation = model.history.profile()
+    assert np.all(deviation > 0) and deviation.max() < 100
+
+    values, timestamps = cleanStream(model, 300)
+    mask, _ = model.predict_batch(values, timestamps)
+    assert mask.sum() < 10
+
+    values[::30] += 60
+    mask, _ = model.predict_batch(values, timestamps)
+    assert mask[::30].sum() >= 8
+
+def test_tieredRejectsTrainingWithoutSpread():
+    model = detectors.makeDetector("tiered", verbose=False)
+    timestamps = pd.date_range(model.date, periods=500, freq="1h").asi8
+    with pytest.raises(ValueError):
+        model.learn(np.full(500, 50.0), timestamps)
+
+def test_tieredCountsTrainingPointsOnce():
+    model = detectors.makeDetector("tiered", verbose=False)
+    model.train(500, seed=0)
+    assert model.history.count.sum() == 500
+
+    #The training points leaving the recent tier were already seeded, only the streamed points are folded in
+    values, timestamps = cleanStream(model, 400)
+    model.predict_batch(values[:200], timestamps[:200])
+    for value, timestamp in zip(values[200:], timestamps[200:]):
+        model.history.append(value, timestamp)
+    assert model.history.count.sum() == 500 + 400 - 336
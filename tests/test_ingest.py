@@ -0,0 +1,9 @@
+import ingest
+
+def test_parseLinesSkipsOutOfRangeLines():
+    lines = [b"1,1,1.5", b"99999999999999999999,1,1", b"-1,1,1", b"2,99999999999999999999,1", b"2,-1,2.5", b"#ping 7", b"bad"]
+    records, pings, malformed = ingest.parseLines(lines)
+    assert records["stream"].tolist() == [1, 2]
+    assert records["timestamp"].tolist() == [1, -1]
+    assert records["value"].tolist() == [1.5, 2.5]
+    assert pings == [7] and malformed == 4
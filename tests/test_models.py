@@ -0,0 +1,55 @@
+import data
+import models
+
+import pandas as pd
+import os
+import pytest
+
+def test_forecastNeedsAWeekOfTraining():
+    model = models.STLModel(mode="forecast", window_size=1000, verbose=False)
+    with pytest.raises(ValueError):
+        model.train(100)
+    with pytest.raises(ValueError):
+        models.STLModel(mode="forecast", window_size=100, verbose=False)
+
+    #With a week every hour of the week has a baseline, and a clean stream is scored against it
+    model.train(200, seed=0)
+    values, _ = data.generateCPUDataBulk(336, contamination=0, seed=10, start=model.date)
+    mask, _ = model.predict_batch(values, pd.date_range(model.date, periods=336, freq="1h").asi8)
+    model.close()
+    assert mask.sum() < 20
+
+def test_checkpointHoldsTheSpilledAnomalies(tmp_path):
+    model = models.STLModel(mode="online", window_size=1000, verbose=False, anomalyCapacity=4)
+    model.train(500, seed=0)
+    values, _ = data.generateCPUDataBulk(300, contamination=20, seed=1, start=model.date)
+    model.predict_batch(values, pd.date_range(model.date, periods=300, freq="1h").asi8)
+    assert model.anomalyLog.spilled > 0
+    expected = model.anomalyLog.query()
+
+    path = str(tmp_path / "checkpoint")
+    model.save(path)
+    spillPath = model.anomalyLog.spillPath
+    model.close()
+    assert not os.path.exists(spillPath) #the checkpoint has its own copy, the temporary file does not leak
+
+    restored = models.STLModel.load(path, verbose=False)
+    assert (restored.anomalyLog.query() == expected).all()
+    restoredSpill = restored.anomalyLog.spillPath
+    restored.close()
+    assert not os.path.exists(restoredSpill)
+    assert os.path.exists(os.path.join(path, "spilled.anomalies"))
+
+def test_predictAndPredictBatchAgree():
+    #STLModel keeps its bookkeeping in Detector: the window holds the new points before they are scored, one by one or in a block
+    single, block = (models.STLModel(mode="online", window_size=1000, verbose=False) for _ in range(2))
+    for model in (single, block):
+        model.train(500, seed=0)
+    values, _ = data.generateCPUDataBulk(100, contamination=20, seed=1, start=single.date)
+
+    residuals = [single.predict(value, 1000)[1] for value in values]
+    _, blockResiduals = block.predict_batch(values)
+    assert isinstance(single, models.Detector)
+    assert (blockResiduals == residuals).all()
+    assert (single.window.view()[1] == block.window.view()[1]).all() and single.date == block.date
+    assert (single.anomalyLog.query() == block.anomalyLog.query()).all() and len(single.anomalyLog) > 0
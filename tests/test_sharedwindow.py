@@ -0,0 +1,42 @@
+import sharedwindow
+
+import multiprocessing
+import numpy as np
+
+def countPoints(values, timestamps, anomalyValues, anomalyTimestamps):
+    #Copies out of the zero-copy views, which must not outlive the read
+    return len(values), np.diff(timestamps).tolist(), len(anomalyValues)
+
+def test_publishAndRead():
+    shared = sharedwindow.SharedWindow(window=8, anomalyWindow=4)
+    try:
+        hour = 3600 * 10**9
+        for i in range(5):
+            shared.publish(float(i), i * hour, i == 3)
+        shared.publishBlock(np.arange(5.0, 10.0), np.arange(5, 10) * hour, np.array([False, True, False, False, False]))
+        shared.finish()
+
+        count, steps, anomalies = shared.read(countPoints)
+        assert (count, anomalies) == (8, 2) and set(steps) == {hour}
+        assert shared.done() and not shared.stopRequested()
+    finally:
+        shared.close()
+        shared.unlink()
+
+def test_publishStreamFollowsTheTrainedModel():
+    #The detector process publishes a clean stream starting where its training data ended, so it flags almost nothing
+    shared = sharedwindow.SharedWindow(window=200, anomalyWindow=100)
+    try:
+        process = multiprocessing.get_context("spawn").Process(target=sharedwindow.publishStream, kwargs={
+            "name": shared.name, "iterations": 100, "contamination": 0, "trainIterations": 500, "mode": "forecast",
+            "paced": False, "seed": 1})
+        process.start()
+        process.join(120)
+        assert process.exitcode == 0 and shared.done()
+
+        count, steps, anomalies = shared.read(countPoints)
+        assert count == 100 and set(steps) == {3600 * 10**9}
+        assert anomalies == 0
+    finally:
+        shared.close()
+        shared.unlink()
@@ -0,0 +1,43 @@
+from thresholds import HOUR, EWMThreshold, bucketStatistics
+
+import numpy as np
+
+def hourly(count, start=0):
+    #Timestamps (ns) of `count` consecutive hours
+    return (start + np.arange(count)) * HOUR
+
+def test_sparseBucketsFallBackToTheGlobalSpread():
+    #500 training residuals are about 3 per hour-of-week bucket, whose own variance would be mostly noise
+    rng = np.random.default_rng(0)
+    thresholds = EWMThreshold(factor=3, buckets=168)
+    thresholds.seed(rng.normal(0, 1, 500), hourly(500))
+
+    deviation = np.sqrt(thresholds.variance)
+    assert deviation.min() > 0.6 and deviation.max() < 1.6
+    assert np.abs(thresholds.mean).max() < 0.6
+
+    #Clean residuals scored (and folded in) afterwards are almost never flagged
+    residuals, timestamps = rng.normal(0, 1, 1500), hourly(1500, 500)
+    flagged = 0
+    for residual, timestamp in zip(residuals, timestamps):
+        lower, upper = thresholds.bounds(timestamp)
+        flagged += residual < lower or residual > upper
+        thresholds.update(residual, timestamp)
+    assert flagged < 15
+
+def test_wellFilledBucketsKeepTheirOwnStatistics():
+    #With 100 values per bucket the prior barely moves the statistics of a bucket
+    rng = np.random.default_rng(1)
+    buckets = np.repeat(np.arange(2), 100)
+    values = np.concatenate([rng.normal(0, 1, 100), rng.normal(10, 5, 100)])
+    mean, variance = bucketStatistics(values, buckets, 2, prior=10, shrinkMean=False)
+
+    assert np.allclose(mean, [values[:100].mean(), values[100:].mean()])
+    assert 0.8 < np.sqrt(variance[0]) < 3 and 4 < np.sqrt(variance[1]) < 6
+
+def test_emptyBucketsGetTheGlobalStatistics():
+    values = np.array([1.0, 2.0, 3.0, 4.0])
+    mean, variance = bucketStatistics(values, np.array([0, 0, 1, 1]), 3)
+
+    assert mean[2] == values.mean()
+    assert variance[2] == values.var(ddof=1)
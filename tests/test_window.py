@@ -0,0 +1,16 @@
+from thresholds import HOUR
+from window import CompactRingBuffer, RingBuffer
+
+import numpy as np
+
+def test_compactRingMatchesRingAcrossWraparound():
+    compact, ring = CompactRingBuffer(5), RingBuffer(5)
+    assert compact.nbytes() == 5 * 4 #a single float32 copy of every point
+    for block in (np.arange(3), np.arange(3, 4), np.arange(4, 11), np.arange(11, 13)):
+        compact.extend(block, block * HOUR)
+        ring.extend(block, block * HOUR)
+        for left, right in zip(compact.view(), ring.view()):
+            assert left.tolist() == right.tolist()
+    compact.append(13, 13 * HOUR)
+    ring.append(13, 13 * HOUR)
+    assert compact.view()[0].tolist() == ring.view()[0].tolist() == [9, 10, 11, 12, 13]